@@ -0,0 +1,135 @@
+"""
+Heap profiling with tracemalloc.
+
+Tracing is switched on at runtime through the admin API, since it slows down every allocation while on. A sample of
+requests then records the memory allocated per route: the net bytes still allocated when the request ends, and the
+peak above the memory in use when it started. Allocation sites are inspected with snapshots, and compared to a
+baseline snapshot to find what keeps growing.
+"""
+
+import random
+import tracemalloc
+from typing import Dict, List, Optional
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.admin.schemas import RouteAllocations
+from app.utils import route_template
+
+# Allocations of these modules are profiling overhead, not application memory
+IGNORED_FILES = (
+    tracemalloc.__file__,
+    "<frozen importlib._bootstrap>",
+    "<frozen importlib._bootstrap_external>",
+    "<unknown>",
+)
+
+
+class HeapProfiler:
+    """
+    Switches tracemalloc on and off, and records the allocations of a sample of requests per route.
+
+    The peak of a request is measured from the process-wide peak, which concurrent requests also move, so it is an
+    approximation under load.
+
+    Attributes:
+        sample_rate (float): The fraction of requests measured while tracing.
+        routes (Dict[str, RouteAllocations]): The allocations recorded per route since tracing started.
+        baseline (Optional[tracemalloc.Snapshot]): The snapshot diffs are computed against.
+    """
+
+    def __init__(self) -> None:
+        self.sample_rate = 0.0
+        self.routes: Dict[str, RouteAllocations] = {}
+        self.baseline: Optional[tracemalloc.Snapshot] = None
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int, sample_rate: float) -> None:
+        """
+        Start tracing allocations, or change the sample rate if already tracing.
+
+        Args:
+            frames (int): The number of frames of the traceback recorded per allocation.
+            sample_rate (float): The fraction of requests measured.
+        """
+        self.sample_rate = sample_rate
+        if not tracemalloc.is_tracing():
+            self.routes = {}
+            self.baseline = None
+            tracemalloc.start(frames)
+
+    def stop(self) -> None:
+        """Stop tracing allocations and free the traces; recorded route allocations are kept."""
+        tracemalloc.stop()
+        self.baseline = None
+
+    def snapshot(self) -> tracemalloc.Snapshot:
+        """Take a snapshot of the allocations traced, without profiling overhead."""
+        return tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, filename) for filename in IGNORED_FILES]
+        )
+
+    def record(self, route: str, net_bytes: int, peak_bytes: int) -> None:
+        allocations = self.routes.setdefault(route, RouteAllocations())
+        allocations.requests += 1
+        allocations.net_bytes += net_bytes
+        allocations.peak_bytes = max(allocations.peak_bytes, peak_bytes)
+
+
+heap_profiler = HeapProfiler()
+
+
+def top_allocations(snapshot: tracemalloc.Snapshot, group_by: str, limit: int) -> List[tracemalloc.Statistic]:
+    """
+    Get the allocation sites holding the most memory.
+
+    Args:
+        snapshot (tracemalloc.Snapshot): The allocations.
+        group_by (str): `lineno`, `filename` or `traceback`.
+        limit (int): The number of allocation sites returned.
+
+    Returns:
+        List[tracemalloc.Statistic]: The allocation sites, largest first.
+    """
+    return snapshot.statistics(group_by)[:limit]
+
+
+def allocation_growth(
+    snapshot: tracemalloc.Snapshot, baseline: tracemalloc.Snapshot, group_by: str, limit: int
+) -> List[tracemalloc.StatisticDiff]:
+    """
+    Get the allocation sites whose memory grew the most since a baseline snapshot.
+
+    Args:
+        snapshot (tracemalloc.Snapshot): The current allocations.
+        baseline (tracemalloc.Snapshot): The allocations to compare to.
+        group_by (str): `lineno`, `filename` or `traceback`.
+        limit (int): The number of allocation sites returned.
+
+    Returns:
+        List[tracemalloc.StatisticDiff]: The allocation sites, largest growth first.
+    """
+    return snapshot.compare_to(baseline, group_by)[:limit]
+
+
+class HeapProfilerMiddleware:
+    """ASGI middleware recording the allocations of a sample of HTTP requests per route, while tracing."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not tracemalloc.is_tracing() or random.random() >= heap_profiler.sample_rate:
+            await self.app(scope, receive, send)
+            return
+        started_with, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if tracemalloc.is_tracing():  # Not stopped meanwhile
+                ended_with, peak = tracemalloc.get_traced_memory()
+                heap_profiler.record(route_template(scope), ended_with - started_with, peak - started_with)
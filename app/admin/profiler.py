@@ -0,0 +1,162 @@
+"""
+Statistical CPU profiler.
+
+A background thread samples the Python stack of the event-loop thread at a fixed interval. Samples are aggregated
+as collapsed stacks (`frame;frame;frame count` lines), the input format of flamegraph.pl, speedscope and inferno.
+The sampled thread is never interrupted, so profiling is safe on a live worker.
+"""
+
+import asyncio
+import hmac
+import os
+import sys
+import threading
+from collections import Counter, OrderedDict
+from types import FrameType
+from typing import Optional
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+from app.log import request_id_var
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+# Number of request profiles kept for retrieval
+MAX_REQUEST_PROFILES = 20
+
+
+class ProfilerBusyError(RuntimeError):
+    """Raised when a profile is requested while another one is running in this process."""
+
+    pass
+
+
+def _frame_name(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """
+    Samples the stack of a thread from a background thread.
+
+    Attributes:
+        interval (float): The time between samples, in seconds.
+        thread_id (int): The identifier of the sampled thread.
+        task (Optional[asyncio.Task]): If given, only sample while this task is running on the event loop.
+        samples (Counter[str]): The number of samples of each collapsed stack.
+    """
+
+    def __init__(self, interval: float, thread_id: int, task: Optional[asyncio.Task] = None) -> None:
+        self.interval = interval
+        self.thread_id = thread_id
+        self.task = task
+        self.samples: Counter[str] = Counter()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        """Stop sampling, waiting for the sampler thread off the event loop since it may be walking a stack."""
+        self._stopped.set()
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join)
+
+    def _run(self) -> None:
+        loop = self.task.get_loop() if self.task is not None else None
+        while not self._stopped.wait(self.interval):
+            if self.task is not None and asyncio.current_task(loop) is not self.task:
+                continue
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return  # The thread exited
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        """Get the samples as collapsed stacks, most frequent first."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+_profiling = threading.Lock()  # One profile at a time per process, so that overhead stays bounded
+
+
+async def profile(seconds: float, interval: float) -> str:
+    """
+    Profile the event-loop thread of this process.
+
+    Args:
+        seconds (float): How long to profile for.
+        interval (float): The time between samples, in seconds.
+
+    Returns:
+        str: The profile, as collapsed stacks.
+
+    Raises:
+        ProfilerBusyError: Raised if another profile is running in this process.
+    """
+    if not _profiling.acquire(blocking=False):
+        raise ProfilerBusyError("A profile is already running in this process.")
+    try:
+        sampler = StackSampler(interval, threading.get_ident())
+        sampler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            await sampler.stop()
+        return sampler.collapsed()
+    finally:
+        _profiling.release()
+
+
+request_profiles: "OrderedDict[str, str]" = OrderedDict()
+
+
+class RequestProfilerMiddleware:
+    """
+    ASGI middleware profiling single requests that send the `X-Profile` header.
+
+    The header must hold `settings.PROFILE_REQUEST_TOKEN`; requests are not profiled if it is unset. Only the time the
+    request's task runs on the event loop is sampled. The profile is kept under the request ID, returned in the
+    `X-Profile-ID` response header, for retrieval through the admin API.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    def _is_selected(self, scope: Scope) -> bool:
+        if settings.PROFILE_REQUEST_TOKEN is None:
+            return False
+        token = next((value for key, value in scope["headers"] if key == PROFILE_HEADER), None)
+        return token is not None and hmac.compare_digest(token, settings.PROFILE_REQUEST_TOKEN.encode())
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self._is_selected(scope) or not _profiling.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+        profile_id = request_id_var.get() or os.urandom(16).hex()
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (PROFILE_ID_HEADER, profile_id.encode())]
+            await send(message)
+
+        sampler = StackSampler(settings.PROFILE_REQUEST_INTERVAL, threading.get_ident(), asyncio.current_task())
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            try:
+                await sampler.stop()
+            finally:
+                _profiling.release()
+            request_profiles[profile_id] = sampler.collapsed()
+            while len(request_profiles) > MAX_REQUEST_PROFILES:
+                request_profiles.popitem(last=False)
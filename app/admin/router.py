@@ -0,0 +1,146 @@
+import asyncio
+import tracemalloc
+from typing import List, Union
+
+from fastapi import APIRouter, HTTPException, Query, Response, status
+from fastapi.responses import PlainTextResponse
+
+from app.admin.heap import allocation_growth, heap_profiler, top_allocations
+from app.admin.profiler import ProfilerBusyError, profile, request_profiles
+from app.admin.schemas import AllocationSite, GroupBy, HeapProfilingStart, HeapStatus
+from app.user.auth import SuperUser
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["admin"],
+    include_in_schema=False,
+)
+
+PROFILER_BUSY = HTTPException(status_code=status.HTTP_409_CONFLICT, detail="A profile is already running")
+PROFILE_NOT_FOUND = HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+HEAP_NOT_TRACED = HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Heap profiling is not started")
+NO_BASELINE = HTTPException(status_code=status.HTTP_409_CONFLICT, detail="No baseline snapshot taken")
+
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def get_cpu_profile(
+    user: SuperUser,
+    seconds: float = Query(10, gt=0, le=60),
+    interval: float = Query(0.005, ge=0.001, le=1),
+) -> str:
+    """
+    Profile the worker process serving this request, as collapsed stacks for flamegraph tools.
+    """
+    try:
+        return await profile(seconds, interval)
+    except ProfilerBusyError:
+        raise PROFILER_BUSY
+
+
+@router.get("/profile/requests/{profile_id}", response_class=PlainTextResponse)
+async def get_request_profile(profile_id: str, user: SuperUser) -> str:
+    """
+    Get the profile of a request sent with the `X-Profile` header, by the `X-Profile-ID` of its response.
+
+    Profiles are kept by the worker process that served the request.
+    """
+    collapsed = request_profiles.get(profile_id)
+    if collapsed is None:
+        raise PROFILE_NOT_FOUND
+    return collapsed
+
+
+def _heap_status() -> HeapStatus:
+    traced_bytes, peak_bytes = tracemalloc.get_traced_memory()
+    return HeapStatus(
+        tracing=heap_profiler.tracing,
+        traced_bytes=traced_bytes,
+        peak_bytes=peak_bytes,
+        sample_rate=heap_profiler.sample_rate,
+        routes=heap_profiler.routes,
+    )
+
+
+def _allocation_site(statistic: Union[tracemalloc.Statistic, tracemalloc.StatisticDiff]) -> AllocationSite:
+    return AllocationSite(
+        traceback=[f"{frame.filename}:{frame.lineno}" for frame in statistic.traceback],
+        size=statistic.size,
+        count=statistic.count,
+        size_diff=getattr(statistic, "size_diff", None),
+        count_diff=getattr(statistic, "count_diff", None),
+    )
+
+
+@router.get("/heap")
+async def get_heap_status(user: SuperUser) -> HeapStatus:
+    """
+    Get the traced memory and the allocations recorded per route by the worker process serving this request.
+    """
+    return _heap_status()
+
+
+@router.post("/heap/start")
+async def start_heap_profiling(heap_profiling_start: HeapProfilingStart, user: SuperUser) -> HeapStatus:
+    """
+    Start tracing allocations in the worker process serving this request. Tracing slows down every allocation.
+    """
+    heap_profiler.start(heap_profiling_start.frames, heap_profiling_start.sample_rate)
+    return _heap_status()
+
+
+@router.post("/heap/stop", status_code=status.HTTP_204_NO_CONTENT)
+async def stop_heap_profiling(user: SuperUser) -> Response:
+    """
+    Stop tracing allocations in the worker process serving this request.
+    """
+    heap_profiler.stop()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+async def _heap_snapshot() -> tracemalloc.Snapshot:
+    try:
+        return await asyncio.to_thread(heap_profiler.snapshot)  # Copies every trace, too slow for the event loop
+    except RuntimeError:
+        raise HEAP_NOT_TRACED  # Tracing was stopped meanwhile
+
+
+@router.get("/heap/top")
+async def get_top_allocations(
+    user: SuperUser, group_by: GroupBy = GroupBy.LINENO, limit: int = Query(20, ge=1, le=500)
+) -> List[AllocationSite]:
+    """
+    Get the allocation sites holding the most memory.
+    """
+    if not heap_profiler.tracing:
+        raise HEAP_NOT_TRACED
+    snapshot = await _heap_snapshot()
+    statistics = await asyncio.to_thread(top_allocations, snapshot, group_by, limit)
+    return [_allocation_site(statistic) for statistic in statistics]
+
+
+@router.post("/heap/snapshot", status_code=status.HTTP_204_NO_CONTENT)
+async def take_heap_snapshot(user: SuperUser) -> Response:
+    """
+    Take the baseline snapshot that `/admin/heap/diff` compares to.
+    """
+    if not heap_profiler.tracing:
+        raise HEAP_NOT_TRACED
+    heap_profiler.baseline = await _heap_snapshot()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.get("/heap/diff")
+async def get_allocation_growth(
+    user: SuperUser, group_by: GroupBy = GroupBy.LINENO, limit: int = Query(20, ge=1, le=500)
+) -> List[AllocationSite]:
+    """
+    Get the allocation sites whose memory grew the most since the baseline snapshot.
+    """
+    if not heap_profiler.tracing:
+        raise HEAP_NOT_TRACED
+    if heap_profiler.baseline is None:
+        raise NO_BASELINE
+    baseline = heap_profiler.baseline
+    snapshot = await _heap_snapshot()
+    statistics = await asyncio.to_thread(allocation_growth, snapshot, baseline, group_by, limit)
+    return [_allocation_site(statistic) for statistic in statistics]
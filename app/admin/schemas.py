@@ -0,0 +1,95 @@
+from enum import StrEnum
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class GroupBy(StrEnum):
+    LINENO = "lineno"
+    FILENAME = "filename"
+    TRACEBACK = "traceback"
+
+
+class HeapProfilingStart(BaseModel):
+    """
+    How to trace allocations.
+
+    Attributes:
+    -----------
+    frames : int
+        The number of frames of the traceback recorded per allocation; more frames cost more memory and time.
+    sample_rate : float
+        The fraction of requests whose allocations are recorded per route.
+    """
+
+    frames: int = Field(1, ge=1, le=50)
+    sample_rate: float = Field(0.1, ge=0, le=1)
+
+
+class RouteAllocations(BaseModel):
+    """
+    The memory allocated by the sampled requests of a route.
+
+    Attributes:
+    -----------
+    requests : int
+        The number of requests sampled.
+    net_bytes : int
+        The total memory still allocated when those requests ended, i.e. retained or leaked.
+    peak_bytes : int
+        The highest peak above the memory in use when a request started, including concurrent requests.
+    """
+
+    requests: int = 0
+    net_bytes: int = 0
+    peak_bytes: int = 0
+
+
+class HeapStatus(BaseModel):
+    """
+    The state of heap profiling in a worker process.
+
+    Attributes:
+    -----------
+    tracing : bool
+        Whether allocations are traced.
+    traced_bytes : int
+        The memory allocated since tracing started and still in use.
+    peak_bytes : int
+        The peak of the traced memory.
+    sample_rate : float
+        The fraction of requests recorded per route.
+    routes : Dict[str, RouteAllocations]
+        The allocations recorded per route template.
+    """
+
+    tracing: bool
+    traced_bytes: int
+    peak_bytes: int
+    sample_rate: float
+    routes: Dict[str, RouteAllocations]
+
+
+class AllocationSite(BaseModel):
+    """
+    Memory allocated at a source location, or traceback.
+
+    Attributes:
+    -----------
+    traceback : List[str]
+        The `file:line` locations of the allocation, most recent call last.
+    size : int
+        The memory allocated there and still in use, in bytes.
+    count : int
+        The number of blocks allocated there and still in use.
+    size_diff : Optional[int]
+        The growth of the size since the baseline snapshot, for diffs.
+    count_diff : Optional[int]
+        The growth of the count since the baseline snapshot, for diffs.
+    """
+
+    traceback: List[str]
+    size: int
+    count: int
+    size_diff: Optional[int] = None
+    count_diff: Optional[int] = None
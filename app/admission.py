@@ -0,0 +1,124 @@
+from typing import Optional
+
+from fastapi import HTTPException, status
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.config import settings
+from app.database import pool_checkout_listeners
+from app.lifecycle import readiness
+from app.metrics import Gauge, registry
+from app.watchdog import LoopLagMonitor, loop_watchdog
+
+# Weight of the latest sample in the moving average of pool checkout times
+POOL_WAIT_SMOOTHING = 0.2
+
+SERVICE_OVERLOADED = HTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail="Service overloaded, try again later",
+    headers={"Retry-After": "1"},
+)
+SERVICE_SHUTTING_DOWN = HTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail="Service shutting down, try again later",
+    headers={"Retry-After": "1"},
+)
+
+
+class AdmissionController:
+    """
+    Tracks the load of this process to shed expensive requests before it is overloaded.
+
+    The load is measured by the number of requests in flight, the time to check out a database connection from the
+    pool (as a moving average) and the event-loop lag. When any of them passes its threshold, expensive requests are
+    rejected right away so that the requests already admitted, and cheap ones, are still served in time.
+
+    Attributes:
+        max_in_flight (int): The number of requests in flight above which the process is overloaded.
+        max_pool_wait (float): The average pool checkout time above which the process is overloaded, in seconds.
+        max_loop_lag (float): The event-loop lag above which the process is overloaded, in seconds.
+        loop_lag_monitor (LoopLagMonitor): Measures the event-loop lag.
+        in_flight (int): The number of requests in flight.
+        pool_wait (float): The moving average of pool checkout times, in seconds.
+    """
+
+    def __init__(
+        self, max_in_flight: int, max_pool_wait: float, max_loop_lag: float, loop_lag_monitor: LoopLagMonitor
+    ) -> None:
+        self.max_in_flight = max_in_flight
+        self.max_pool_wait = max_pool_wait
+        self.max_loop_lag = max_loop_lag
+        self.loop_lag_monitor = loop_lag_monitor
+        self.in_flight = 0
+        self.pool_wait = 0.0
+
+    def observe_pool_wait(self, seconds: float) -> None:
+        """Record the time a database connection checkout took."""
+        self.pool_wait += POOL_WAIT_SMOOTHING * (seconds - self.pool_wait)
+
+    def overload_reason(self) -> Optional[str]:
+        """
+        Check whether the process is overloaded.
+
+        Returns:
+            Optional[str]: The reason why the process is overloaded, or None if it is not.
+        """
+        if self.in_flight > self.max_in_flight:
+            return f"{self.in_flight} requests in flight"
+        if self.pool_wait > self.max_pool_wait:
+            return f"database pool checkouts take {self.pool_wait:.3f}s"
+        if self.loop_lag_monitor.lag > self.max_loop_lag:
+            return f"event loop lags by {self.loop_lag_monitor.lag:.3f}s"
+        return None
+
+
+admission_controller = AdmissionController(
+    max_in_flight=settings.ADMISSION_MAX_IN_FLIGHT,
+    max_pool_wait=settings.ADMISSION_MAX_POOL_WAIT,
+    max_loop_lag=settings.ADMISSION_MAX_LOOP_LAG,
+    loop_lag_monitor=LoopLagMonitor(interval=settings.LOOP_LAG_INTERVAL),
+)
+pool_checkout_listeners.append(admission_controller.observe_pool_wait)
+
+requests_in_flight = registry.register(Gauge("http_requests_in_flight", "HTTP requests in flight."))
+event_loop_lag = registry.register(
+    Gauge("event_loop_lag_seconds", "Event-loop scheduling lag.", multiprocess_mode="max")
+)
+
+
+def collect_admission() -> None:
+    requests_in_flight.set(admission_controller.in_flight)
+    event_loop_lag.set(admission_controller.loop_lag_monitor.lag)
+
+
+registry.collectors.append(collect_admission)
+
+
+class AdmissionMiddleware:
+    """ASGI middleware counting the HTTP requests in flight for the admission controller."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        admission_controller.loop_lag_monitor.start()
+        loop_watchdog.start()
+        admission_controller.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission_controller.in_flight -= 1
+
+
+async def admit() -> None:
+    """
+    Dependency rejecting expensive requests with a 503 error while the process is overloaded or shutting down.
+
+    It has no sub-dependencies, so listed first in a route's dependencies it runs before authentication.
+    """
+    if readiness.draining:  # Retried on another replica, rather than cut off by the shutdown
+        raise SERVICE_SHUTTING_DOWN
+    if admission_controller.overload_reason() is not None:
+        raise SERVICE_OVERLOADED
@@ -1,14 +1,58 @@
-import firebase_admin
-from fastapi import FastAPI
-from firebase_admin import credentials
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
 
+from fastapi import FastAPI, status
+from fastapi.responses import JSONResponse
+
+from app.admin.heap import HeapProfilerMiddleware
+from app.admin.profiler import RequestProfilerMiddleware
+from app.admin.router import router as admin_router
+from app.admission import AdmissionMiddleware
+from app.batch.router import router as batch_router
 from app.chat.router import router as chat_router
+from app.chat.turns import turn_pool
+from app.chat.usage import usage_meter
+from app.chat.utils import close_llm_connections, prewarm_llm_connections
 from app.config import settings
+from app.database import dispose_engine, prewarm_pool
+from app.lifecycle import readiness
+from app.log import RequestLogMiddleware
+from app.metrics import MetricsMiddleware, metrics_endpoint, registry
+from app.querylog import QueryLogMiddleware
+from app.tracing import TracingMiddleware, tracer
 from app.tutor.router import router as tutor_router
+from app.user.firebase import get_firebase_app
 from app.user.router import router as user_router
 
-cred = credentials.Certificate(settings.FIREBASE_KEY_FILE)
-firebase_admin.initialize_app(cred)
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """
+    Set up the resources of the application before it serves requests, and release them on shutdown.
+
+    Resources are otherwise created on first use, so that importing the application stays cheap for tests and tools.
+    On shutdown, the queued chat turns are answered first, until the shutdown deadline.
+    """
+    await asyncio.to_thread(get_firebase_app)
+    if settings.PREWARM:
+        await asyncio.gather(prewarm_pool(), prewarm_llm_connections(settings.PREWARM_LLM_CONNECTIONS))
+    yield
+    if not readiness.draining:  # Stopped without SIGTERM, e.g. by Ctrl-C
+        readiness.start_draining(settings.SHUTDOWN_TIMEOUT)
+    abandoned = await turn_pool.drain(readiness.time_left())
+    if abandoned:
+        logger.warning("Abandoned %d chat turns at the shutdown deadline", abandoned)
+    await usage_meter.flush()
+    if tracer.processor is not None:
+        await asyncio.to_thread(tracer.processor.flush)
+    if settings.METRICS_DIR is not None:
+        registry.write_snapshot(settings.METRICS_DIR)
+    await close_llm_connections()
+    await dispose_engine()
 
 
 def create_app() -> FastAPI:
@@ -21,14 +65,35 @@ def create_app() -> FastAPI:
     app = FastAPI(
         title=settings.PROJECT_NAME,
         openapi_url="/polyglot.json" if settings.show_docs else None,
+        lifespan=lifespan,
     )
 
     app.include_router(user_router, prefix="/users")  # TODO: consider removing prefix
     app.include_router(chat_router)
     app.include_router(tutor_router)
+    app.include_router(batch_router)
+    app.include_router(admin_router)
+
+    app.add_middleware(AdmissionMiddleware)
+    app.add_middleware(QueryLogMiddleware)
+    app.add_middleware(TracingMiddleware)
+    app.add_middleware(HeapProfilerMiddleware)
+    app.add_middleware(RequestProfilerMiddleware)
+    app.add_middleware(RequestLogMiddleware)
+    app.add_middleware(MetricsMiddleware)  # Outermost, to time the whole stack
+
+    app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
 
     @app.get("/_health", include_in_schema=False)
     async def health():
         return {"status": "ok"}
 
+    @app.get("/_ready", include_in_schema=False)
+    async def ready():
+        result = await readiness.check()
+        return JSONResponse(
+            {"status": "ok" if result.ready else "unavailable", "checks": result.checks},
+            status_code=status.HTTP_200_OK if result.ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
+
     return app
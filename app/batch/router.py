@@ -0,0 +1,61 @@
+import asyncio
+import json
+
+import httpx
+from fastapi import APIRouter, Depends, Request
+from fastapi.security import HTTPAuthorizationCredentials
+
+from app.batch.schemas import (
+    BatchRequest,
+    BatchRequestItem,
+    BatchResponse,
+    BatchResponseItem,
+)
+from app.config import settings
+from app.user.auth import ActiveVerifiedUser, authenticated_users, security
+
+router = APIRouter(
+    tags=["batch"],
+)
+
+# Headers describing the batch request body itself, which must not leak into sub-requests
+_EXCLUDED_HEADERS = {"content-length", "content-type", "content-encoding", "transfer-encoding", "host"}
+
+
+async def _dispatch(
+    client: httpx.AsyncClient, item: BatchRequestItem, semaphore: asyncio.Semaphore
+) -> BatchResponseItem:
+    """Run a single sub-request against the application and decode its response."""
+    async with semaphore:
+        response = await client.request(
+            item.method, item.path, json=item.body if item.method != "GET" else None  # type: ignore[arg-type]
+        )
+    body = None
+    if response.content:
+        try:
+            body = response.json()
+        except json.JSONDecodeError:
+            body = response.text
+    return BatchResponseItem(id=item.id, status=response.status_code, body=body)
+
+
+@router.post("/batch")
+async def batch(
+    batch_request: BatchRequest,
+    request: Request,
+    user: ActiveVerifiedUser,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+) -> BatchResponse:
+    """
+    Run several independent requests in a single round-trip.
+
+    The caller is authenticated once; sub-requests run concurrently in-process against the same application, reuse
+    that authentication and are answered in request order. Sub-requests must not depend on each other.
+    """
+    authenticated_users.set({credentials.credentials: user})  # Copied into each sub-request task below
+    headers = [(key, value) for key, value in request.headers.items() if key not in _EXCLUDED_HEADERS]
+    semaphore = asyncio.Semaphore(settings.BATCH_MAX_CONCURRENCY)
+    transport = httpx.ASGITransport(app=request.app, raise_app_exceptions=False)  # type: ignore[arg-type]
+    async with httpx.AsyncClient(transport=transport, base_url=str(request.base_url), headers=headers) as client:
+        responses = await asyncio.gather(*(_dispatch(client, item, semaphore) for item in batch_request.requests))
+    return BatchResponse(responses=list(responses))
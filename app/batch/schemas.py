@@ -0,0 +1,83 @@
+from enum import StrEnum
+from typing import Any, List, Optional
+
+from pydantic import BaseModel, validator
+
+from app.config import settings
+
+
+class BatchMethod(StrEnum):
+    """HTTP method of a batched sub-request."""
+
+    GET = "GET"
+    POST = "POST"
+    PUT = "PUT"
+    DELETE = "DELETE"
+
+
+class BatchRequestItem(BaseModel):
+    """
+    A sub-request of a batch request.
+
+    Attributes:
+    -----------
+    id : Optional[str]
+        A client-chosen identifier echoed back in the matching response.
+    method : BatchMethod
+        The HTTP method of the sub-request.
+    path : str
+        The path (and query string) of the sub-request, e.g. `/chats?fields=id`.
+    body : Optional[Any]
+        The JSON body of the sub-request.
+    """
+
+    id: Optional[str] = None
+    method: BatchMethod = BatchMethod.GET
+    path: str
+    body: Optional[Any] = None
+
+    @validator("path")
+    def validate_path(cls, v):
+        """
+        Validates that the path is absolute and does not target the batch endpoint itself.
+
+        Raises:
+            ValueError: If the path is relative or a nested batch request.
+        """
+        if not v.startswith("/"):
+            raise ValueError("Path must start with /")
+        if v.split("?", 1)[0].rstrip("/") == "/batch":
+            raise ValueError("Batch requests cannot be nested")
+        return v
+
+
+class BatchRequest(BaseModel):
+    """A list of independent sub-requests to run in a single round-trip."""
+
+    requests: List[BatchRequestItem]
+
+    @validator("requests")
+    def validate_requests(cls, v):
+        """
+        Validates that the batch is not empty and not larger than the configured maximum.
+
+        Raises:
+            ValueError: If the batch is empty or too large.
+        """
+        if not v:
+            raise ValueError("At least one request is required")
+        if len(v) > settings.BATCH_MAX_REQUESTS:
+            raise ValueError(f"At most {settings.BATCH_MAX_REQUESTS} requests can be batched")
+        return v
+
+
+class BatchResponseItem(BaseModel):
+    """The response to a sub-request, in the same order as the request."""
+
+    id: Optional[str] = None
+    status: int
+    body: Optional[Any] = None
+
+
+class BatchResponse(BaseModel):
+    responses: List[BatchResponseItem]
@@ -0,0 +1,116 @@
+import struct
+import uuid
+from datetime import datetime
+from typing import List
+
+import orjson
+import sqlalchemy as sa
+import zstandard
+from pydantic import BaseModel, parse_obj_as
+from sqlalchemy import UUID, DateTime, ForeignKey, Integer, LargeBinary
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+from .schemas import OpenAIMessage
+
+# Version byte and uncompressed length of the serialized message history
+ARCHIVE_HEADER = struct.Struct(">BI")
+ARCHIVE_FORMAT_VERSION = 1
+
+
+class InvalidArchiveError(ValueError):
+    """Raised when an archived message history cannot be decoded."""
+
+    pass
+
+
+def pack_message_history(message_history: List[OpenAIMessage], level: int = 3) -> bytes:
+    """
+    Serialize and compress a message history for cold storage.
+
+    The blob is a header holding the format version and the uncompressed length, followed by a zstd frame of the JSON
+    message history.
+
+    Args:
+        message_history (List[OpenAIMessage]): The message history to archive.
+        level (int): The zstd compression level.
+
+    Returns:
+        bytes: The archived message history.
+    """
+    raw = orjson.dumps([message.dict() for message in message_history])
+    return ARCHIVE_HEADER.pack(ARCHIVE_FORMAT_VERSION, len(raw)) + zstandard.ZstdCompressor(level=level).compress(raw)
+
+
+def unpack_message_history(data: bytes) -> List[OpenAIMessage]:
+    """
+    Decompress and deserialize an archived message history.
+
+    Args:
+        data (bytes): The archived message history, see `pack_message_history`.
+
+    Returns:
+        List[OpenAIMessage]: The message history.
+
+    Raises:
+        InvalidArchiveError: Raised if the blob is corrupted or uses an unknown format.
+    """
+    if len(data) < ARCHIVE_HEADER.size:
+        raise InvalidArchiveError("Archive is truncated.")
+    version, raw_size = ARCHIVE_HEADER.unpack_from(data)
+    if version != ARCHIVE_FORMAT_VERSION:
+        raise InvalidArchiveError(f"Unknown archive format version {version}.")
+    try:
+        raw = zstandard.ZstdDecompressor().decompress(data[ARCHIVE_HEADER.size :], max_output_size=raw_size)
+    except zstandard.ZstdError as e:
+        raise InvalidArchiveError(f"Archive is corrupted: {e}") from e
+    if len(raw) != raw_size:
+        raise InvalidArchiveError("Archive is corrupted: unexpected length.")
+    return parse_obj_as(List[OpenAIMessage], orjson.loads(raw))
+
+
+class ChatSessionArchive(Base):
+    """
+    The cold-storage copy of the message history of an archived chat session.
+
+    The chat session row is kept as a stub with an empty message history, and is rehydrated from this archive when
+    loaded.
+
+    Attributes:
+        chat_session_id (uuid.UUID): The unique identifier for the archived chat session.
+        data (bytes): The compressed message history, see `pack_message_history`.
+        raw_size (int): The size of the uncompressed message history, in bytes.
+        archived_at (datetime): The time the chat session was archived.
+    """
+
+    __tablename__ = "chat_session_archive"
+
+    chat_session_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("chat_session.id", ondelete="CASCADE"), primary_key=True
+    )
+    data: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    raw_size: Mapped[int] = mapped_column(Integer, nullable=False)
+    archived_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=sa.func.now())
+
+
+class ArchiveReport(BaseModel):
+    """
+    The outcome of an archiving run.
+
+    Attributes:
+    -----------
+    rows : int
+        The number of chat sessions archived.
+    raw_bytes : int
+        The size of their uncompressed message histories.
+    compressed_bytes : int
+        The size of their archives.
+    duration : float
+        The duration of the run, in seconds.
+    """
+
+    rows: int = 0
+    raw_bytes: int = 0
+    compressed_bytes: int = 0
+    duration: float = 0
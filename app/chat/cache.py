@@ -0,0 +1,159 @@
+import hashlib
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import orjson
+import sqlalchemy as sa
+from sqlalchemy import DateTime, String
+from sqlalchemy.dialects.postgresql import JSONB, insert
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.config import settings
+from app.database import Base, async_session
+from app.metrics import completion_cache_requests
+from app.utils import SingleFlight
+
+
+class CompletionCacheEntry(Base):
+    """
+    A cached chat completion, used as the second tier of the completion cache.
+
+    Attributes:
+        key (str): The hash of the completion request.
+        response (dict): The completion message.
+        expires_at (datetime): The time after which the entry must not be used.
+    """
+
+    __tablename__ = "completion_cache"
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    response: Mapped[Dict[str, Any]] = mapped_column(JSONB, nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class CompletionCache:
+    """
+    A content-addressed cache of chat completions.
+
+    Completions are keyed by a canonical hash of the request, and stored in a size-bounded in-memory LRU and,
+    optionally, in Postgres so that replicas and restarted workers share entries. Concurrent misses for the same key
+    are coalesced into a single completion.
+
+    Attributes:
+        max_size (int): The maximum number of entries kept in memory.
+        use_db (bool): Whether to use the Postgres-backed second tier.
+        stats (Dict[str, int]): Hit and miss counters.
+    """
+
+    def __init__(self, max_size: int, use_db: bool = False) -> None:
+        self.max_size = max_size
+        self.use_db = use_db
+        self.stats = {"memory_hits": 0, "db_hits": 0, "misses": 0}
+        self._entries: OrderedDict[str, Tuple[float, Dict[str, Any]]] = OrderedDict()
+        self._in_flight: SingleFlight[Dict[str, Any]] = SingleFlight()
+
+    @staticmethod
+    def key(model: str, messages: List[Dict[str, Any]], **kwargs) -> str:
+        """
+        Compute the canonical hash of a completion request.
+
+        Args:
+            model (str): The ID of the model.
+            messages (List[Dict[str, Any]]): The messages, as sent to the API.
+            **kwargs: The other parameters of the request.
+
+        Returns:
+            str: The hex-encoded SHA-256 of the request.
+        """
+        request = {"model": model, "messages": messages, "params": kwargs}
+        return hashlib.sha256(orjson.dumps(request, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+    def clear(self) -> None:
+        """Clear the in-memory tier."""
+        self._entries.clear()
+
+    def _get_memory(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, response = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return response
+
+    def _set_memory(self, key: str, response: Dict[str, Any], ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def _get_db(self, key: str) -> Optional[Tuple[float, Dict[str, Any]]]:
+        query = sa.select(CompletionCacheEntry.response, CompletionCacheEntry.expires_at).where(
+            CompletionCacheEntry.key == key, CompletionCacheEntry.expires_at > sa.func.now()
+        )
+        async with async_session() as session:
+            row = (await session.execute(query)).first()
+        if row is None:
+            return None
+        ttl = (row.expires_at - datetime.now(timezone.utc)).total_seconds()
+        return ttl, row.response
+
+    async def _set_db(self, key: str, response: Dict[str, Any], ttl: float) -> None:
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=ttl)
+        query = (
+            insert(CompletionCacheEntry)
+            .values(key=key, response=response, expires_at=expires_at)
+            .on_conflict_do_update(
+                index_elements=[CompletionCacheEntry.key], set_={"response": response, "expires_at": expires_at}
+            )
+        )
+        async with async_session() as session:
+            await session.execute(query)
+            await session.commit()
+
+    async def get_or_create(
+        self, key: str, create: Callable[[], Awaitable[Dict[str, Any]]], ttl: float
+    ) -> Dict[str, Any]:
+        """
+        Get a cached completion, or create and cache it.
+
+        Args:
+            key (str): The hash of the completion request, see `CompletionCache.key`.
+            create (Callable[[], Awaitable[Dict[str, Any]]]): Creates the completion on a miss.
+            ttl (float): How long a new entry stays valid, in seconds.
+
+        Returns:
+            Dict[str, Any]: The completion message.
+        """
+        response = self._get_memory(key)
+        if response is not None:
+            self.stats["memory_hits"] += 1
+            completion_cache_requests.inc("memory_hit")
+            return response
+        return await self._in_flight.do(key, lambda: self._get_or_create(key, create, ttl))
+
+    async def _get_or_create(
+        self, key: str, create: Callable[[], Awaitable[Dict[str, Any]]], ttl: float
+    ) -> Dict[str, Any]:
+        if self.use_db:
+            db_entry = await self._get_db(key)
+            if db_entry is not None:
+                self.stats["db_hits"] += 1
+                completion_cache_requests.inc("db_hit")
+                remaining_ttl, response = db_entry
+                self._set_memory(key, response, remaining_ttl)
+                return response
+        self.stats["misses"] += 1
+        completion_cache_requests.inc("miss")
+        response = await create()
+        self._set_memory(key, response, ttl)
+        if self.use_db:
+            await self._set_db(key, response, ttl)
+        return response
+
+
+completion_cache = CompletionCache(max_size=settings.COMPLETION_CACHE_SIZE, use_db=settings.COMPLETION_CACHE_DB)
@@ -0,0 +1,46 @@
+import logging
+from datetime import timedelta
+
+import sqlalchemy as sa
+
+from app.chat.cache import CompletionCacheEntry
+from app.chat.models import ChatSession
+from app.chat.purge import purge_deleted_chat_sessions
+from app.config import settings
+from app.database import async_session
+from app.jobs.worker import job
+
+logger = logging.getLogger(__name__)
+
+
+@job("completion_cache.cleanup", interval=60 * 60)
+async def cleanup_completion_cache() -> None:
+    """Delete expired entries of the completion cache database tier."""
+    query = sa.delete(CompletionCacheEntry).where(CompletionCacheEntry.expires_at <= sa.func.now())
+    async with async_session() as session:
+        await session.execute(query)
+        await session.commit()
+
+
+@job("chat.purge", interval=24 * 60 * 60, visibility_timeout=600)
+async def purge_chat_sessions() -> None:
+    """Hard-delete chat sessions soft-deleted for longer than the retention period."""
+    await purge_deleted_chat_sessions(
+        retention=timedelta(days=settings.CHAT_PURGE_RETENTION_DAYS),
+        batch_size=settings.CHAT_PURGE_BATCH_SIZE,
+        rows_per_second=settings.CHAT_PURGE_ROWS_PER_SECOND,
+        pause_every=settings.CHAT_PURGE_PAUSE_EVERY,
+        pause=settings.CHAT_PURGE_PAUSE,
+        vacuum=settings.CHAT_PURGE_VACUUM,
+    )
+
+
+@job("chat.archive", interval=60 * 60, visibility_timeout=600)
+async def archive_chat_sessions() -> None:
+    """Move the message history of idle chat sessions to cold storage."""
+    report = await ChatSession.archive_idle(
+        idle=timedelta(days=settings.CHAT_ARCHIVE_IDLE_DAYS),
+        batch_size=settings.CHAT_ARCHIVE_BATCH_SIZE,
+        level=settings.CHAT_ARCHIVE_COMPRESSION_LEVEL,
+    )
+    logger.info("Archived idle chat sessions: %s", report)
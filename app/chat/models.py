@@ -1,11 +1,25 @@
+import asyncio
+import hashlib
+import time
 import uuid
-from datetime import datetime
-from typing import List, Optional, Sequence
-
-from sqlalchemy import UUID, ForeignKey, Integer, text
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Callable, List, Optional, Sequence
+
+import sqlalchemy as sa
+from sqlalchemy import UUID, DateTime, ForeignKey, Index, Integer, text
+from sqlalchemy.orm import (
+    Mapped,
+    joinedload,
+    load_only,
+    mapped_column,
+    noload,
+    relationship,
+)
+from sqlalchemy.orm.attributes import set_committed_value
 
+from app.chat.usage import UsageAttribution
 from app.chat.utils import get_chat_response
+from app.config import settings
 from app.database import (
     Base,
     DeleteMixin,
@@ -15,7 +29,15 @@ from app.database import (
 )
 from app.tutor.models import Tutor
 from app.user.models import User
-
+from app.utils import FieldSelection
+
+from .archive import (
+    ARCHIVE_HEADER,
+    ArchiveReport,
+    ChatSessionArchive,
+    pack_message_history,
+    unpack_message_history,
+)
 from .schemas import MessageWrite, OpenAIMessage, OpenAIMessageRole
 
 DEFAULT_MAX_TOKENS = 100
@@ -28,6 +50,56 @@ class MessageHistoryTooLongError(Exception):
     pass
 
 
+class MessageUUIDReusedError(Exception):
+    """Raised when a message uuid (or idempotency key) is reused for a different message."""
+
+    pass
+
+
+def _find_user_message(message_history: List[OpenAIMessage], message_uuid: str) -> Optional[int]:
+    for index, stored_message in enumerate(message_history):
+        if stored_message.uuid == message_uuid and stored_message.role == OpenAIMessageRole.USER:
+            return index
+    return None
+
+
+def _with_reply(
+    message_history: List[OpenAIMessage], user_message: OpenAIMessage, reply: OpenAIMessage
+) -> List[OpenAIMessage]:
+    """
+    Store the reply to a user message in a message history, right after the user message.
+
+    The user message is appended first if it is not stored yet. If the user message was already answered, e.g. by a
+    concurrent request, the history is left as is.
+
+    Returns:
+        List[OpenAIMessage]: The new message history.
+    """
+    index = _find_user_message(message_history, str(user_message.uuid))
+    if index is None:
+        return message_history + [user_message, reply]
+    if any(message.role == OpenAIMessageRole.ASSISTANT for message in message_history[index + 1 :]):
+        return message_history
+    return message_history[: index + 1] + [reply] + message_history[index + 1 :]  # Always use copy-on-write
+
+
+def idempotency_key_to_uuid(user_id: uuid.UUID, idempotency_key: str) -> uuid.UUID:
+    """
+    Derive a stable message uuid from a user's idempotency key.
+
+    The uuid is scoped to the user and shaped as a version 4 uuid, so that it can be stored like any other message uuid.
+
+    Args:
+        user_id (uuid.UUID): The unique identifier for the user sending the message.
+        idempotency_key (str): The idempotency key supplied by the client.
+
+    Returns:
+        uuid.UUID: The message uuid.
+    """
+    digest = hashlib.sha256(f"{user_id}:{idempotency_key}".encode()).digest()
+    return uuid.UUID(bytes=digest[:16], version=4)
+
+
 class ChatSession(Base, TimestampMixin, DeleteMixin):
     """
     Represents a chat session between a user and an AI tutor.
@@ -39,9 +111,21 @@ class ChatSession(Base, TimestampMixin, DeleteMixin):
         message_history (list): The list of messages exchanged during the chat session.
         tutor_id (uuid.UUID): The unique identifier for the tutor associated with the chat session.
         tutor (Tutor): The tutor associated with the chat session.
+        archived_at (Optional[datetime]): If set, the message history was moved to a `ChatSessionArchive` and is
+            rehydrated when the chat session is loaded.
     """
 
     __tablename__ = "chat_session"
+    __table_args__ = (
+        # Keyset order of the purge of soft-deleted sessions
+        Index("chat_session_deleted_at_idx", "deleted_at", "id", postgresql_where=text("deleted_at IS NOT NULL")),
+        # Idle sessions to archive
+        Index(
+            "chat_session_archivable_idx",
+            "updated_at",
+            postgresql_where=text("archived_at IS NULL AND deleted_at IS NULL"),
+        ),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)  # type: ignore
     user_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey(User.id), nullable=False)  # type: ignore
@@ -53,6 +137,7 @@ class ChatSession(Base, TimestampMixin, DeleteMixin):
     max_messages: Mapped[int] = mapped_column(Integer, nullable=False, default=DEFAULT_MAX_MESSAGES)
     tutor_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("tutor.id"), nullable=False)
     tutor: Mapped[Tutor] = relationship("Tutor", lazy="joined")
+    archived_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
 
     def __repr__(self) -> str:
         """
@@ -105,12 +190,43 @@ class ChatSession(Base, TimestampMixin, DeleteMixin):
             return chat_session
 
     @classmethod
-    async def get(cls, chat_session_id: uuid.UUID) -> Optional["ChatSession"]:
+    def load_options(cls, fields: Optional[FieldSelection]) -> list:
+        """
+        Get the loader options that restrict a query to the columns and relationships needed for a sparse fieldset.
+
+        Unselected columns (notably the `message_history` JSONB) are not fetched, the `user` relationship is not
+        joined, and the `tutor` relationship is only joined when selected.
+
+        Args:
+            fields (Optional[FieldSelection]): The sparse fieldset, or None to load everything.
+
+        Returns:
+            list: The loader options to pass to `Select.options`.
+        """
+        if fields is None:
+            return []
+        columns = [getattr(cls, field) for field in ("user_id", "tutor_id", "message_history") if field in fields]
+        if "message_history" in fields:
+            columns.append(cls.archived_at)  # Needed to rehydrate archived sessions
+        options = [load_only(cls.id, *columns), noload(cls.user)]
+        if "tutor" in fields:
+            tutor_fields = fields["tutor"]
+            tutor_loader = joinedload(cls.tutor)
+            if tutor_fields is not None:
+                tutor_loader = tutor_loader.load_only(*Tutor.columns(tutor_fields))
+            options.append(tutor_loader)
+        else:
+            options.append(noload(cls.tutor))
+        return options
+
+    @classmethod
+    async def get(cls, chat_session_id: uuid.UUID, fields: Optional[FieldSelection] = None) -> Optional["ChatSession"]:
         """
         Get a chat session by its unique identifier.
 
         Args:
             chat_session_id (uuid.UUID): The unique identifier for the chat session.
+            fields (Optional[FieldSelection]): If given, only load what this sparse fieldset needs.
 
         Returns:
             ChatSession: The chat session with the given unique identifier.
@@ -118,29 +234,82 @@ class ChatSession(Base, TimestampMixin, DeleteMixin):
         Raises:
             ChatSessionNotFoundError: Raised if no chat session with the given unique identifier exists.
         """
-        query = cls.default_query().where(cls.id == chat_session_id)
+        query = cls.default_query().where(cls.id == chat_session_id).options(*cls.load_options(fields))
         async with async_session() as session:
             result = await session.execute(query)
-            return result.scalars().first()
+            chat_session = result.scalars().first()
+        if chat_session is not None and chat_session.is_archived(fields):
+            await chat_session.rehydrate()
+        return chat_session
 
     @classmethod
-    async def get_by_user_id(cls, user_id: uuid.UUID) -> Sequence["ChatSession"]:
+    async def get_by_user_id(
+        cls, user_id: uuid.UUID, fields: Optional[FieldSelection] = None
+    ) -> Sequence["ChatSession"]:
         """
         Get chat sessions by the user's unique identifier.
+
+        Args:
+            user_id (uuid.UUID): The unique identifier for the user.
+            fields (Optional[FieldSelection]): If given, only load what this sparse fieldset needs.
         """
-        query = cls.default_query().where(cls.user_id == user_id)
+        query = cls.default_query().where(cls.user_id == user_id).options(*cls.load_options(fields))
         async with async_session() as session:
             result = await session.execute(query)
-            return result.scalars().unique().all()  # TODO: check how this performs over time
+            chat_sessions = result.scalars().unique().all()  # TODO: check how this performs over time
+        archived = {chat_session.id: chat_session for chat_session in chat_sessions if chat_session.is_archived(fields)}
+        if archived:
+            # Listing sessions does not make them active again, so only decompress them without moving them back
+            query = sa.select(ChatSessionArchive).where(ChatSessionArchive.chat_session_id.in_(archived))
+            async with async_session() as session:
+                for archive in (await session.execute(query)).scalars():
+                    chat_session = archived[archive.chat_session_id]
+                    message_history = unpack_message_history(archive.data) + chat_session.message_history
+                    set_committed_value(chat_session, "message_history", message_history)
+        return chat_sessions
 
     @classmethod
-    async def get_by_id_user_id(cls, chat_session_id: uuid.UUID, user_id: uuid.UUID) -> Optional["ChatSession"]:
+    async def stream_by_user_id(cls, user_id: uuid.UUID, batch_size: int = 50) -> AsyncIterator["ChatSession"]:
+        """
+        Stream all the chat sessions of a user, soft-deleted ones included, from a server-side cursor.
+
+        Only `batch_size` chat sessions are held in memory at a time, and the next batch is only fetched once the
+        caller consumed the previous one, so that any number of chat sessions is read in bounded memory. Archived
+        message histories are decompressed without moving them back.
+
+        Args:
+            user_id (uuid.UUID): The unique identifier for the user.
+            batch_size (int): The number of chat sessions fetched at a time.
+
+        Yields:
+            ChatSession: The chat sessions, oldest first, with their tutor.
+        """
+        query = (
+            sa.select(cls, ChatSessionArchive.data)
+            .outerjoin(ChatSessionArchive, ChatSessionArchive.chat_session_id == cls.id)
+            .where(cls.user_id == user_id)
+            .order_by(cls.created_at, cls.id)
+            .options(noload(cls.user), joinedload(cls.tutor))
+            .execution_options(yield_per=batch_size)
+        )
+        async with async_session() as session:
+            async for chat_session, archive_data in await session.stream(query):
+                if archive_data is not None:
+                    message_history = unpack_message_history(archive_data) + chat_session.message_history
+                    set_committed_value(chat_session, "message_history", message_history)
+                yield chat_session
+
+    @classmethod
+    async def get_by_id_user_id(
+        cls, chat_session_id: uuid.UUID, user_id: uuid.UUID, fields: Optional[FieldSelection] = None
+    ) -> Optional["ChatSession"]:
         """
         Get a chat session by its unique identifier and the user's unique identifier.
 
         Args:
             chat_session_id (uuid.UUID): The unique identifier for the chat session.
             user_id (uuid.UUID): The unique identifier for the user.
+            fields (Optional[FieldSelection]): If given, only load what this sparse fieldset needs.
 
         Returns:
             ChatSession: The chat session with the given unique identifier and user's unique identifier.
@@ -148,10 +317,289 @@ class ChatSession(Base, TimestampMixin, DeleteMixin):
         Raises:
             ChatSessionNotFoundError: Raised if no chat session with the given unique identifier and user's unique identifier exists.
         """
-        query = cls.default_query().where(cls.id == chat_session_id, cls.user_id == user_id)
+        query = (
+            cls.default_query()
+            .where(cls.id == chat_session_id, cls.user_id == user_id)
+            .options(*cls.load_options(fields))
+        )
         async with async_session() as session:
             result = await session.execute(query)
-            return result.scalars().first()
+            chat_session = result.scalars().first()
+        if chat_session is not None and chat_session.is_archived(fields):
+            await chat_session.rehydrate()
+        return chat_session
+
+    def is_archived(self, fields: Optional[FieldSelection] = None) -> bool:
+        """
+        Check whether the message history of the chat session is archived and must be rehydrated.
+
+        Args:
+            fields (Optional[FieldSelection]): The sparse fieldset the chat session was loaded with, if any.
+
+        Returns:
+            bool: Whether the message history was loaded and is archived.
+        """
+        if fields is not None and "message_history" not in fields:
+            return False
+        return self.archived_at is not None
+
+    async def rehydrate(self) -> None:
+        """
+        Move the message history of an archived chat session back from cold storage.
+
+        Messages stored since the chat session was archived follow the archived ones. The time of the last activity in
+        the chat session is kept.
+        """
+        async with async_session() as session:
+            archive = await session.get(ChatSessionArchive, self.id, with_for_update=True)
+            query = sa.select(ChatSession.message_history).where(ChatSession.id == self.id)
+            message_history = (await session.execute(query)).scalar_one()
+            if archive is not None:
+                message_history = unpack_message_history(archive.data) + message_history
+                await session.delete(archive)
+            await session.execute(
+                sa.update(ChatSession)
+                .where(ChatSession.id == self.id)
+                .values(message_history=message_history, archived_at=None, updated_at=ChatSession.updated_at)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+        set_committed_value(self, "message_history", message_history)
+        set_committed_value(self, "archived_at", None)
+
+    @classmethod
+    async def archive_idle(cls, idle: timedelta, batch_size: int = 100, level: int = 3) -> ArchiveReport:
+        """
+        Move the message history of chat sessions idle for longer than a period to cold storage.
+
+        Each batch of sessions is archived in its own short transaction, skipping sessions locked by requests. Only a
+        stub row with an empty message history is kept in `chat_session`. Archiving is not activity, so `updated_at`
+        is kept.
+
+        Args:
+            idle (timedelta): How long a chat session must not have been updated to be archived.
+            batch_size (int): The number of chat sessions archived per transaction.
+            level (int): The zstd compression level.
+
+        Returns:
+            ArchiveReport: The number of sessions archived and the storage they use before and after compression.
+        """
+        report = ArchiveReport()
+        started_at = time.monotonic()
+        cutoff = datetime.now(timezone.utc) - idle
+        query = (
+            sa.select(cls.id, cls.message_history)
+            .where(cls.archived_at.is_(None), cls.deleted_at.is_(None), cls.updated_at < cutoff)
+            .order_by(cls.updated_at)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        while True:
+            async with async_session() as session:
+                rows = (await session.execute(query)).all()
+                if not rows:
+                    break
+                # zstd releases the GIL, so compress off the event loop
+                blobs = await asyncio.to_thread(
+                    lambda: [pack_message_history(message_history, level) for _, message_history in rows]
+                )
+                archives = [
+                    dict(chat_session_id=row.id, data=data, raw_size=ARCHIVE_HEADER.unpack_from(data)[1])
+                    for row, data in zip(rows, blobs)
+                ]
+                await session.execute(sa.insert(ChatSessionArchive), archives)
+                await session.execute(
+                    sa.update(cls)
+                    .where(cls.id.in_([row.id for row in rows]))
+                    .values(message_history=[], archived_at=sa.func.now(), updated_at=cls.updated_at)
+                    .execution_options(synchronize_session=False)
+                )
+                await session.commit()
+            report.rows += len(rows)
+            report.raw_bytes += sum(archive["raw_size"] for archive in archives)
+            report.compressed_bytes += sum(len(archive["data"]) for archive in archives)
+            if len(rows) < batch_size:
+                break
+        report.duration = time.monotonic() - started_at
+        return report
+
+    @property
+    def usage_attribution(self) -> UsageAttribution:
+        """Who the chat completions of the chat session are billed to."""
+        return UsageAttribution(user_id=self.user_id, tutor_id=self.tutor_id, chat_session_id=self.id)
+
+    def _find_user_message(self, message_uuid: str) -> Optional[int]:
+        return _find_user_message(self.message_history, message_uuid)
+
+    async def _update_message_history(
+        self, update: Callable[[List[OpenAIMessage]], List[OpenAIMessage]]
+    ) -> List[OpenAIMessage]:
+        """
+        Change the stored message history of the chat session, and commit it.
+
+        The change is applied to the stored message history with its row locked, rather than to the one loaded
+        before awaiting a completion, so that messages stored concurrently by other requests are not overwritten. If
+        the chat session was archived meanwhile, the change is applied to the full message history, moved back from
+        cold storage.
+
+        Args:
+            update (Callable[[List[OpenAIMessage]], List[OpenAIMessage]]): Returns the new message history, given the
+                stored one. Must not modify it in place.
+
+        Returns:
+            List[OpenAIMessage]: The new message history.
+        """
+        async with async_session() as session:
+            query = (
+                sa.select(ChatSession.message_history, ChatSession.archived_at)
+                .where(ChatSession.id == self.id)
+                .with_for_update()
+            )
+            message_history, archived_at = (await session.execute(query)).one()
+            if archived_at is not None:
+                archive = await session.get(ChatSessionArchive, self.id, with_for_update=True)
+                if archive is not None:
+                    message_history = unpack_message_history(archive.data) + message_history
+                    await session.delete(archive)
+            message_history = update(message_history)
+            await session.execute(
+                sa.update(ChatSession)
+                .where(ChatSession.id == self.id)
+                .values(message_history=message_history, archived_at=None)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+        set_committed_value(self, "message_history", message_history)
+        set_committed_value(self, "archived_at", None)
+        return message_history
+
+    def has_message(self, message_uuid: str) -> bool:
+        """
+        Check whether a user message with the given uuid is stored in the chat session.
+
+        Args:
+            message_uuid (str): The uuid of the user's message.
+
+        Returns:
+            bool: Whether the message is stored.
+        """
+        return self._find_user_message(message_uuid) is not None
+
+    def get_reply(self, message_uuid: str) -> Optional[OpenAIMessage]:
+        """
+        Get the tutor's stored reply to a user message.
+
+        Args:
+            message_uuid (str): The uuid of the user's message.
+
+        Returns:
+            Optional[OpenAIMessage]: The reply, or None if the message is not stored or not answered yet.
+        """
+        index = self._find_user_message(message_uuid)
+        if index is None:
+            return None
+        for response in self.message_history[index + 1 :]:
+            if response.role == OpenAIMessageRole.ASSISTANT:
+                return response
+        return None
+
+    def get_stored_response(self, message: MessageWrite) -> Optional[OpenAIMessage]:
+        """
+        Get the tutor's stored response to a message that was already sent with the same uuid.
+
+        Args:
+            message (MessageWrite): The user's message.
+
+        Returns:
+            Optional[OpenAIMessage]: The stored response, or None if the message has not been answered yet.
+
+        Raises:
+            MessageUUIDReusedError: Raised if the stored message with this uuid has a different content.
+        """
+        if message.uuid is None:
+            return None
+        message_uuid = str(message.uuid)
+        index = self._find_user_message(message_uuid)
+        if index is None:
+            return None
+        if self.message_history[index].content != message.content:
+            raise MessageUUIDReusedError(f"Message {message_uuid} was already sent with a different content.")
+        return self.get_reply(message_uuid)
+
+    def _new_user_message(self, message: MessageWrite) -> OpenAIMessage:
+        return OpenAIMessage(
+            role=OpenAIMessageRole.USER,
+            content=message.content,
+            name=self.user.name,
+            timestamp_ms=datetime.now().timestamp() * 1e3,
+            uuid=str(message.uuid or uuid.uuid4()),
+        )
+
+    async def add_message(self, message: MessageWrite, commit: bool = False) -> OpenAIMessage:
+        """
+        Add the user's message to the chat session without answering it, see `reply_to`.
+
+        Args:
+            message (MessageWrite): The user's message.
+            commit (bool, optional): Whether to commit the new message to the database. Defaults to False.
+
+        Returns:
+            OpenAIMessage: The stored user message.
+
+        Raises:
+            MessageHistoryTooLongError: Raised if the message history would be too long to answer the message.
+        """
+        user_message = self._new_user_message(message)
+
+        def append(message_history: List[OpenAIMessage]) -> List[OpenAIMessage]:
+            if _find_user_message(message_history, str(user_message.uuid)) is not None:  # Stored concurrently
+                return message_history
+            if len(message_history) + 2 > self.max_messages:  # System prompt + history + user message
+                raise MessageHistoryTooLongError(f"Message history is too long. Max messages is {self.max_messages}.")
+            return message_history + [user_message]  # Always use copy-on-write
+
+        if commit:
+            await self._update_message_history(append)
+        else:
+            self.message_history = append(self.message_history)
+        return user_message
+
+    async def reply_to(self, message_uuid: str, commit: bool = False) -> OpenAIMessage:
+        """
+        Get a response from the AI tutor to a user message already stored in the chat session.
+
+        The response is inserted right after the user message, and only the history up to that message is sent.
+
+        Args:
+            message_uuid (str): The uuid of the user's message.
+            commit (bool, optional): Whether to commit the new message to the database. Defaults to False.
+
+        Returns:
+            OpenAIMessage: The tutor's response to the user's message, or the one stored by a concurrent request.
+
+        Raises:
+            ValueError: Raised if no user message with this uuid is stored in the chat session.
+        """
+        index = self._find_user_message(message_uuid)
+        if index is None:
+            raise ValueError(f"Message {message_uuid} not found in chat session {self.id}.")
+        system_message = OpenAIMessage(
+            role=OpenAIMessageRole.SYSTEM, content=self.tutor.get_system_prompt(student_name=self.user.name)
+        )
+        ai_message = await get_chat_response(
+            model=self.tutor.model,
+            messages=[system_message] + self.message_history[: index + 1],
+            max_tokens=self.max_tokens,
+            temperature=0.2,
+            usage=self.usage_attribution,
+        )
+
+        user_message = self.message_history[index]
+        if commit:
+            await self._update_message_history(lambda history: _with_reply(history, user_message, ai_message))
+        else:
+            self.message_history = _with_reply(self.message_history, user_message, ai_message)
+        return self.get_reply(message_uuid) or ai_message
 
     async def get_response(self, message: MessageWrite, commit: bool = False) -> OpenAIMessage:
         """
@@ -168,26 +616,23 @@ class ChatSession(Base, TimestampMixin, DeleteMixin):
             role=OpenAIMessageRole.SYSTEM, content=self.tutor.get_system_prompt(student_name=self.user.name)
         )
 
-        user_message = OpenAIMessage(
-            role=OpenAIMessageRole.USER,
-            content=message.content,
-            name=self.user.name,
-            timestamp_ms=datetime.now().timestamp() * 1e3,
-            uuid=str(uuid.uuid4()),
-        )
+        user_message = self._new_user_message(message)
         messages = [system_message] + self.message_history + [user_message]
         if len(messages) > self.max_messages:
             raise MessageHistoryTooLongError(f"Message history is too long. Max messages is {self.max_messages}.")
         ai_message = await get_chat_response(
-            model=self.tutor.model, messages=messages, max_tokens=self.max_tokens, temperature=0.2
+            model=self.tutor.model,
+            messages=messages,
+            max_tokens=self.max_tokens,
+            temperature=0.2,
+            usage=self.usage_attribution,
         )
 
-        self.message_history = self.message_history + [user_message, ai_message]  # Always use copy-on-write
         if commit:
-            async with async_session() as session:
-                session.add(self)
-                await session.commit()
-        return ai_message
+            await self._update_message_history(lambda history: _with_reply(history, user_message, ai_message))
+        else:
+            self.message_history = _with_reply(self.message_history, user_message, ai_message)
+        return self.get_reply(str(user_message.uuid)) or ai_message
 
     async def get_conversation_opener(self, commit: bool = False) -> str:
         """
@@ -204,7 +649,12 @@ class ChatSession(Base, TimestampMixin, DeleteMixin):
         )
 
         ai_message = await get_chat_response(
-            model=self.tutor.model, messages=[system_message], max_tokens=DEFAULT_MAX_TOKENS, temperature=0.2
+            model=self.tutor.model,
+            messages=[system_message],
+            max_tokens=DEFAULT_MAX_TOKENS,
+            temperature=0.2,
+            cache_ttl=settings.COMPLETION_CACHE_TTL,
+            usage=self.usage_attribution,
         )
         self.message_history = self.message_history + [ai_message]  # Always use copy-on-write
         if commit:
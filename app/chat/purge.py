@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+import sqlalchemy as sa
+from pydantic import BaseModel
+
+from app.chat.models import ChatSession
+from app.database import async_session
+
+logger = logging.getLogger(__name__)
+
+
+class PurgeReport(BaseModel):
+    """
+    The outcome of a purge run.
+
+    Attributes:
+    -----------
+    rows : int
+        The number of chat sessions deleted.
+    bytes : int
+        The approximate storage reclaimed, as the stored size of the deleted rows including their TOASTed values.
+    batches : int
+        The number of delete batches run.
+    duration : float
+        The duration of the run, in seconds.
+    """
+
+    rows: int = 0
+    bytes: int = 0
+    batches: int = 0
+    duration: float = 0
+
+
+async def _purge_batch(
+    cutoff: datetime, after: Optional[Tuple[datetime, uuid.UUID]], batch_size: int
+) -> Tuple[int, int, Optional[Tuple[datetime, uuid.UUID]]]:
+    table = ChatSession.__table__
+    batch = (
+        sa.select(table.c.id)
+        .where(table.c.deleted_at < cutoff)
+        .order_by(table.c.deleted_at, table.c.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)  # Never wait on rows locked by requests
+    )
+    if after is not None:
+        last = sa.tuple_(*after, types=[table.c.deleted_at.type, table.c.id.type])
+        batch = batch.where(sa.tuple_(table.c.deleted_at, table.c.id) > last)
+    batch_cte = batch.cte("batch")
+    query = (
+        sa.delete(table)
+        .where(table.c.id == batch_cte.c.id)
+        .returning(table.c.id, table.c.deleted_at, sa.func.pg_column_size(sa.literal_column("chat_session.*")))
+    )
+    async with async_session() as session:
+        rows = (await session.execute(query)).all()
+        await session.commit()
+    if not rows:
+        return 0, 0, None
+    last_id, last_deleted_at, _ = max(rows, key=lambda row: (row[1], row[0]))
+    return len(rows), sum(row[2] or 0 for row in rows), (last_deleted_at, last_id)
+
+
+async def _vacuum() -> None:
+    async with async_session() as session:
+        connection = await session.connection(execution_options={"isolation_level": "AUTOCOMMIT"})
+        await connection.execute(sa.text(f"VACUUM (ANALYZE) {ChatSession.__tablename__}"))
+
+
+async def purge_deleted_chat_sessions(
+    retention: timedelta,
+    batch_size: int = 100,
+    rows_per_second: Optional[float] = None,
+    pause_every: Optional[int] = None,
+    pause: float = 0,
+    vacuum: bool = False,
+) -> PurgeReport:
+    """
+    Hard-delete chat sessions soft-deleted for longer than the retention period.
+
+    Sessions are deleted in small batches, each in its own short transaction, walking the `(deleted_at, id)` keyset so
+    that each batch is an index range scan. Rows locked by concurrent requests are skipped until the next run, so a
+    short batch does not mean the end of the keyset: the run only stops once a batch deletes nothing. The run is
+    throttled so that cleanup never causes lock or I/O spikes.
+
+    Args:
+        retention (timedelta): How long soft-deleted sessions are kept.
+        batch_size (int): The number of sessions deleted per transaction.
+        rows_per_second (Optional[float]): If set, the maximum deletion rate.
+        pause_every (Optional[int]): If set, pause after deleting this many rows, e.g. to let autovacuum catch up.
+        pause (float): The length of those pauses, in seconds.
+        vacuum (bool): Whether to run `VACUUM (ANALYZE)` on the table once done, so that the space is reusable
+            right away.
+
+    Returns:
+        PurgeReport: The number of rows and bytes reclaimed.
+    """
+    report = PurgeReport()
+    started_at = time.monotonic()
+    cutoff = datetime.now(timezone.utc) - retention
+    after: Optional[Tuple[datetime, uuid.UUID]] = None
+    rows_since_pause = 0
+    while True:
+        batch_started_at = time.monotonic()
+        rows, size, after = await _purge_batch(cutoff, after, batch_size)
+        if not rows:
+            break
+        report.rows += rows
+        report.bytes += size
+        report.batches += 1
+        rows_since_pause += rows
+        delay = 0.0
+        if rows_per_second:
+            delay = rows / rows_per_second - (time.monotonic() - batch_started_at)
+        if pause_every and rows_since_pause >= pause_every:
+            delay = max(delay, pause)
+            rows_since_pause = 0
+        if delay > 0:
+            await asyncio.sleep(delay)
+    if vacuum and report.rows:
+        await _vacuum()
+    report.duration = time.monotonic() - started_at
+    logger.info("Purged deleted chat sessions: %s", report)
+    return report
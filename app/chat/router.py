@@ -1,60 +1,133 @@
-from typing import Annotated, List
-from uuid import UUID
+import asyncio
+import math
+from typing import Annotated, List, Optional
+from uuid import UUID, uuid4
 
-from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 
-from app.chat.models import ChatSession
-from app.chat.schemas import ChatSessionRead, MessageRead, MessageWrite
+from app.admission import admit
+from app.chat.models import (
+    ChatSession,
+    MessageUUIDReusedError,
+    idempotency_key_to_uuid,
+)
+from app.chat.schemas import (
+    ChatSessionRead,
+    MessageRead,
+    MessageWrite,
+    TurnRead,
+    TurnStatus,
+)
+from app.chat.turns import TurnQueueFullError, turn_pool
+from app.chat.usage import seconds_until_tomorrow, usage_meter
+from app.config import settings
+from app.log import chat_session_id_var
+from app.ratelimit import rate_limit
 from app.tutor.models import Tutor
 from app.tutor.schemas import TutorRead
 from app.user.auth import authenticate_user
 from app.user.models import User
+from app.utils import (
+    FieldSelection,
+    SingleFlight,
+    SingleFlightConflictError,
+    sparse_fields,
+)
+
+
+async def bind_chat_session_id(request: Request) -> None:
+    """Tag the logs of a request with the chat session of its path, if any."""
+    chat_id = request.path_params.get("chat_id")
+    if chat_id is not None:
+        chat_session_id_var.set(chat_id)
+
 
 router = APIRouter(
     responses={404: {"description": "Not found"}},
     tags=["chat"],
+    dependencies=[Depends(bind_chat_session_id)],
 )
 
 CHAT_SESSION_NOT_FOUND = HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat session not found")
+TURN_NOT_FOUND = HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Turn not found")
+TURN_QUEUE_FULL = HTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail="Too many chat turns in progress, try again later",
+    headers={"Retry-After": "1"},
+)
 
 ActiveVerifiedUser = Annotated[User, Depends(authenticate_user)]
 
 
-@router.get("/chats")
-async def get_chat_sessions(user: ActiveVerifiedUser) -> List[ChatSessionRead]:
-    """Get all chat sessions for the current user."""
-    chat_sessions = await ChatSession.get_by_user_id(user_id=user.id)
-    return [
-        ChatSessionRead(
-            id=chat_session.id,
-            user_id=chat_session.user_id,
-            tutor_id=chat_session.tutor_id,
-            message_history=[MessageRead.from_openai_message(message) for message in chat_session.message_history],
-            tutor=TutorRead.from_tutor(chat_session.tutor),
+async def check_token_quota(user: ActiveVerifiedUser) -> User:
+    """Reject users who used up their daily token quota; superusers have no quota."""
+    if settings.DAILY_TOKEN_QUOTA is None or user.is_superuser:
+        return user
+    if await usage_meter.tokens_used_today(user.id) >= settings.DAILY_TOKEN_QUOTA:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Daily token quota exceeded",
+            headers={"Retry-After": str(math.ceil(seconds_until_tomorrow()))},
         )
-        for chat_session in chat_sessions
+    return user
+
+
+TokenQuotaUser = Annotated[User, Depends(check_token_quota)]
+ChatSessionFields = Annotated[Optional[FieldSelection], Depends(sparse_fields(ChatSessionRead))]
+
+# Chat turns in flight in this process, keyed by (user id, chat session id, message uuid)
+chat_turns: SingleFlight[MessageRead] = SingleFlight()
+
+
+@router.get("/chats", dependencies=[Depends(rate_limit("chat_read"))])
+async def get_chat_sessions(user: ActiveVerifiedUser, fields: ChatSessionFields) -> List[ChatSessionRead]:
+    """Get all chat sessions for the current user."""
+    chat_sessions = await ChatSession.get_by_user_id(user_id=user.id, fields=fields)
+    chat_session_reads = [
+        ChatSessionRead.from_chat_session(chat_session, fields=fields) for chat_session in chat_sessions
     ]
+    if fields is not None:  # Partial objects would fail response model validation
+        return JSONResponse(jsonable_encoder(chat_session_reads, exclude_unset=True))  # type: ignore
+    return chat_session_reads
 
 
-@router.get("/chat/{chat_id}", responses={status.HTTP_404_NOT_FOUND: {"description": "Chat session not found"}})
-async def get_chat_session(chat_id: UUID, user: ActiveVerifiedUser) -> ChatSessionRead:
+@router.get(
+    "/chat/{chat_id}",
+    dependencies=[Depends(rate_limit("chat_read"))],
+    responses={status.HTTP_404_NOT_FOUND: {"description": "Chat session not found"}},
+)
+async def get_chat_session(chat_id: UUID, user: ActiveVerifiedUser, fields: ChatSessionFields) -> ChatSessionRead:
     """Get a chat session by ID."""
-    chat_session = await ChatSession.get(chat_id)
+    chat_session = await ChatSession.get_by_id_user_id(chat_session_id=chat_id, user_id=user.id, fields=fields)
     if chat_session is None:
         raise CHAT_SESSION_NOT_FOUND
-    if chat_session.user_id != user.id:
-        raise CHAT_SESSION_NOT_FOUND
-    return ChatSessionRead(
-        id=chat_session.id,
-        user_id=chat_session.user_id,
-        tutor_id=chat_session.tutor_id,
-        message_history=[MessageRead.from_openai_message(message) for message in chat_session.message_history],
-        tutor=TutorRead.from_tutor(chat_session.tutor),
-    )
+    chat_session_read = ChatSessionRead.from_chat_session(chat_session, fields=fields)
+    if fields is not None:  # Partial objects would fail response model validation
+        return JSONResponse(jsonable_encoder(chat_session_read, exclude_unset=True))  # type: ignore
+    return chat_session_read
 
 
-@router.get("/chat", responses={status.HTTP_404_NOT_FOUND: {"description": "Chat session not found"}})
-async def start_chat_session(user: ActiveVerifiedUser, tutor_id: UUID) -> ChatSessionRead:
+@router.get(
+    "/chat",
+    dependencies=[Depends(admit), Depends(rate_limit("chat_turn"))],
+    responses={
+        status.HTTP_404_NOT_FOUND: {"description": "Chat session not found"},
+        status.HTTP_429_TOO_MANY_REQUESTS: {"description": "Rate limit or daily token quota exceeded"},
+        status.HTTP_503_SERVICE_UNAVAILABLE: {"description": "Service overloaded"},
+    },
+)
+async def start_chat_session(user: TokenQuotaUser, tutor_id: UUID) -> ChatSessionRead:
     """Start a new chat session."""
     tutor = await Tutor.get(tutor_id)
     if tutor is None:
@@ -73,20 +146,156 @@ async def start_chat_session(user: ActiveVerifiedUser, tutor_id: UUID) -> ChatSe
     )
 
 
-@router.post("/chat/{chat_id}", responses={status.HTTP_404_NOT_FOUND: {"description": "Chat session not found"}})
-async def post_chat_message(chat_id: UUID, message: MessageWrite, user: ActiveVerifiedUser) -> MessageRead:
-    """Post a message to a chat session."""
+async def _post_chat_message(chat_session: ChatSession, message: MessageWrite) -> MessageRead:
+    try:
+        response = chat_session.get_stored_response(message)
+    except MessageUUIDReusedError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    if response is None:
+        response = await chat_session.get_response(
+            message=message,
+            commit=True,
+        )
+    return MessageRead.from_openai_message(response)
+
+
+async def _accept_chat_message(chat_session: ChatSession, message: MessageWrite, user: User) -> JSONResponse:
+    if message.uuid is None:
+        message.uuid = uuid4()  # type: ignore[assignment]
+    chat_id = chat_session.id
+    turn_id = str(message.uuid)
+    try:
+        response = chat_session.get_stored_response(message)
+    except MessageUUIDReusedError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    if response is None and turn_id not in turn_pool:
+        if turn_pool.full():
+            raise TURN_QUEUE_FULL
+        if not chat_session.has_message(turn_id):
+            await chat_session.add_message(message, commit=True)
+        try:
+            turn_pool.submit(chat_id, user.id, turn_id)
+        except TurnQueueFullError:
+            raise TURN_QUEUE_FULL
+    turn = TurnRead(
+        id=message.uuid,
+        status=TurnStatus.COMPLETED if response is not None else TurnStatus.PENDING,
+        message=MessageRead.from_openai_message(response) if response is not None else None,
+    )
+    return JSONResponse(
+        jsonable_encoder(turn),
+        status_code=status.HTTP_202_ACCEPTED,
+        headers={"Location": f"/chat/{chat_id}/turns/{turn_id}"},
+    )
+
+
+@router.post(
+    "/chat/{chat_id}",
+    dependencies=[Depends(admit), Depends(rate_limit("chat_turn"))],
+    responses={
+        status.HTTP_202_ACCEPTED: {"description": "Turn accepted, poll its Location for the reply", "model": TurnRead},
+        status.HTTP_404_NOT_FOUND: {"description": "Chat session not found"},
+        status.HTTP_422_UNPROCESSABLE_ENTITY: {"description": "Message uuid reused for a different message"},
+        status.HTTP_429_TOO_MANY_REQUESTS: {"description": "Rate limit or daily token quota exceeded"},
+        status.HTTP_503_SERVICE_UNAVAILABLE: {"description": "Service overloaded or too many chat turns in progress"},
+    },
+)
+async def post_chat_message(
+    chat_id: UUID,
+    message: MessageWrite,
+    user: TokenQuotaUser,
+    idempotency_key: Annotated[Optional[str], Header(max_length=255)] = None,
+    prefer: Annotated[Optional[str], Header()] = None,
+) -> MessageRead:
+    """
+    Post a message to a chat session.
+
+    Messages with a uuid (or sent with an `Idempotency-Key` header) are idempotent: retries get the stored reply, and
+    concurrent duplicates share a single completion.
+
+    With a `Prefer: respond-async` header, the message is stored and the request returns 202 with a turn right away;
+    the reply is generated in the background and can be long-polled at `/chat/{chat_id}/turns/{turn_id}`. Retrying
+    such a message without the header, while it is still pending, also returns 202.
+    """
+    if idempotency_key is not None:
+        message_uuid = idempotency_key_to_uuid(user.id, idempotency_key)
+        if message.uuid is not None and message.uuid != message_uuid:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Message uuid does not match the Idempotency-Key header",
+            )
+        message.uuid = message_uuid
+    # Check ownership before joining a turn in flight, whose reply would otherwise leak to other users
     chat_session = await ChatSession.get_by_id_user_id(chat_session_id=chat_id, user_id=user.id)
     if chat_session is None:
         raise CHAT_SESSION_NOT_FOUND
-    response = await chat_session.get_response(
-        message=message,
-        commit=True,
-    )
-    return MessageRead.from_openai_message(response)
+    if prefer is not None and "respond-async" in prefer:
+        return await _accept_chat_message(chat_session, message, user)  # type: ignore[return-value]
+    if (
+        message.uuid is not None
+        and chat_session.has_message(str(message.uuid))
+        and chat_session.get_reply(str(message.uuid)) is None
+    ):
+        # Accepted asynchronously and still pending: answering it here would store the message twice
+        return await _accept_chat_message(chat_session, message, user)  # type: ignore[return-value]
+    if message.uuid is None:
+        return await _post_chat_message(chat_session, message)
+    try:
+        return await chat_turns.do(
+            (user.id, chat_id, message.uuid), lambda: _post_chat_message(chat_session, message), tag=message.content
+        )
+    except SingleFlightConflictError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Message {message.uuid} was already sent with a different content.",
+        )
 
 
-@router.delete("/chat/{chat_id}", responses={status.HTTP_404_NOT_FOUND: {"description": "Chat session not found"}})
+@router.get(
+    "/chat/{chat_id}/turns/{turn_id}",
+    dependencies=[Depends(rate_limit("chat_read"))],
+    responses={status.HTTP_404_NOT_FOUND: {"description": "Chat session or turn not found"}},
+)
+async def get_chat_turn(
+    chat_id: UUID,
+    turn_id: UUID,
+    user: ActiveVerifiedUser,
+    timeout: Annotated[float, Query(ge=0, le=60, description="How long to wait for the reply, in seconds")] = (
+        settings.TURN_POLL_TIMEOUT
+    ),
+) -> TurnRead:
+    """
+    Long-poll a chat turn accepted asynchronously.
+
+    Returns as soon as the reply is stored, or with a pending turn once the timeout expires.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        chat_session = await ChatSession.get_by_id_user_id(
+            chat_session_id=chat_id, user_id=user.id, fields={"message_history": None}
+        )
+        if chat_session is None:
+            raise CHAT_SESSION_NOT_FOUND
+        if not chat_session.has_message(str(turn_id)):
+            raise TURN_NOT_FOUND
+        response = chat_session.get_reply(str(turn_id))
+        if response is not None:
+            return TurnRead(id=turn_id, status=TurnStatus.COMPLETED, message=MessageRead.from_openai_message(response))
+        error = turn_pool.get_error(str(turn_id))
+        if error is not None:
+            return TurnRead(id=turn_id, status=TurnStatus.FAILED, error=error)
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            return TurnRead(id=turn_id, status=TurnStatus.PENDING)
+        await turn_pool.wait(str(turn_id), min(remaining, settings.TURN_POLL_INTERVAL))
+
+
+@router.delete(
+    "/chat/{chat_id}",
+    dependencies=[Depends(rate_limit("chat_read"))],
+    responses={status.HTTP_404_NOT_FOUND: {"description": "Chat session not found"}},
+)
 async def delete_chat_session(chat_id: UUID, user: ActiveVerifiedUser) -> Response:
     """Delete a chat session."""
     chat_session = await ChatSession.get_by_id_user_id(chat_session_id=chat_id, user_id=user.id)
@@ -1,10 +1,14 @@
 from enum import StrEnum
-from typing import List, Optional
+from typing import TYPE_CHECKING, List, Optional
 from uuid import UUID
 
 from pydantic import UUID4, BaseModel
 
 from app.tutor.schemas import TutorRead
+from app.utils import FieldSelection
+
+if TYPE_CHECKING:
+    from app.chat.models import ChatSession
 
 
 class OpenAIMessageRole(StrEnum):
@@ -97,9 +101,45 @@ class MessageWrite(MessageBase):
     -----------
     content : str
         The content of the message.
+    uuid : Optional[UUID4]
+        A client-generated identifier for the message. Retrying a message with the same uuid returns the stored reply
+        instead of generating a new one.
     """
 
-    pass
+    uuid: Optional[UUID4] = None
+
+
+class TurnStatus(StrEnum):
+    """Status of a chat turn answered asynchronously."""
+
+    PENDING = "pending"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class TurnRead(BaseModel):
+    """
+    A chat turn answered asynchronously.
+
+    Attributes:
+    -----------
+    id : UUID4
+        The id of the turn, which is the uuid of the user's message.
+    status : TurnStatus
+        The status of the turn.
+    message : Optional[MessageRead]
+        The tutor's reply, once the turn is completed.
+    error : Optional[str]
+        The reason the turn failed, if it did.
+    """
+
+    id: UUID4
+    status: TurnStatus
+    message: Optional[MessageRead] = None
+    error: Optional[str] = None
+
+    class Config:
+        use_enum_values = True
 
 
 class ChatSessionBase(BaseModel):
@@ -112,6 +152,41 @@ class ChatSessionRead(ChatSessionBase):
     message_history: List[MessageRead]
     tutor: TutorRead
 
+    @classmethod
+    def from_chat_session(
+        cls, chat_session: "ChatSession", fields: Optional[FieldSelection] = None
+    ) -> "ChatSessionRead":
+        """
+        Create a ChatSessionRead object from a ChatSession ORM object.
+
+        When `fields` is given, only those fields are read from the ORM object (so unloaded columns and relationships
+        are never touched) and the object is built without validation; serialize it with `exclude_unset=True`.
+
+        Args:
+            chat_session (ChatSession): The chat session.
+            fields (Optional[FieldSelection]): The sparse fieldset to read, or None for all fields.
+
+        Returns:
+            ChatSessionRead: The chat session read schema.
+        """
+        if fields is None:
+            return cls(
+                id=chat_session.id,
+                user_id=chat_session.user_id,
+                tutor_id=chat_session.tutor_id,
+                message_history=[MessageRead.from_openai_message(message) for message in chat_session.message_history],
+                tutor=TutorRead.from_tutor(chat_session.tutor),
+            )
+
+        values = {field: getattr(chat_session, field) for field in fields.keys() & {"id", "user_id", "tutor_id"}}
+        if "message_history" in fields:
+            values["message_history"] = [
+                MessageRead.from_openai_message(message) for message in chat_session.message_history
+            ]
+        if "tutor" in fields:
+            values["tutor"] = TutorRead.from_tutor(chat_session.tutor, fields=fields["tutor"])
+        return cls.construct(**values)
+
 
 class ChatSessionCreate(ChatSessionBase):
     pass
@@ -0,0 +1,169 @@
+import asyncio
+import uuid
+import weakref
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.chat.models import ChatSession
+from app.config import settings
+
+# Number of failed turns remembered for pollers
+MAX_FAILED_TURNS = 1000
+# How long pollers can still observe that a turn is done, in seconds
+DONE_EVENT_TTL = 60
+
+
+class TurnQueueFullError(Exception):
+    """Raised when the turn queue is full and a turn cannot be accepted."""
+
+    pass
+
+
+class TurnWorkerPool:
+    """
+    A bounded in-process pool answering chat turns off the request path.
+
+    A turn is a user message already stored in a chat session; its id is the message uuid. Workers reload the chat
+    session, get the tutor's reply and store it, then wake up any poller waiting for the turn in this process.
+    Pollers in other processes find the reply in the database.
+
+    Attributes:
+        workers (int): The number of concurrent workers.
+        queue_size (int): The maximum number of turns waiting for a worker.
+    """
+
+    def __init__(self, workers: int, queue_size: int) -> None:
+        self.workers = workers
+        self.queue_size = queue_size
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue[Tuple[uuid.UUID, uuid.UUID, str]]] = None
+        self._tasks: List[asyncio.Task] = []
+        self._events: Dict[str, asyncio.Event] = {}
+        self._pending: Set[str] = set()
+        self._failed: OrderedDict[str, str] = OrderedDict()
+        self._session_locks: weakref.WeakValueDictionary[uuid.UUID, asyncio.Lock] = weakref.WeakValueDictionary()
+        self._closed = False
+
+    def __contains__(self, turn_id: str) -> bool:
+        return turn_id in self._pending
+
+    def full(self) -> bool:
+        """Check whether the queue is full or the pool is shutting down, in which case new turns are rejected."""
+        return self._closed or (self._queue is not None and self._queue.full())
+
+    def _start(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self._queue is None or self._loop is not loop:  # Workers are bound to the loop that started them
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._tasks = [asyncio.create_task(self._work(self._queue)) for _ in range(self.workers)]
+        return self._queue
+
+    def submit(self, chat_session_id: uuid.UUID, user_id: uuid.UUID, turn_id: str) -> None:
+        """
+        Queue a turn to be answered.
+
+        Args:
+            chat_session_id (uuid.UUID): The unique identifier for the chat session.
+            user_id (uuid.UUID): The unique identifier for the user owning the chat session.
+            turn_id (str): The uuid of the stored user message to answer.
+
+        Raises:
+            TurnQueueFullError: Raised if too many turns are already waiting, or the pool is shutting down.
+        """
+        if self._closed:
+            raise TurnQueueFullError("Shutting down, try again later.")
+        queue = self._start()
+        try:
+            queue.put_nowait((chat_session_id, user_id, turn_id))
+        except asyncio.QueueFull:
+            raise TurnQueueFullError("Too many chat turns in progress, try again later.")
+        self._pending.add(turn_id)
+        self._events[turn_id] = asyncio.Event()
+        self._failed.pop(turn_id, None)
+
+    def get_error(self, turn_id: str) -> Optional[str]:
+        """Get the error of a turn that failed in this process, if any."""
+        return self._failed.get(turn_id)
+
+    async def wait(self, turn_id: str, timeout: float) -> bool:
+        """
+        Wait until a turn queued in this process is done.
+
+        Args:
+            turn_id (str): The id of the turn.
+            timeout (float): The maximum time to wait, in seconds.
+
+        Returns:
+            bool: Whether the turn was signalled as done (answered or failed) before the timeout.
+        """
+        event = self._events.get(turn_id)
+        if event is None:
+            await asyncio.sleep(timeout)
+            return False
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def join(self) -> None:
+        """Wait until all queued turns are done."""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def drain(self, timeout: float) -> int:
+        """
+        Stop accepting turns, wait for the queued ones to be answered, then stop the workers.
+
+        Args:
+            timeout (float): The maximum time to wait, in seconds.
+
+        Returns:
+            int: The number of turns abandoned at the timeout.
+        """
+        self._closed = True
+        try:
+            await asyncio.wait_for(self.join(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        abandoned = len(self._pending)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        return abandoned
+
+    async def _work(self, queue: asyncio.Queue) -> None:
+        while True:
+            chat_session_id, user_id, turn_id = await queue.get()
+            try:
+                await self._answer(chat_session_id, user_id, turn_id)
+            except Exception as e:
+                self._failed[turn_id] = str(e)
+                while len(self._failed) > MAX_FAILED_TURNS:
+                    self._failed.popitem(last=False)
+            finally:
+                self._pending.discard(turn_id)
+                event = self._events.get(turn_id)
+                if event is not None:
+                    event.set()
+                    asyncio.get_running_loop().call_later(DONE_EVENT_TTL, self._forget, turn_id, event)
+                queue.task_done()
+
+    def _forget(self, turn_id: str, event: asyncio.Event) -> None:
+        if self._events.get(turn_id) is event:
+            del self._events[turn_id]
+
+    async def _answer(self, chat_session_id: uuid.UUID, user_id: uuid.UUID, turn_id: str) -> None:
+        lock = self._session_locks.setdefault(chat_session_id, asyncio.Lock())
+        async with lock:  # Serialize turns of a chat session so that replies are not lost
+            chat_session = await ChatSession.get_by_id_user_id(chat_session_id=chat_session_id, user_id=user_id)
+            if chat_session is None:
+                raise ValueError(f"Chat session {chat_session_id} not found.")
+            if chat_session.get_reply(turn_id) is None:
+                await chat_session.reply_to(turn_id, commit=True)
+
+
+turn_pool = TurnWorkerPool(workers=settings.TURN_WORKERS, queue_size=settings.TURN_QUEUE_SIZE)
@@ -0,0 +1,217 @@
+import asyncio
+import itertools
+import logging
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, NamedTuple, Optional, Set
+
+import sqlalchemy as sa
+from sqlalchemy import (
+    UUID,
+    BigInteger,
+    DateTime,
+    ForeignKey,
+    Identity,
+    Index,
+    Integer,
+    String,
+)
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.config import settings
+from app.database import Base, async_session
+from app.utils import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of usage records kept in memory while the database is unavailable
+MAX_BUFFERED_RECORDS = 100_000
+
+
+class UsageAttribution(NamedTuple):
+    """Who a chat completion is billed to."""
+
+    user_id: uuid.UUID
+    tutor_id: Optional[uuid.UUID] = None
+    chat_session_id: Optional[uuid.UUID] = None
+
+
+class TokenUsage(Base):
+    """
+    The tokens used by a chat completion.
+
+    Attributes:
+        id (int): The unique identifier for the record.
+        user_id (uuid.UUID): The unique identifier for the user billed.
+        tutor_id (Optional[uuid.UUID]): The unique identifier for the tutor that answered, if any.
+        chat_session_id (Optional[uuid.UUID]): The unique identifier for the chat session, if any.
+        model (str): The model used.
+        prompt_tokens (int): The number of tokens in the prompt.
+        completion_tokens (int): The number of tokens in the completion.
+        created_at (datetime): The time of the completion.
+    """
+
+    __tablename__ = "token_usage"
+    __table_args__ = (Index("token_usage_user_id_created_at_idx", "user_id", "created_at"),)
+
+    id: Mapped[int] = mapped_column(BigInteger, Identity(), primary_key=True)
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("user.id", ondelete="CASCADE"), nullable=False
+    )
+    tutor_id: Mapped[Optional[uuid.UUID]] = mapped_column(UUID(as_uuid=True), nullable=True)
+    chat_session_id: Mapped[Optional[uuid.UUID]] = mapped_column(UUID(as_uuid=True), nullable=True)
+    model: Mapped[str] = mapped_column(String(50), nullable=False)
+    prompt_tokens: Mapped[int] = mapped_column(Integer, nullable=False)
+    completion_tokens: Mapped[int] = mapped_column(Integer, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+
+
+class _DailyUsage:
+    def __init__(self, day: date, tokens: int) -> None:
+        self.day = day
+        self.tokens = tokens
+        self.refreshed_at = time.monotonic()
+
+
+def seconds_until_tomorrow() -> float:
+    """Get the number of seconds until daily quotas reset, at midnight UTC."""
+    now = datetime.now(timezone.utc)
+    tomorrow = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc)
+    return (tomorrow - now).total_seconds()
+
+
+class UsageMeter:
+    """
+    Records the tokens used by chat completions and keeps rolling daily counters per user.
+
+    Records are buffered in memory and written to the `token_usage` table in batches, when the buffer is full or
+    periodically. Daily counters are loaded from the database once and then kept up to date in memory, so quotas can
+    be enforced without a database read per request. Counters are reloaded every `refresh_interval` seconds to account
+    for the usage recorded by other processes.
+
+    Attributes:
+        flush_size (int): The number of buffered records that triggers a flush.
+        flush_interval (float): The maximum time a record stays buffered, in seconds.
+        refresh_interval (float): How long a daily counter is trusted before reloading it, in seconds.
+    """
+
+    def __init__(self, flush_size: int, flush_interval: float, refresh_interval: float) -> None:
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.refresh_interval = refresh_interval
+        self._buffer: List[Dict[str, Any]] = []
+        self._flushing: List[List[Dict[str, Any]]] = []  # Batches being written, not in the database yet
+        self._counters: Dict[uuid.UUID, _DailyUsage] = {}
+        self._loads: SingleFlight[_DailyUsage] = SingleFlight()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._flushes: Set[asyncio.Task] = set()
+
+    def _start(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._flusher is None or self._loop is not loop:  # The flusher is bound to the loop that started it
+            self._loop = loop
+            self._flusher = loop.create_task(self._flush_periodically())
+
+    def record(self, attribution: UsageAttribution, model: str, prompt_tokens: int, completion_tokens: int) -> None:
+        """
+        Record the tokens used by a chat completion.
+
+        Args:
+            attribution (UsageAttribution): Who the completion is billed to.
+            model (str): The model used.
+            prompt_tokens (int): The number of tokens in the prompt.
+            completion_tokens (int): The number of tokens in the completion.
+        """
+        self._start()
+        now = datetime.now(timezone.utc)
+        self._buffer.append(
+            dict(
+                user_id=attribution.user_id,
+                tutor_id=attribution.tutor_id,
+                chat_session_id=attribution.chat_session_id,
+                model=model,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                created_at=now,
+            )
+        )
+        usage = self._counters.get(attribution.user_id)
+        if usage is not None and usage.day == now.date():
+            usage.tokens += prompt_tokens + completion_tokens
+        if len(self._buffer) >= self.flush_size:
+            task = asyncio.create_task(self.flush())
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def flush(self) -> int:
+        """
+        Write the buffered records to the database.
+
+        Returns:
+            int: The number of records written.
+        """
+        records, self._buffer = self._buffer, []
+        if not records:
+            return 0
+        self._flushing.append(records)
+        try:
+            async with async_session() as session:
+                await session.execute(sa.insert(TokenUsage), records)  # Batched into multi-row inserts
+                await session.commit()
+        except Exception:
+            logger.exception("Failed to write %d token usage records", len(records))
+            self._buffer = (records + self._buffer)[-MAX_BUFFERED_RECORDS:]
+            return 0
+        finally:
+            self._flushing = [batch for batch in self._flushing if batch is not records]
+        today = datetime.now(timezone.utc).date()
+        self._counters = {user_id: usage for user_id, usage in self._counters.items() if usage.day == today}
+        return len(records)
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def _load(self, user_id: uuid.UUID, day: date) -> _DailyUsage:
+        day_start = datetime.combine(day, datetime.min.time(), tzinfo=timezone.utc)
+        query = sa.select(
+            sa.func.coalesce(sa.func.sum(TokenUsage.prompt_tokens + TokenUsage.completion_tokens), 0)
+        ).where(TokenUsage.user_id == user_id, TokenUsage.created_at >= day_start)
+        async with async_session() as session:
+            tokens = (await session.execute(query)).scalar_one()
+        # Records not written yet are not in the database. A batch committed while the query ran may be counted twice
+        # until the next refresh, which errs on the side of enforcing quotas.
+        tokens += sum(
+            record["prompt_tokens"] + record["completion_tokens"]
+            for record in itertools.chain(self._buffer, *self._flushing)
+            if record["user_id"] == user_id and record["created_at"] >= day_start
+        )
+        usage = _DailyUsage(day, tokens)
+        self._counters[user_id] = usage
+        return usage
+
+    async def tokens_used_today(self, user_id: uuid.UUID) -> int:
+        """
+        Get the number of tokens a user used since midnight UTC.
+
+        Args:
+            user_id (uuid.UUID): The unique identifier for the user.
+
+        Returns:
+            int: The number of tokens used.
+        """
+        today = datetime.now(timezone.utc).date()
+        usage = self._counters.get(user_id)
+        if usage is None or usage.day != today or time.monotonic() - usage.refreshed_at > self.refresh_interval:
+            usage = await self._loads.do(user_id, lambda: self._load(user_id, today))
+        return usage.tokens
+
+
+usage_meter = UsageMeter(
+    flush_size=settings.USAGE_FLUSH_SIZE,
+    flush_interval=settings.USAGE_FLUSH_INTERVAL,
+    refresh_interval=settings.USAGE_REFRESH_INTERVAL,
+)
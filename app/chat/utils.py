@@ -1,32 +1,156 @@
+import asyncio
+import logging
+import time
 from datetime import datetime
-from typing import List
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
 from uuid import uuid4
 
-from openai import ChatCompletion
-
+from app.chat.cache import CompletionCache, completion_cache
 from app.chat.schemas import OpenAIMessage
+from app.chat.usage import UsageAttribution, usage_meter
+from app.config import settings
+from app.metrics import llm_errors, llm_request_duration, llm_tokens
+from app.tracing import traceparent_headers, tracer
+
+if TYPE_CHECKING:
+    import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# HTTP sessions shared by the calls to the OpenAI API, to reuse connections; openai opens one per call otherwise.
+# Sessions are loop-bound, so there is one per event loop (e.g. per test, or per thread running a loop).
+_http_sessions: Dict[asyncio.AbstractEventLoop, "aiohttp.ClientSession"] = {}
+
+
+def _get_http_session() -> "aiohttp.ClientSession":
+    loop = asyncio.get_running_loop()
+    session = _http_sessions.get(loop)
+    if session is None or session.closed:
+        import aiohttp
+
+        for other_loop in [other_loop for other_loop in _http_sessions if other_loop.is_closed()]:
+            del _http_sessions[other_loop]  # Their connections were dropped with the loop
+        session = _http_sessions[loop] = aiohttp.ClientSession()
+    return session
+
+
+def _api_base() -> str:
+    import openai
+
+    return settings.OPENAI_API_BASE or openai.api_base
+
+
+async def prewarm_llm_connections(connections: int) -> None:
+    """
+    Open connections to the OpenAI API, so that the first completions do not wait for new connections.
+
+    Args:
+        connections (int): The number of connections to open.
+    """
+    session = _get_http_session()
+    headers = {"Authorization": f"Bearer {settings.OPENAI_API_KEY}"}
+
+    async def connect() -> None:
+        async with session.get(f"{_api_base()}/models", headers=headers) as response:
+            await response.read()
+
+    results = await asyncio.gather(*(connect() for _ in range(connections)), return_exceptions=True)
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        logger.warning("Could not open %d of %d LLM connections: %r", len(errors), connections, errors[0])
+
+
+async def close_llm_connections() -> None:
+    """Close the connections to the OpenAI API, of every event loop."""
+    current_loop = asyncio.get_running_loop()
+    while _http_sessions:
+        loop, session = _http_sessions.popitem()
+        if loop is current_loop:
+            await session.close()
+        elif loop.is_running():
+            await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(session.close(), loop))
+
+
+async def _create_chat_completion(
+    model: str, message_dicts: List[Dict[str, Any]], usage: Optional[UsageAttribution] = None, **kwargs
+) -> Dict[str, Any]:
+    import openai  # Deferred, importing openai is slow
+
+    started_at = time.perf_counter()
+    session_token = openai.aiosession.set(_get_http_session())
+    try:
+        with tracer.span("openai.chat_completion", model=model, messages=len(message_dicts)) as span:
+            response = await openai.ChatCompletion.acreate(
+                model=model,
+                messages=message_dicts,
+                headers=traceparent_headers(),
+                api_key=settings.OPENAI_API_KEY,
+                api_base=settings.OPENAI_API_BASE,
+                **kwargs,
+            )
+            if "usage" in response:
+                span.set_attribute("prompt_tokens", response.usage.prompt_tokens)
+                span.set_attribute("completion_tokens", response.usage.completion_tokens)
+    except Exception as e:
+        llm_errors.inc(model, type(e).__name__)
+        raise
+    finally:
+        openai.aiosession.reset(session_token)
+        llm_request_duration.observe(time.perf_counter() - started_at, model)
+    logger.debug("Chat completion", extra={"model": model, "max_tokens": kwargs.get("max_tokens")})
+    if "usage" in response:
+        llm_tokens.inc(model, "prompt", amount=response.usage.prompt_tokens)
+        llm_tokens.inc(model, "completion", amount=response.usage.completion_tokens)
+        if usage is not None:
+            usage_meter.record(usage, model, response.usage.prompt_tokens, response.usage.completion_tokens)
+    return OpenAIMessage.parse_obj(response.choices[0].message).dict(exclude_none=True)
+
+
+def to_message_dicts(messages: List[OpenAIMessage]) -> List[Dict[str, Any]]:
+    """
+    Convert messages to the dictionaries sent to the OpenAI Chat Completion API, without the internal fields.
+
+    Args:
+        messages (List[OpenAIMessage]): The messages.
+
+    Returns:
+        List[Dict[str, Any]]: The messages as sent to the API.
+    """
+    return [message.dict(exclude_none=True, exclude={'timestamp_ms', 'uuid'}) for message in messages]
 
 
-async def get_chat_response(model: str, messages: List[OpenAIMessage], **kwargs) -> OpenAIMessage:
+async def get_chat_response(
+    model: str,
+    messages: List[OpenAIMessage],
+    cache_ttl: Optional[float] = None,
+    usage: Optional[UsageAttribution] = None,
+    **kwargs,
+) -> OpenAIMessage:
     """
     Send a list of messages to the OpenAI Chat Completion API and return the response.
 
     Args:
         model (str): The ID of the OpenAI model to use for generating the response.
         messages (List[Message]): A list of messages to send to the chatbot API.
+        cache_ttl (Optional[float]): If given, serve identical requests from the completion cache and keep the
+            response cached for this many seconds. Only use it for prompts where a repeated answer is acceptable.
+        usage (Optional[UsageAttribution]): If given, who to bill the tokens used to. Cached responses use no tokens.
         **kwargs: Additional keyword arguments to pass to the OpenAI API.
 
     Returns:
         Message: The response message from the Chat Completion API.
     """
-    message_dicts = [message.dict(exclude_none=True, exclude={'timestamp_ms', 'uuid'}) for message in messages]
-    response = await ChatCompletion.acreate(
-        model=model,
-        messages=message_dicts,
-        **kwargs,
-    )
-    print(f"MAX TOKENS: {kwargs['max_tokens']}")
-    ai_message = OpenAIMessage.parse_obj(response.choices[0].message)
+    message_dicts = to_message_dicts(messages)
+    with tracer.span("get_chat_response", model=model, cached=cache_ttl is not None):
+        if cache_ttl is None:
+            response = await _create_chat_completion(model, message_dicts, usage, **kwargs)
+        else:
+            response = await completion_cache.get_or_create(
+                CompletionCache.key(model, message_dicts, **kwargs),
+                lambda: _create_chat_completion(model, message_dicts, usage, **kwargs),
+                ttl=cache_ttl,
+            )
+    ai_message = OpenAIMessage.parse_obj(response)
     ai_message.timestamp_ms = int(datetime.now().timestamp() * 1e3)
     ai_message.uuid = str(uuid4())
     return ai_message
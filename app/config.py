@@ -1,6 +1,6 @@
 from enum import StrEnum
+from typing import Optional
 
-import openai
 from pydantic import BaseSettings, PostgresDsn
 
 
@@ -21,12 +21,68 @@ class Settings(BaseSettings):
     POOL_SIZE: int = 10
     MAX_OVERFLOW: int = 20
     OPENAI_API_KEY: str
+    OPENAI_API_BASE: Optional[str] = None  # e.g. a fake completion server for load tests, the OpenAI API if None
     APP_SECRET: str
     ENV: Env = Env.DEV
     PROJECT_NAME: str = "polyglot"
     FIREBASE_KEY_FILE: str = "polyglot-dev.json"
     FIREBASE_AUTH_EMULATOR_HOST: str
     SUPPORTED_LANGUAGES: list[str] = ["en", "fr"]
+    BATCH_MAX_REQUESTS: int = 10
+    BATCH_MAX_CONCURRENCY: int = 4
+    COMPLETION_CACHE_SIZE: int = 1024
+    COMPLETION_CACHE_TTL: int = 24 * 60 * 60  # seconds
+    COMPLETION_CACHE_DB: bool = False
+    TURN_WORKERS: int = 8
+    TURN_QUEUE_SIZE: int = 100
+    TURN_POLL_TIMEOUT: float = 30  # seconds
+    TURN_POLL_INTERVAL: float = 1  # seconds, to notice turns answered by other processes
+    JOB_POLL_INTERVAL: float = 5  # seconds
+    JOB_CONCURRENCY: dict[str, int] = {}  # Per job type overrides, e.g. {"chat.purge": 1}
+    CHAT_PURGE_RETENTION_DAYS: int = 30
+    CHAT_PURGE_BATCH_SIZE: int = 100
+    CHAT_PURGE_ROWS_PER_SECOND: float = 500
+    CHAT_PURGE_PAUSE_EVERY: int = 10_000  # rows, to let autovacuum keep up
+    CHAT_PURGE_PAUSE: float = 5  # seconds
+    CHAT_PURGE_VACUUM: bool = False
+    CHAT_ARCHIVE_IDLE_DAYS: int = 14
+    CHAT_ARCHIVE_BATCH_SIZE: int = 100
+    CHAT_ARCHIVE_COMPRESSION_LEVEL: int = 3
+    DAILY_TOKEN_QUOTA: Optional[int] = None  # tokens per user per UTC day, unlimited if None
+    USAGE_FLUSH_SIZE: int = 500  # records
+    USAGE_FLUSH_INTERVAL: float = 10  # seconds
+    USAGE_REFRESH_INTERVAL: float = 60  # seconds, to account for the usage recorded by other processes
+    RATE_LIMITS: dict[str, str] = {  # Per user and route class
+        "chat_turn": "20/minute",
+        "chat_read": "300/minute",
+        "export": "10/hour",
+    }
+    RATE_LIMIT_REDIS_URL: Optional[str] = None  # Share rate limits across replicas, kept in process if None
+    ADMISSION_MAX_IN_FLIGHT: int = 200  # requests
+    ADMISSION_MAX_POOL_WAIT: float = 0.5  # seconds
+    ADMISSION_MAX_LOOP_LAG: float = 0.2  # seconds
+    LOOP_LAG_INTERVAL: float = 0.1  # seconds
+    LOOP_BLOCK_THRESHOLD: float = 0.1  # seconds the event loop may be unresponsive before its stack is captured
+    EXPORT_BATCH_SIZE: int = 50  # chat sessions fetched from the database at a time by data exports
+    EXPORT_SEND_TIMEOUT: float = 30  # seconds an export may wait on a client not reading it before disconnecting
+    PREWARM: bool = False  # Open the database pool and LLM connections at start-up, before serving requests
+    PREWARM_LLM_CONNECTIONS: int = 4
+    READINESS_CACHE_TTL: float = 1  # seconds readiness results are reused, so that probes stay cheap
+    READINESS_TIMEOUT: float = 1  # seconds
+    READINESS_MAX_POOL_USAGE: float = 0.9  # Fraction of the pool checked out above which the process is not ready
+    SHUTDOWN_DRAIN_DELAY: float = 5  # seconds readiness fails on SIGTERM before the server stops accepting connections
+    SHUTDOWN_TIMEOUT: float = 30  # seconds after SIGTERM to finish the requests and chat turns in progress
+    METRICS_DIR: Optional[str] = None  # Directory shared by the worker processes, to merge their metrics
+    METRICS_WRITE_INTERVAL: float = 1  # seconds
+    LOG_LEVEL: str = "INFO"
+    LOG_DEBUG_SAMPLE_RATE: float = 0.01  # Fraction of debug records kept
+    PROFILE_REQUEST_TOKEN: Optional[str] = None  # X-Profile header value selecting requests to profile, off if None
+    PROFILE_REQUEST_INTERVAL: float = 0.001  # seconds between stack samples of a profiled request
+    TRACE_SAMPLE_RATE: float = 0.01  # Fraction of requests traced, unless the caller sampled the trace
+    TRACE_EXPORT_PATH: Optional[str] = None  # File the spans are appended to, as OTLP/JSON lines
+    TRACE_EXPORT_URL: Optional[str] = None  # OTLP/HTTP endpoint, e.g. http://localhost:4318/v1/traces
+    SLOW_QUERY_THRESHOLD: float = 0.5  # seconds
+    QUERY_REPEAT_THRESHOLD: int = 5  # Executions of the same statement shape per request, above which N+1 is logged
 
     @property
     def show_docs(self):
@@ -37,5 +93,3 @@ class Settings(BaseSettings):
 
 
 settings = Settings()
-
-openai.api_key = settings.OPENAI_API_KEY
@@ -1,35 +1,127 @@
+import asyncio
 import json
+import time
 import uuid
 from datetime import datetime
-from typing import AsyncGenerator, List
+from typing import AsyncGenerator, Callable, List, Optional
 
 import sqlalchemy as sa
 from pydantic import parse_obj_as
 from pydantic.json import pydantic_encoder
-from sqlalchemy import DateTime, MetaData
+from sqlalchemy import DateTime, MetaData, event
 from sqlalchemy.dialects.postgresql import JSONB
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import (
+    AsyncConnection,
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.orm import Mapped, declarative_base, mapped_column
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from app.config import settings
+from app.tracing import tracer
 
 
 def json_serializer(*args, **kwargs) -> str:
     return json.dumps(*args, default=pydantic_encoder, **kwargs)
 
 
-engine = create_async_engine(
-    settings.DATABASE_URL,
-    pool_size=settings.POOL_SIZE,
-    max_overflow=settings.MAX_OVERFLOW,
-    json_serializer=json_serializer,  # TODO: check the performance impact
-)
+# Called with the duration of each connection checkout from the pool, including the time waiting for a connection
+pool_checkout_listeners: List[Callable[[float], None]] = []
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """A connection pool reporting how long checkouts take to `pool_checkout_listeners`."""
+
+    def connect(self):
+        started_at = time.perf_counter()
+        try:
+            with tracer.span("db.checkout"):
+                return super().connect()
+        finally:
+            duration = time.perf_counter() - started_at
+            for listener in pool_checkout_listeners:
+                listener(duration)
+
+
+_engine: Optional[AsyncEngine] = None
+
+
+def get_engine() -> AsyncEngine:
+    """
+    Get the database engine of the application, creating it on first use.
+
+    Returns:
+        AsyncEngine: The engine.
+    """
+    global _engine
+    if _engine is None:
+        _engine = create_async_engine(
+            settings.DATABASE_URL,
+            poolclass=TimedQueuePool,
+            pool_size=settings.POOL_SIZE,
+            max_overflow=settings.MAX_OVERFLOW,
+            json_serializer=json_serializer,  # TODO: check the performance impact
+        )
+    return _engine
+
+
+async def dispose_engine() -> None:
+    """Close the connections of the database engine, if it was created."""
+    global _engine
+    if _engine is not None:
+        await _engine.dispose()
+        _engine = None
+
+
+async def prewarm_pool() -> None:
+    """Open the `POOL_SIZE` connections of the pool, so that the first requests do not wait for new connections."""
+    engine = get_engine()
+
+    async def connect() -> AsyncConnection:
+        return await engine.connect()
+
+    connections = await asyncio.gather(*(connect() for _ in range(settings.POOL_SIZE)), return_exceptions=True)
+    for connection in connections:
+        if isinstance(connection, AsyncConnection):
+            await connection.close()  # Back to the pool, still open
+    for connection in connections:
+        if isinstance(connection, BaseException):
+            raise connection
+
+
+# Statement listeners are registered on all engines, so that the engines of tests and tools are instrumented too
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_statement_span(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.trace_span = tracer.start_span(
+            "db.statement", **{"db.statement": statement, "db.executemany": executemany}
+        )
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _end_statement_span(conn, cursor, statement, parameters, context, executemany):
+    span = getattr(context, "trace_span", None)
+    if span is not None:
+        tracer.end_span(span)
+
+
+@event.listens_for(Engine, "handle_error")
+def _fail_statement_span(exception_context):
+    span = getattr(exception_context.execution_context, "trace_span", None)
+    if span is not None:
+        span.record_exception(exception_context.original_exception)
+        tracer.end_span(span)
+
 
-_async_session = async_sessionmaker(engine, expire_on_commit=False, autocommit=False, autoflush=False)
+_async_session = async_sessionmaker(expire_on_commit=False, autocommit=False, autoflush=False)
 
 
 def async_session() -> AsyncSession:
-    return _async_session()
+    return _async_session(bind=get_engine())
 
 
 POSTGRES_INDEXES_NAMING_CONVENTION = {
@@ -198,9 +290,11 @@ class ListPydanticType(sa.types.TypeDecorator):
     def process_bind_param(self, value, _):
         if value is None:
             return None
-        return [item.dict() for item in value]
+        with tracer.span("db.encode", type=self.pydantic_type.__name__, items=len(value)):
+            return [item.dict() for item in value]
 
     def process_result_value(self, value, _):
         if value is None:
             return None
-        return parse_obj_as(List[self.pydantic_type], value)
+        with tracer.span("db.decode", type=self.pydantic_type.__name__, items=len(value)):
+            return parse_obj_as(List[self.pydantic_type], value)
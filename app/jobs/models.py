@@ -0,0 +1,207 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from enum import StrEnum
+from typing import Any, Dict, List, Optional
+
+import sqlalchemy as sa
+from sqlalchemy import UUID, DateTime, Index, Integer, String, Text, text
+from sqlalchemy.dialects.postgresql import JSONB, insert
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base, TimestampMixin, async_session
+
+
+class JobStatus(StrEnum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+# Predicate of the partial indexes on active jobs, which ON CONFLICT must repeat to infer the dedupe index
+ACTIVE_JOB_PREDICATE = "status IN ('queued', 'running')"
+
+
+class Job(Base, TimestampMixin):
+    """
+    Represents a background job stored in Postgres.
+
+    Workers claim due jobs with `FOR UPDATE SKIP LOCKED`, so any number of workers can share the table without blocking
+    each other. A claimed job is invisible to other workers until `locked_until`; if its worker dies, the job becomes
+    claimable again once that visibility timeout expires.
+
+    Attributes:
+        id (uuid.UUID): The unique identifier for the job.
+        type (str): The job type, which selects the handler.
+        payload (dict): The arguments of the handler.
+        status (JobStatus): The status of the job.
+        dedupe_key (Optional[str]): If set, at most one queued or running job can have this key.
+        run_at (datetime): The earliest time the job may run.
+        locked_until (Optional[datetime]): The end of the visibility timeout of a running job.
+        attempts (int): The number of times the job was claimed.
+        max_attempts (int): The number of attempts after which a failing job is not retried.
+        last_error (Optional[str]): The error of the last failed attempt.
+    """
+
+    __tablename__ = "job"
+    __table_args__ = (
+        Index("job_claim_idx", "type", "run_at", postgresql_where=text(ACTIVE_JOB_PREDICATE)),
+        Index("job_dedupe_key_idx", "dedupe_key", unique=True, postgresql_where=text(ACTIVE_JOB_PREDICATE)),
+    )
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    type: Mapped[str] = mapped_column(String(100), nullable=False)
+    payload: Mapped[Dict[str, Any]] = mapped_column(JSONB, nullable=False, server_default=text("'{}'::jsonb"))
+    status: Mapped[JobStatus] = mapped_column(String(20), nullable=False, default=JobStatus.QUEUED)
+    dedupe_key: Mapped[Optional[str]] = mapped_column(String(200), nullable=True)
+    run_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=sa.func.now())
+    locked_until: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    max_attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=5)
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
+    def __repr__(self) -> str:
+        return f"<Job {self.id} type={self.type} status={self.status} attempts={self.attempts}>"
+
+    @classmethod
+    async def enqueue(
+        cls,
+        type: str,
+        payload: Optional[Dict[str, Any]] = None,
+        run_at: Optional[datetime] = None,
+        max_attempts: int = 5,
+        dedupe_key: Optional[str] = None,
+    ) -> Optional[uuid.UUID]:
+        """
+        Enqueue a new job.
+
+        Args:
+            type (str): The job type.
+            payload (Optional[Dict[str, Any]]): The arguments of the handler, which must be JSON-serializable.
+            run_at (Optional[datetime]): The earliest time the job may run. Defaults to now.
+            max_attempts (int): The number of attempts after which a failing job is not retried.
+            dedupe_key (Optional[str]): If set, the job is not enqueued when an active job has the same key.
+
+        Returns:
+            Optional[uuid.UUID]: The id of the new job, or None if it was deduplicated.
+        """
+        values: Dict[str, Any] = dict(
+            id=uuid.uuid4(),
+            type=type,
+            payload=payload or {},
+            status=JobStatus.QUEUED,
+            max_attempts=max_attempts,
+            dedupe_key=dedupe_key,
+            attempts=0,
+        )
+        if run_at is not None:
+            values["run_at"] = run_at
+        query = (
+            insert(cls)
+            .values(**values)
+            .on_conflict_do_nothing(index_elements=[cls.dedupe_key], index_where=text(ACTIVE_JOB_PREDICATE))
+            .returning(cls.id)
+        )
+        async with async_session() as session:
+            job_id = (await session.execute(query)).scalar()
+            await session.commit()
+        return job_id
+
+    @classmethod
+    async def claim(cls, type: str, limit: int, visibility_timeout: float) -> List["Job"]:
+        """
+        Claim up to `limit` due jobs of a type.
+
+        Jobs are locked with `FOR UPDATE SKIP LOCKED`, so concurrent workers claim disjoint batches. Jobs whose visibility
+        timeout expired during their last attempt are marked as failed rather than claimed again, so that a job killing
+        its worker (e.g. out of memory) is not retried forever.
+
+        Args:
+            type (str): The job type.
+            limit (int): The maximum number of jobs to claim.
+            visibility_timeout (float): How long the jobs stay invisible to other workers, in seconds.
+
+        Returns:
+            List[Job]: The claimed jobs.
+        """
+        now = sa.func.now()
+        expired = sa.and_(cls.status == JobStatus.RUNNING, cls.locked_until < now)
+        abandon = (
+            sa.update(cls)
+            .where(cls.type == type, expired, cls.attempts >= cls.max_attempts)
+            .values(
+                status=JobStatus.FAILED, locked_until=None, last_error="Visibility timeout expired on the last attempt"
+            )
+            .execution_options(synchronize_session=False)
+        )
+        due = (
+            sa.select(cls.id)
+            .where(
+                cls.type == type,
+                sa.or_(
+                    sa.and_(cls.status == JobStatus.QUEUED, cls.run_at <= now),
+                    sa.and_(expired, cls.attempts < cls.max_attempts),
+                ),
+            )
+            .order_by(cls.run_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        query = (
+            sa.update(cls)
+            .where(cls.id.in_(due.scalar_subquery()))
+            .values(
+                status=JobStatus.RUNNING,
+                locked_until=now + timedelta(seconds=visibility_timeout),
+                attempts=cls.attempts + 1,
+            )
+            .returning(cls)
+            .execution_options(synchronize_session=False)
+        )
+        async with async_session() as session:
+            await session.execute(abandon)
+            jobs = list((await session.execute(query)).scalars().all())
+            await session.commit()
+        return jobs
+
+    async def extend(self, visibility_timeout: float) -> None:
+        """Extend the visibility timeout of a running job."""
+        await self._update(locked_until=sa.func.now() + timedelta(seconds=visibility_timeout))
+
+    async def complete(self) -> None:
+        """Mark the job as done."""
+        await self._update(status=JobStatus.DONE, locked_until=None)
+
+    async def fail(self, error: str, retry_in: Optional[float]) -> bool:
+        """
+        Record a failed attempt.
+
+        Args:
+            error (str): The error of the attempt.
+            retry_in (Optional[float]): The delay before the next attempt in seconds, or None to not retry.
+
+        Returns:
+            bool: Whether the job will be retried.
+        """
+        if retry_in is None or self.attempts >= self.max_attempts:
+            await self._update(status=JobStatus.FAILED, locked_until=None, last_error=error)
+            return False
+        await self._update(
+            status=JobStatus.QUEUED,
+            locked_until=None,
+            last_error=error,
+            run_at=datetime.now(timezone.utc) + timedelta(seconds=retry_in),
+        )
+        return True
+
+    async def _update(self, **values: Any) -> None:
+        # Only update jobs still claimed by this attempt, in case the visibility timeout expired and another worker
+        # claimed the job again
+        query = (
+            sa.update(Job)
+            .where(Job.id == self.id, Job.status == JobStatus.RUNNING, Job.attempts == self.attempts)
+            .values(**values)
+        )
+        async with async_session() as session:
+            await session.execute(query)
+            await session.commit()
@@ -0,0 +1,213 @@
+import asyncio
+import contextlib
+import logging
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+from app.config import settings
+from app.jobs.models import Job
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[..., Awaitable[Any]]
+
+MAX_POLL_BACKOFF = 60.0  # Maximum delay between polls while claiming jobs fails, in seconds
+
+
+class JobType:
+    """
+    A registered type of background job.
+
+    Attributes:
+        name (str): The name of the job type, stored in `Job.type`.
+        handler (JobHandler): The coroutine function running a job, called with the job payload as keyword arguments.
+        concurrency (int): The maximum number of jobs of this type running at once in a worker.
+        max_attempts (int): The number of attempts after which a failing job is not retried.
+        visibility_timeout (float): How long a claimed job stays invisible to other workers, in seconds. Running jobs
+            extend it periodically, so it only bounds how long a job of a dead worker stays stuck.
+        backoff (float): The delay before the first retry, in seconds; it doubles with each attempt.
+        max_backoff (float): The maximum delay between retries, in seconds.
+        interval (Optional[float]): If set, the job is periodic and runs again this many seconds after it finishes.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        handler: JobHandler,
+        concurrency: int = 1,
+        max_attempts: int = 5,
+        visibility_timeout: float = 300,
+        backoff: float = 10,
+        max_backoff: float = 3600,
+        interval: Optional[float] = None,
+    ) -> None:
+        self.name = name
+        self.handler = handler
+        self.concurrency = settings.JOB_CONCURRENCY.get(name, concurrency)
+        self.max_attempts = max_attempts
+        self.visibility_timeout = visibility_timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.interval = interval
+
+    def __repr__(self) -> str:
+        return f"<JobType {self.name} concurrency={self.concurrency} interval={self.interval}>"
+
+    def retry_delay(self, attempts: int) -> float:
+        """
+        Get the delay before retrying a job, using exponential backoff with jitter.
+
+        Args:
+            attempts (int): The number of attempts made so far.
+
+        Returns:
+            float: The delay in seconds.
+        """
+        delay = min(self.max_backoff, self.backoff * 2 ** max(attempts - 1, 0))
+        return delay * random.uniform(0.5, 1)
+
+
+job_types: Dict[str, JobType] = {}
+
+
+def job(name: str, **options: Any) -> Callable[[JobHandler], JobHandler]:
+    """
+    Register a coroutine function as the handler of a job type.
+
+    Args:
+        name (str): The name of the job type.
+        **options: The options of the job type, see `JobType`.
+
+    Returns:
+        Callable[[JobHandler], JobHandler]: A decorator registering the handler.
+    """
+
+    def decorator(handler: JobHandler) -> JobHandler:
+        if name in job_types:
+            raise ValueError(f"Job type {name} is already registered")
+        job_types[name] = JobType(name, handler, **options)
+        return handler
+
+    return decorator
+
+
+async def enqueue(name: str, run_at: Optional[datetime] = None, dedupe_key: Optional[str] = None, **payload: Any):
+    """
+    Enqueue a job of a registered type.
+
+    Args:
+        name (str): The name of the job type.
+        run_at (Optional[datetime]): The earliest time the job may run. Defaults to now.
+        dedupe_key (Optional[str]): If set, the job is not enqueued when an active job has the same key.
+        **payload: The arguments of the handler, which must be JSON-serializable.
+
+    Returns:
+        Optional[uuid.UUID]: The id of the new job, or None if it was deduplicated.
+    """
+    job_type = job_types[name]
+    return await Job.enqueue(
+        name, payload=payload, run_at=run_at, max_attempts=job_type.max_attempts, dedupe_key=dedupe_key
+    )
+
+
+class Worker:
+    """
+    Runs background jobs of the given types until stopped.
+
+    Each job type is polled independently and runs up to its own concurrency, so slow job types do not starve the
+    others. Stopping the worker stops claiming new jobs and waits for the running ones to finish. Database errors are
+    logged and retried with backoff rather than stopping the worker: jobs whose state could not be updated are claimed
+    again once their visibility timeout expires.
+
+    Attributes:
+        job_types (List[JobType]): The job types run by this worker.
+        poll_interval (float): How long to wait before polling again when no job is due, in seconds.
+    """
+
+    def __init__(self, job_types: Iterable[JobType], poll_interval: float = settings.JOB_POLL_INTERVAL) -> None:
+        self.job_types: List[JobType] = list(job_types)
+        self.poll_interval = poll_interval
+        self._stopping: Optional[asyncio.Event] = None
+
+    def stop(self) -> None:
+        """Stop claiming new jobs; `run` returns once the running jobs are done."""
+        if self._stopping is not None:
+            self._stopping.set()
+
+    async def run(self) -> None:
+        """Run jobs until `stop` is called."""
+        self._stopping = asyncio.Event()
+        for job_type in self.job_types:
+            if job_type.interval is not None:
+                await Job.enqueue(job_type.name, max_attempts=job_type.max_attempts, dedupe_key=job_type.name)
+        await asyncio.gather(*(self._run_type(job_type, self._stopping) for job_type in self.job_types))
+
+    async def _run_type(self, job_type: JobType, stopping: asyncio.Event) -> None:
+        running: Set[asyncio.Task] = set()
+        wake_up = asyncio.Event()  # Set when a job finishes, so that its slot is refilled right away
+
+        def on_done(task: asyncio.Task) -> None:
+            running.discard(task)
+            wake_up.set()
+
+        failures = 0
+        while not stopping.is_set():
+            wake_up.clear()
+            free = job_type.concurrency - len(running)
+            try:
+                jobs = await Job.claim(job_type.name, free, job_type.visibility_timeout) if free > 0 else []
+            except Exception:
+                failures += 1
+                logger.exception("Failed to claim %s jobs", job_type.name)
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(
+                        stopping.wait(), timeout=min(MAX_POLL_BACKOFF, self.poll_interval * 2**failures)
+                    )
+                continue
+            failures = 0
+            for claimed_job in jobs:
+                task = asyncio.create_task(self._execute(job_type, claimed_job))
+                running.add(task)
+                task.add_done_callback(on_done)
+            if jobs and len(jobs) == free:
+                continue  # More jobs may be due
+            waiters = [asyncio.ensure_future(stopping.wait()), asyncio.ensure_future(wake_up.wait())]
+            await asyncio.wait(waiters, timeout=self.poll_interval, return_when=asyncio.FIRST_COMPLETED)
+            for waiter in waiters:
+                waiter.cancel()
+        if running:
+            await asyncio.wait(running)
+
+    async def _heartbeat(self, job_type: JobType, claimed_job: Job) -> None:
+        while True:
+            await asyncio.sleep(job_type.visibility_timeout / 3)
+            try:
+                await claimed_job.extend(job_type.visibility_timeout)
+            except Exception:
+                logger.exception("Failed to extend the visibility timeout of job %s", claimed_job.id)
+
+    async def _execute(self, job_type: JobType, claimed_job: Job) -> None:
+        heartbeat = asyncio.create_task(self._heartbeat(job_type, claimed_job))
+        error: Optional[Exception] = None
+        try:
+            await job_type.handler(**claimed_job.payload)
+        except Exception as e:
+            error = e
+        finally:
+            heartbeat.cancel()
+        try:
+            if error is not None:
+                will_retry = await claimed_job.fail(repr(error), retry_in=job_type.retry_delay(claimed_job.attempts))
+            else:
+                await claimed_job.complete()
+                will_retry = False
+            if job_type.interval is not None and not will_retry:
+                await Job.enqueue(
+                    job_type.name,
+                    run_at=datetime.now(timezone.utc) + timedelta(seconds=job_type.interval),
+                    max_attempts=job_type.max_attempts,
+                    dedupe_key=job_type.name,
+                )
+        except Exception:
+            logger.exception("Failed to record the outcome of job %s", claimed_job.id)
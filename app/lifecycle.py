@@ -0,0 +1,118 @@
+"""
+Readiness of the API process, and its graceful shutdown.
+
+On SIGTERM, readiness fails first so that load balancers stop routing requests to the process, which keeps serving
+them for `SHUTDOWN_DRAIN_DELAY` seconds (see `app/server.py`). New chat turns are rejected from then on. The server
+then stops accepting connections and waits for the requests in flight, and the lifespan waits for the queued chat
+turns, all within `SHUTDOWN_TIMEOUT` seconds of the signal.
+"""
+
+import asyncio
+import math
+import time
+from typing import Dict, NamedTuple, Optional
+
+from sqlalchemy import text
+
+from app.config import settings
+from app.database import async_session, get_engine
+
+
+class ReadinessResult(NamedTuple):
+    """
+    The result of the readiness checks.
+
+    Attributes:
+        ready (bool): Whether all the checks passed.
+        checks (Dict[str, str]): `ok` or the reason of the failure, per check.
+    """
+
+    ready: bool
+    checks: Dict[str, str]
+
+
+class Readiness:
+    """
+    Whether this process should receive traffic.
+
+    Checks the database connectivity and the headroom left in the connection pool. Results are cached for a short
+    time so that frequent probes, from several load balancers, cost at most one query per period.
+
+    Attributes:
+        cache_ttl (float): How long results are reused, in seconds.
+        timeout (float): The maximum time the database check takes, in seconds.
+        max_pool_usage (float): The fraction of the pool capacity checked out above which the process is not ready.
+        draining (bool): Whether the process is shutting down, in which case it is never ready.
+        deadline (Optional[float]): When the shutdown must be over, on the `time.monotonic` clock.
+    """
+
+    def __init__(self, cache_ttl: float, timeout: float, max_pool_usage: float) -> None:
+        self.cache_ttl = cache_ttl
+        self.timeout = timeout
+        self.max_pool_usage = max_pool_usage
+        self.draining = False
+        self.deadline: Optional[float] = None
+        self._result: Optional[ReadinessResult] = None
+        self._checked_at = -math.inf
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    def start_draining(self, timeout: float) -> None:
+        """
+        Fail readiness from now on, and start the shutdown deadline.
+
+        Args:
+            timeout (float): The time left to shut down, in seconds.
+        """
+        self.draining = True
+        self.deadline = time.monotonic() + timeout
+
+    def time_left(self) -> float:
+        """Get the time left before the shutdown deadline, in seconds; infinite if the process is not draining."""
+        if self.deadline is None:
+            return math.inf
+        return max(self.deadline - time.monotonic(), 0)
+
+    async def check(self) -> ReadinessResult:
+        """
+        Check whether this process is ready, reusing recent results.
+
+        Returns:
+            ReadinessResult: Whether the process is ready, and the result of each check.
+        """
+        if self.draining:
+            return ReadinessResult(False, {"shutdown": "draining"})
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._loop is not loop:
+            self._loop = loop
+            self._lock = asyncio.Lock()
+        async with self._lock:  # Concurrent probes share the same checks
+            if self._result is None or time.monotonic() - self._checked_at > self.cache_ttl:
+                checks = {"pool": self._check_pool(), "database": await self._check_database()}
+                self._result = ReadinessResult(all(check == "ok" for check in checks.values()), checks)
+                self._checked_at = time.monotonic()
+            return self._result
+
+    def _check_pool(self) -> str:
+        checked_out = get_engine().pool.checkedout()  # type: ignore[attr-defined]
+        capacity = settings.POOL_SIZE + settings.MAX_OVERFLOW
+        if checked_out >= capacity * self.max_pool_usage:
+            return f"{checked_out} of {capacity} connections checked out"
+        return "ok"
+
+    async def _check_database(self) -> str:
+        try:
+            async with async_session() as session:
+                await asyncio.wait_for(session.execute(text("SELECT 1")), self.timeout)
+        except asyncio.TimeoutError:
+            return f"no response within {self.timeout}s"
+        except Exception as e:
+            return f"unreachable: {type(e).__name__}"
+        return "ok"
+
+
+readiness = Readiness(
+    cache_ttl=settings.READINESS_CACHE_TTL,
+    timeout=settings.READINESS_TIMEOUT,
+    max_pool_usage=settings.READINESS_MAX_POOL_USAGE,
+)
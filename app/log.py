@@ -0,0 +1,165 @@
+"""
+Structured logging.
+
+Records are put on a queue by the logging call and formatted as JSON lines and written by a background thread, so
+that logging never blocks the event loop on I/O. Records carry the request, user and chat session IDs of the context
+they were logged in. High-volume debug records are sampled.
+"""
+
+import atexit
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+import traceback
+import uuid
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+import orjson
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+from app.utils import route_template
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+user_id_var: ContextVar[Optional[str]] = ContextVar("user_id", default=None)
+chat_session_id_var: ContextVar[Optional[str]] = ContextVar("chat_session_id", default=None)
+
+REQUEST_ID_HEADER = b"x-request-id"
+# Maximum length of a request ID taken from a request header
+MAX_REQUEST_ID_LENGTH = 64
+# Attributes of every log record, the others are extra fields passed by the caller
+RECORD_ATTRIBUTES = frozenset(logging.makeLogRecord({}).__dict__) | {"message", "asctime"}
+CONTEXT_ATTRIBUTES = ("request_id", "user_id", "chat_session_id")
+
+logger = logging.getLogger(__name__)
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats records as JSON objects, with the context IDs and extra fields of the record."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in RECORD_ATTRIBUTES and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = "".join(traceback.format_exception(*record.exc_info))
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return orjson.dumps(entry, default=str).decode()
+
+    def formatTime(self, record: logging.LogRecord, datefmt: Optional[str] = None) -> str:
+        seconds = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+        return f"{seconds}.{int(record.msecs):03d}Z"
+
+
+class ContextQueueHandler(logging.handlers.QueueHandler):
+    """
+    Puts records on a queue for a `QueueListener`, without formatting them.
+
+    Only the context IDs are captured on the calling side, since context variables are not visible from the listener
+    thread. Formatting, including the message arguments and the traceback, is left to the listener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.request_id = request_id_var.get()
+        record.user_id = user_id_var.get()
+        record.chat_session_id = chat_session_id_var.get()
+        return record
+
+
+class DebugSampler(logging.Filter):
+    """
+    Keeps a fraction of debug records, and all records of higher levels.
+
+    Attributes:
+        rate (float): The fraction of debug records kept.
+    """
+
+    def __init__(self, rate: float) -> None:
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.DEBUG or random.random() < self.rate
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def configure_logging() -> None:
+    """
+    Log JSON lines to stdout through a queue and a background writer thread.
+
+    The root logger is configured at `settings.LOG_LEVEL`, and the writer is stopped, after writing the queued
+    records, when the process exits. Calling it again has no effect.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JSONFormatter())
+    queue_handler = ContextQueueHandler(log_queue)
+    queue_handler.addFilter(DebugSampler(settings.LOG_DEBUG_SAMPLE_RATE))
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(settings.LOG_LEVEL)
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+class RequestLogMiddleware:
+    """
+    ASGI middleware assigning a request ID to each HTTP request and logging one record per request.
+
+    The request ID is taken from the `X-Request-ID` header if given, and returned in the response headers.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = next((value for key, value in scope["headers"] if key == REQUEST_ID_HEADER), b"")
+        request_id = request_id[:MAX_REQUEST_ID_LENGTH] or uuid.uuid4().hex.encode()
+        token = request_id_var.set(request_id.decode("latin-1"))
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = [*message.get("headers", []), (REQUEST_ID_HEADER, request_id)]
+            await send(message)
+
+        started_at = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            logger.info(
+                "%s %s %d",
+                scope["method"],
+                scope["path"],
+                status_code,
+                extra={
+                    "route": route_template(scope),
+                    "status": status_code,
+                    "duration_ms": round((time.perf_counter() - started_at) * 1e3, 3),
+                },
+            )
+            request_id_var.reset(token)
@@ -1,3 +1,5 @@
 from .app import create_app
+from .log import configure_logging
 
+configure_logging()
 app = create_app()
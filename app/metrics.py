@@ -0,0 +1,331 @@
+"""
+Prometheus metrics.
+
+Metrics are plain counters and fixed-bucket histograms updated from the event loop, so they need no locks. With
+several worker processes, set `METRICS_DIR` to a directory shared by the workers and emptied on deploy: each worker
+periodically writes a snapshot of its metrics there, and `/metrics` merges the snapshots of all workers.
+"""
+
+import asyncio
+import os
+import time
+from bisect import bisect_left
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import orjson
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+from app.database import get_engine, pool_checkout_listeners
+from app.utils import route_template
+
+Labels = Tuple[str, ...]
+
+# Seconds, from fast queries to slow completions
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Metric:
+    """
+    A metric family, with one value per combination of label values.
+
+    Attributes:
+        name (str): The name of the metric.
+        documentation (str): The help text of the metric.
+        labelnames (Sequence[str]): The names of the labels, whose values are passed positionally.
+    """
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, Any] = {}
+
+    def snapshot(self) -> List[Tuple[Labels, Any]]:
+        """Get the values of the metric, as JSON-serializable pairs of label values and value."""
+        return list(self._values.items())
+
+
+class Counter(Metric):
+    """A monotonically increasing value, summed across processes."""
+
+    type = "counter"
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+
+class Gauge(Metric):
+    """
+    A value that can go up and down.
+
+    Across processes, gauges are summed (`livesum`) or maxed (`max`) over the processes still alive.
+    """
+
+    type = "gauge"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), multiprocess_mode: str = "livesum"
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.multiprocess_mode = multiprocess_mode
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+
+class Histogram(Metric):
+    """
+    The distribution of observed values, counted in fixed buckets.
+
+    Values are stored per bucket (not cumulatively) followed by the sum of the observations, and summed across
+    processes.
+    """
+
+    type = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels: str) -> None:
+        state = self._values.get(labels)
+        if state is None:
+            state = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect_left(self.buckets, value)] += 1  # The last bucket is +Inf
+        state[-1] += value
+
+
+class Registry:
+    """
+    A collection of metrics, rendered in the Prometheus text format.
+
+    Collectors are called before each snapshot, to set gauges that are read from other objects.
+    """
+
+    def __init__(self) -> None:
+        self.metrics: Dict[str, Metric] = {}
+        self.collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: Metric) -> Any:
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Get the values of all metrics of this process."""
+        for collector in self.collectors:
+            collector()
+        return {"pid": os.getpid(), "metrics": {name: metric.snapshot() for name, metric in self.metrics.items()}}
+
+    def write_snapshot(self, directory: str) -> None:
+        """Write the snapshot of this process to a directory shared with the other worker processes."""
+        path = Path(directory) / f"{os.getpid()}.json"
+        temporary_path = path.with_suffix(".tmp")
+        temporary_path.write_bytes(orjson.dumps(self.snapshot()))
+        temporary_path.replace(path)  # Atomic, so readers never see a partial snapshot
+
+    def read_snapshots(self, directory: Optional[str]) -> List[Dict[str, Any]]:
+        """Get the snapshot of this process and, if a directory is given, those of the other worker processes."""
+        snapshots = [self.snapshot()]
+        if directory is None:
+            return snapshots
+        for path in Path(directory).glob("*.json"):
+            try:
+                snapshot = orjson.loads(path.read_bytes())
+            except (OSError, orjson.JSONDecodeError):
+                continue  # Deleted or being replaced
+            if snapshot["pid"] == os.getpid():
+                continue
+            snapshot["alive"] = _is_alive(snapshot["pid"])
+            snapshots.append(snapshot)
+        return snapshots
+
+    def render(self, snapshots: Iterable[Dict[str, Any]]) -> str:
+        """Merge snapshots and render them in the Prometheus text format."""
+        merged: Dict[str, Dict[Labels, Any]] = {name: {} for name in self.metrics}
+        for snapshot in snapshots:
+            alive = snapshot.get("alive", True)
+            for name, values in snapshot["metrics"].items():
+                metric = self.metrics.get(name)
+                if metric is None:
+                    continue
+                for labels, value in values:
+                    _merge(metric, merged[name], tuple(labels), value, alive)
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {_escape_help(metric.documentation)}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            for labels, value in sorted(merged[name].items()):
+                if isinstance(metric, Histogram):
+                    lines.extend(_render_histogram(metric, labels, value))
+                else:
+                    lines.append(f"{name}{_render_labels(metric.labelnames, labels)} {_render_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _merge(metric: Metric, merged: Dict[Labels, Any], labels: Labels, value: Any, alive: bool) -> None:
+    if isinstance(metric, Gauge):
+        if not alive:
+            return
+        if labels not in merged:
+            merged[labels] = value
+        elif metric.multiprocess_mode == "max":
+            merged[labels] = max(merged[labels], value)
+        else:
+            merged[labels] += value
+    elif isinstance(metric, Histogram):
+        if labels not in merged:
+            merged[labels] = list(value)
+        else:
+            merged[labels] = [total + observed for total, observed in zip(merged[labels], value)]
+    else:
+        merged[labels] = merged.get(labels, 0.0) + value
+
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _render_labels(labelnames: Sequence[str], labels: Sequence[str]) -> str:
+    if not labelnames:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in zip(labelnames, labels)) + "}"
+
+
+def _render_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+def _render_histogram(metric: Histogram, labels: Labels, value: List[float]) -> List[str]:
+    lines = []
+    cumulative = 0
+    for bound, count in zip([*metric.buckets, float("inf")], value[:-1]):
+        cumulative += count
+        bucket_labels = _render_labels((*metric.labelnames, "le"), (*labels, _render_value(bound)))
+        lines.append(f"{metric.name}_bucket{bucket_labels} {_render_value(cumulative)}")
+    rendered_labels = _render_labels(metric.labelnames, labels)
+    lines.append(f"{metric.name}_sum{rendered_labels} {_render_value(value[-1])}")
+    lines.append(f"{metric.name}_count{rendered_labels} {_render_value(cumulative)}")
+    return lines
+
+
+registry = Registry()
+
+http_requests = registry.register(Counter("http_requests_total", "HTTP requests.", ["method", "route", "status"]))
+http_request_duration = registry.register(
+    Histogram("http_request_duration_seconds", "HTTP request latency.", ["method", "route"])
+)
+db_pool_checkout_duration = registry.register(
+    Histogram("db_pool_checkout_duration_seconds", "Time to check out a connection from the pool, waits included.")
+)
+db_pool_connections = registry.register(Gauge("db_pool_connections", "Connections of the database pool.", ["state"]))
+db_query_duration = registry.register(Histogram("db_query_duration_seconds", "Database query latency.", ["statement"]))
+llm_request_duration = registry.register(
+    Histogram("llm_request_duration_seconds", "Chat completion latency.", ["model"])
+)
+llm_errors = registry.register(Counter("llm_errors_total", "Failed chat completions.", ["model", "error"]))
+llm_tokens = registry.register(Counter("llm_tokens_total", "Tokens used by chat completions.", ["model", "kind"]))
+completion_cache_requests = registry.register(
+    Counter("completion_cache_requests_total", "Completion cache lookups.", ["result"])
+)
+
+
+def collect_pool() -> None:
+    pool = get_engine().pool
+    db_pool_connections.set(pool.checkedout(), "checked_out")  # type: ignore[attr-defined]
+    db_pool_connections.set(pool.checkedin(), "idle")  # type: ignore[attr-defined]
+
+
+registry.collectors.append(collect_pool)
+pool_checkout_listeners.append(db_pool_checkout_duration.observe)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if context is not None:
+        context.metrics_started_at = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    started_at = getattr(context, "metrics_started_at", None)
+    if started_at is None:
+        return
+    statement_type = statement.lstrip().split(None, 1)[0].upper() if statement else ""
+    db_query_duration.observe(time.perf_counter() - started_at, statement_type)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording the count and latency of HTTP requests per route template."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self._writer: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _start(self) -> None:
+        if settings.METRICS_DIR is None:
+            return
+        loop = asyncio.get_running_loop()
+        if self._writer is None or self._loop is not loop:  # The writer is bound to the loop that started it
+            self._loop = loop
+            self._writer = loop.create_task(self._write_periodically(settings.METRICS_DIR))
+
+    async def _write_periodically(self, directory: str) -> None:
+        while True:
+            await asyncio.sleep(settings.METRICS_WRITE_INTERVAL)
+            registry.write_snapshot(directory)  # Small enough to write from the loop
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        self._start()
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started_at = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = route_template(scope)
+            http_request_duration.observe(time.perf_counter() - started_at, scope["method"], route)
+            http_requests.inc(scope["method"], route, str(status_code))
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    """Expose the metrics of all worker processes in the Prometheus text format."""
+    return Response(registry.render(registry.read_snapshots(settings.METRICS_DIR)), media_type=CONTENT_TYPE)
@@ -0,0 +1,199 @@
+"""
+Slow-query log and N+1 detector.
+
+Statements slower than `SLOW_QUERY_THRESHOLD` are logged with their parameters and the route of the request that ran
+them. Statements are counted per request, by shape, so that a request running the same statement shape more than
+`QUERY_REPEAT_THRESHOLD` times (an N+1 pattern) is logged. In tests, `query_budget` fails when a block runs more
+statements than declared or the same shape in a loop.
+"""
+
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.config import settings
+from app.metrics import Histogram, registry
+from app.utils import route_template
+
+logger = logging.getLogger(__name__)
+
+# Maximum length of the parameters logged with a slow statement
+MAX_LOGGED_PARAMETERS_LENGTH = 1000
+# Placeholder lists, e.g. expanded IN clauses, whose length varies between otherwise identical statements
+PLACEHOLDER_LIST = re.compile(r"\$\d+(?:\s*,\s*\$\d+)*")
+WHITESPACE = re.compile(r"\s+")
+
+db_statements_per_request = registry.register(
+    Histogram(
+        "http_request_db_statements",
+        "Database statements per HTTP request.",
+        ["route"],
+        buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+    )
+)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a block runs more statements than its budget, or the same statement shape in a loop."""
+
+    pass
+
+
+@lru_cache(maxsize=1024)
+def statement_shape(statement: str) -> str:
+    """
+    Normalize a statement so that executions differing only by their parameters share the same shape.
+
+    Args:
+        statement (str): The SQL statement, as sent to the database.
+
+    Returns:
+        str: The statement with whitespace collapsed and placeholder lists replaced by `?`.
+    """
+    return PLACEHOLDER_LIST.sub("?", WHITESPACE.sub(" ", statement).strip())
+
+
+class QueryRecorder:
+    """
+    Counts the statements run while it is active, by shape.
+
+    Attributes:
+        scope (Optional[Scope]): The ASGI scope of the request being recorded, if any.
+        count (int): The number of statements run.
+        shapes (Counter[str]): The number of executions of each statement shape.
+    """
+
+    def __init__(self, scope: Optional[Scope] = None) -> None:
+        self.scope = scope
+        self.count = 0
+        self.shapes: Counter[str] = Counter()
+
+    @property
+    def route(self) -> Optional[str]:
+        return route_template(self.scope) if self.scope is not None else None
+
+    def record(self, statement: str) -> None:
+        self.count += 1
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated_shapes(self, threshold: int) -> List[Tuple[str, int]]:
+        """Get the statement shapes run more than `threshold` times, most frequent first."""
+        return [(shape, count) for shape, count in self.shapes.most_common() if count > threshold]
+
+
+# Recorders of the current context, innermost last: the request's, and those of any enclosing `query_budget`
+active_recorders: ContextVar[Tuple[QueryRecorder, ...]] = ContextVar("active_recorders", default=())
+
+
+@contextmanager
+def record_queries(scope: Optional[Scope] = None) -> Iterator[QueryRecorder]:
+    """
+    Record the statements run in a block.
+
+    Args:
+        scope (Optional[Scope]): The ASGI scope of the request running the block, if any.
+
+    Yields:
+        QueryRecorder: The statements run so far.
+    """
+    recorder = QueryRecorder(scope)
+    token = active_recorders.set((*active_recorders.get(), recorder))
+    try:
+        yield recorder
+    finally:
+        active_recorders.reset(token)
+
+
+def _current_route() -> Optional[str]:
+    for recorder in reversed(active_recorders.get()):
+        if recorder.scope is not None:
+            return recorder.route
+    return None
+
+
+def _truncate(parameters: Any) -> str:
+    text = repr(parameters)
+    if len(text) > MAX_LOGGED_PARAMETERS_LENGTH:
+        return text[:MAX_LOGGED_PARAMETERS_LENGTH] + "..."
+    return text
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if context is not None:
+        context.query_log_started_at = time.perf_counter()
+    for recorder in active_recorders.get():
+        recorder.record(statement)
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    started_at = getattr(context, "query_log_started_at", None)
+    if started_at is None:
+        return
+    duration = time.perf_counter() - started_at
+    if duration >= settings.SLOW_QUERY_THRESHOLD:
+        logger.warning(
+            "Slow query (%.3fs) in %s: %s; parameters: %s",
+            duration,
+            _current_route() or "<no request>",
+            statement,
+            _truncate(parameters),
+        )
+
+
+class QueryLogMiddleware:
+    """ASGI middleware counting the statements run by each HTTP request, and logging N+1 patterns."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with record_queries(scope) as recorder:
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                route = recorder.route
+                db_statements_per_request.observe(recorder.count, route)
+                for shape, count in recorder.repeated_shapes(settings.QUERY_REPEAT_THRESHOLD):
+                    logger.warning("Possible N+1 in %s: statement run %d times: %s", route, count, shape)
+
+
+@contextmanager
+def query_budget(max_statements: int, max_repeats: Optional[int] = None) -> Iterator[QueryRecorder]:
+    """
+    Fail when a block, e.g. a request in a test, runs too many statements.
+
+    Args:
+        max_statements (int): The maximum number of statements the block may run.
+        max_repeats (Optional[int]): If set, the maximum number of times the block may run the same statement
+            shape. Defaults to `settings.QUERY_REPEAT_THRESHOLD`.
+
+    Yields:
+        QueryRecorder: The statements run so far.
+
+    Raises:
+        QueryBudgetExceeded: Raised when the block exceeds its budget.
+    """
+    max_repeats = settings.QUERY_REPEAT_THRESHOLD if max_repeats is None else max_repeats
+    with record_queries() as recorder:
+        yield recorder
+    if recorder.count > max_statements:
+        shapes = "\n".join(f"{count} x {shape}" for shape, count in recorder.shapes.most_common())
+        raise QueryBudgetExceeded(f"Ran {recorder.count} statements, budget is {max_statements}:\n{shapes}")
+    repeated = recorder.repeated_shapes(max_repeats)
+    if repeated:
+        shape, count = repeated[0]
+        raise QueryBudgetExceeded(f"Ran the same statement {count} times, at most {max_repeats} allowed: {shape}")
@@ -0,0 +1,204 @@
+import abc
+import logging
+import math
+import time
+from typing import TYPE_CHECKING, Any, Callable, Coroutine, Dict, NamedTuple
+
+from fastapi import HTTPException, status
+
+from app.config import settings
+from app.user.auth import ActiveVerifiedUser
+from app.user.models import User
+
+if TYPE_CHECKING:
+    import redis.asyncio as redis
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {"second": 1, "minute": 60, "hour": 60 * 60, "day": 24 * 60 * 60}
+# Number of keys above which the in-process backend drops the keys of idle clients
+MAX_MEMORY_KEYS = 100_000
+
+
+class RateLimit(NamedTuple):
+    """
+    A limit of `limit` requests per `period` seconds.
+
+    Limits are enforced with the generic cell rate algorithm (GCRA): a client may burst up to `limit` requests, then
+    gets one more request every `period / limit` seconds.
+    """
+
+    limit: int
+    period: float
+
+    @classmethod
+    def parse(cls, value: str) -> "RateLimit":
+        """
+        Parse a rate limit such as `10/minute`.
+
+        Args:
+            value (str): The number of requests and the period, one of second, minute, hour or day.
+
+        Returns:
+            RateLimit: The rate limit.
+
+        Raises:
+            ValueError: Raised if the rate limit is malformed.
+        """
+        limit, _, period = value.partition("/")
+        if period not in PERIODS or not limit.isdigit() or int(limit) == 0:
+            raise ValueError(f"Invalid rate limit: {value}")
+        return cls(int(limit), PERIODS[period])
+
+    @property
+    def emission_interval(self) -> float:
+        return self.period / self.limit
+
+    @property
+    def tolerance(self) -> float:
+        return self.period - self.emission_interval
+
+
+class RateLimitBackend(abc.ABC):
+    """Where the GCRA state of each client is kept."""
+
+    @abc.abstractmethod
+    async def acquire(self, key: str, rate_limit: RateLimit) -> float:
+        """
+        Count a request of a client.
+
+        Args:
+            key (str): The client and route class.
+            rate_limit (RateLimit): The rate limit of the route class.
+
+        Returns:
+            float: 0 if the request is allowed, otherwise how long to wait before retrying, in seconds.
+        """
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """Keeps the GCRA state of each client in this process."""
+
+    def __init__(self, max_keys: int = MAX_MEMORY_KEYS) -> None:
+        self.max_keys = max_keys
+        self._tats: Dict[str, float] = {}  # Theoretical arrival times
+
+    async def acquire(self, key: str, rate_limit: RateLimit) -> float:
+        now = time.monotonic()
+        tat = max(self._tats.get(key, now), now)
+        wait = tat - rate_limit.tolerance - now
+        if wait > 0:
+            return wait
+        if len(self._tats) >= self.max_keys:
+            self._tats = {client: client_tat for client, client_tat in self._tats.items() if client_tat > now}
+        self._tats[key] = tat + rate_limit.emission_interval
+        return 0
+
+
+# GCRA on the Redis server clock, so that all replicas share the same state
+GCRA_SCRIPT = """
+local interval = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local tat = math.max(tonumber(redis.call('GET', KEYS[1])) or now, now)
+local wait = tat - tolerance - now
+if wait > 0 then
+    return tostring(wait)
+end
+redis.call('SET', KEYS[1], tostring(tat + interval), 'PX', math.ceil((tat + interval - now) * 1000))
+return '0'
+"""
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """
+    Keeps the GCRA state of each client in Redis, so that limits hold across replicas.
+
+    If Redis is unavailable, requests are allowed rather than failing.
+    """
+
+    def __init__(self, client: "redis.Redis", prefix: str = "ratelimit:") -> None:
+        from redis import RedisError
+
+        self.client = client
+        self.prefix = prefix
+        self._script = client.register_script(GCRA_SCRIPT)
+        self._error = RedisError
+
+    async def acquire(self, key: str, rate_limit: RateLimit) -> float:
+        try:
+            wait = await self._script(
+                keys=[self.prefix + key], args=[rate_limit.emission_interval, rate_limit.tolerance]
+            )
+        except self._error:
+            logger.warning("Rate limit backend unavailable, allowing request", exc_info=True)
+            return 0
+        return float(wait)
+
+
+class RateLimiter:
+    """
+    Rate limits clients per route class.
+
+    Attributes:
+        limits (Dict[str, RateLimit]): The rate limit of each route class; route classes without one are unlimited.
+        backend (RateLimitBackend): Where the state of each client is kept.
+    """
+
+    def __init__(self, limits: Dict[str, RateLimit], backend: RateLimitBackend) -> None:
+        self.limits = limits
+        self.backend = backend
+
+    async def acquire(self, route_class: str, client: str) -> float:
+        """
+        Count a request of a client to a route class.
+
+        Args:
+            route_class (str): The route class.
+            client (str): The client, e.g. a user id.
+
+        Returns:
+            float: 0 if the request is allowed, otherwise how long to wait before retrying, in seconds.
+        """
+        rate_limit = self.limits.get(route_class)
+        if rate_limit is None:
+            return 0
+        return await self.backend.acquire(f"{route_class}:{client}", rate_limit)
+
+
+def create_rate_limiter() -> RateLimiter:
+    """Create the rate limiter configured in the settings."""
+    limits = {route_class: RateLimit.parse(value) for route_class, value in settings.RATE_LIMITS.items()}
+    if settings.RATE_LIMIT_REDIS_URL is None:
+        return RateLimiter(limits, MemoryRateLimitBackend())
+    import redis.asyncio as redis  # Deferred, only needed when rate limits are shared
+
+    return RateLimiter(limits, RedisRateLimitBackend(redis.from_url(settings.RATE_LIMIT_REDIS_URL)))
+
+
+rate_limiter = create_rate_limiter()
+
+
+def rate_limit(route_class: str) -> Callable[[User], Coroutine[Any, Any, User]]:
+    """
+    Create a dependency rate limiting the authenticated user on a route class.
+
+    Args:
+        route_class (str): The route class, whose limit is set in `settings.RATE_LIMITS`.
+
+    Returns:
+        Callable: A dependency returning the authenticated user, or raising a 429 error with a Retry-After header.
+    """
+
+    async def dependency(user: ActiveVerifiedUser) -> User:
+        wait = await rate_limiter.acquire(route_class, str(user.id))
+        if wait > 0:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Rate limit exceeded",
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+        return user
+
+    return dependency
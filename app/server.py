@@ -0,0 +1,60 @@
+"""
+Serve the API with uvicorn, draining connections on SIGTERM so that rolling deploys do not fail requests.
+
+Usage:
+    python -m app.server [--host HOST] [--port PORT]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import signal
+from types import FrameType
+from typing import Optional
+
+import uvicorn
+
+from app.config import settings
+from app.lifecycle import readiness
+
+logger = logging.getLogger(__name__)
+
+
+class DrainingServer(uvicorn.Server):
+    """
+    A uvicorn server that keeps serving requests for `SHUTDOWN_DRAIN_DELAY` seconds after SIGTERM.
+
+    Readiness fails during the delay, so that load balancers stop routing new requests to the process before it stops
+    accepting connections. Requests still in flight `SHUTDOWN_TIMEOUT` seconds after the signal are cancelled, so that
+    the lifespan shutdown still runs. Other signals, or a second SIGTERM, shut down right away.
+    """
+
+    def handle_exit(self, sig: int, frame: Optional[FrameType]) -> None:
+        if sig != signal.SIGTERM or self.should_exit or readiness.draining:
+            super().handle_exit(sig, frame)
+            return
+        logger.info("Draining for %ss before shutting down", settings.SHUTDOWN_DRAIN_DELAY)
+        readiness.start_draining(settings.SHUTDOWN_TIMEOUT)
+        loop = asyncio.get_event_loop()
+        loop.call_later(settings.SHUTDOWN_DRAIN_DELAY, super().handle_exit, sig, frame)
+        loop.call_later(settings.SHUTDOWN_TIMEOUT, self.cancel_requests)
+
+    def cancel_requests(self) -> None:
+        """Cancel the requests in flight, past the shutdown deadline."""
+        if self.server_state.tasks:
+            logger.warning("Cancelling %d requests in flight at the shutdown deadline", len(self.server_state.tasks))
+        for task in self.server_state.tasks:
+            task.cancel()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.environ.get("UVICORN_HOST", "127.0.0.1"), help="The address to bind.")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("UVICORN_PORT", 8000)), help="The port.")
+    args = parser.parse_args()
+    DrainingServer(uvicorn.Config("app.main:app", host=args.host, port=args.port)).run()
+
+
+if __name__ == "__main__":
+    main()
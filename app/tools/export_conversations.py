@@ -0,0 +1,340 @@
+"""
+Export all the conversations as redacted, compressed JSONL shards for offline analysis.
+
+The `chat_session` keyspace is split into ranges of ids, each streamed from the database with `COPY` into its own
+shard. Rows are parsed, redacted and compressed in batches by a process pool, so that exports scale with the number of
+cores. Each line of a shard is a chat session with its tutor, language and messages:
+
+- The user is replaced by a pseudonymous `learner_id`, stable across exports.
+- The `name` of messages is dropped, and the name of the user and email addresses are masked in message contents.
+- Soft-deleted chat sessions are left out; archived message histories are decompressed.
+
+Shards are zstd frames of JSONL, listed with their counts per tutor and checksum in `manifest.json`. The manifest is
+updated as shards complete, and running the export again with the same output directory resumes it: completed shards
+are kept, and only chat sessions created before the time of the first run are exported, with the messages sent before
+it, so that shards are consistent however active the conversations are meanwhile.
+
+Usage:
+    python app/tools/export_conversations.py --output OUTPUT [--shards SHARDS] [--jobs JOBS] [--level LEVEL]
+        [--batch-bytes BYTES] [--as-of AS_OF]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import hmac
+import os
+import re
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+import asyncpg
+import orjson
+import zstandard
+from sqlalchemy.engine import make_url
+
+from app.chat.archive import ChatSessionArchive, unpack_message_history
+from app.chat.models import ChatSession
+from app.config import settings
+from app.tutor.models import Tutor
+from app.user.models import User
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+EMAIL = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+# Escape sequences of the text format of COPY
+COPY_ESCAPES = {"b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t", "v": "\v"}
+COPY_ESCAPE = re.compile(r"\\(.)")
+# Names shorter than this are not masked in message contents, they would match common words
+MIN_MASKED_NAME_LENGTH = 3
+
+EXPORT_QUERY = f"""
+SELECT cs.id, cs.user_id, u.name, cs.tutor_id, t.language, to_json(cs.created_at) #>> '{{}}',
+    to_json(cs.updated_at) #>> '{{}}', cs.message_history, encode(a.data, 'hex')
+FROM {ChatSession.__tablename__} cs
+JOIN "{User.__tablename__}" u ON u.id = cs.user_id
+JOIN {Tutor.__tablename__} t ON t.id = cs.tutor_id
+LEFT JOIN {ChatSessionArchive.__tablename__} a ON a.chat_session_id = cs.id
+WHERE cs.deleted_at IS NULL AND cs.created_at < $1 AND cs.id >= $2 AND ($3::uuid IS NULL OR cs.id < $3)
+ORDER BY cs.id
+"""
+
+
+def shard_range(shard: int, shards: int) -> Tuple[uuid.UUID, Optional[uuid.UUID]]:
+    """
+    Get the range of chat session ids of a shard. Ids are random, so shards hold about as many chat sessions each.
+
+    Returns:
+        Tuple[uuid.UUID, Optional[uuid.UUID]]: The first id of the shard, and the first id of the next one, or None
+            for the last shard.
+    """
+    start = uuid.UUID(int=(shard << 128) // shards)
+    end = uuid.UUID(int=((shard + 1) << 128) // shards) if shard + 1 < shards else None
+    return start, end
+
+
+def _unescape(field: str) -> Optional[str]:
+    if field == "\\N":
+        return None
+    return COPY_ESCAPE.sub(lambda match: COPY_ESCAPES.get(match[1], match[1]), field)
+
+
+def learner_id(user_id: str, key: bytes) -> str:
+    """Pseudonymize a user id, so that the chat sessions of a learner can be grouped without identifying them."""
+    return hmac.new(key, user_id.encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def redact(content: str, user_name: Optional[str]) -> str:
+    """Mask the name of the user and email addresses in a message content."""
+    content = EMAIL.sub("[email]", content)
+    if user_name and len(user_name) >= MIN_MASKED_NAME_LENGTH:
+        content = re.sub(rf"\b{re.escape(user_name)}\b", "[name]", content, flags=re.IGNORECASE)
+    return content
+
+
+def redact_batch(rows: bytes, key: bytes, level: int, as_of_ms: int) -> Tuple[bytes, int, Dict[str, Tuple[int, int]]]:
+    """
+    Redact a batch of rows from `COPY` into a compressed JSONL frame. Runs in the worker processes.
+
+    Args:
+        rows (bytes): Whole rows of `EXPORT_QUERY`, in the text format of `COPY`.
+        key (bytes): The key pseudonymizing user ids.
+        level (int): The zstd compression level.
+        as_of_ms (int): The time of the export, in milliseconds since the epoch; later messages are left out.
+
+    Returns:
+        Tuple[bytes, int, Dict[str, Tuple[int, int]]]: The zstd frame, its uncompressed size, and the number of chat
+            sessions and messages per tutor id.
+    """
+    lines = []
+    counts: Dict[str, Tuple[int, int]] = {}
+    for row in rows.decode().split("\n")[:-1]:  # Not splitlines(): contents may hold other line separators
+        chat_session_id, user_id, user_name, tutor_id, language, created_at, updated_at, message_history, archive = (
+            _unescape(field) for field in row.split("\t")
+        )
+        messages = orjson.loads(message_history or "[]")
+        if not messages and archive is not None:
+            messages = [message.dict() for message in unpack_message_history(bytes.fromhex(archive))]
+        messages = [message for message in messages if (message.get("timestamp_ms") or 0) <= as_of_ms]
+        for message in messages:
+            message.pop("name", None)
+            message["content"] = redact(message.get("content") or "", user_name)
+        lines.append(
+            orjson.dumps(
+                {
+                    "chat_session_id": chat_session_id,
+                    "learner_id": learner_id(str(user_id), key),
+                    "tutor_id": tutor_id,
+                    "language": language,
+                    "created_at": created_at,
+                    "updated_at": updated_at,
+                    "messages": messages,
+                },
+                option=orjson.OPT_APPEND_NEWLINE,
+            )
+        )
+        sessions, message_count = counts.get(str(tutor_id), (0, 0))
+        counts[str(tutor_id)] = (sessions + 1, message_count + len(messages))
+    raw = b"".join(lines)
+    return zstandard.ZstdCompressor(level=level).compress(raw), len(raw), counts
+
+
+class Manifest:
+    """
+    The progress and contents of an export, kept in `manifest.json` in the output directory.
+
+    Attributes:
+        path (str): The path of the manifest.
+        data (Dict[str, Any]): The manifest: the export options and the completed shards.
+    """
+
+    def __init__(self, path: str, data: Dict[str, Any]) -> None:
+        self.path = path
+        self.data = data
+
+    @classmethod
+    def load_or_create(cls, output: str, shards: int, as_of: datetime, tutors: Dict[str, Any]) -> "Manifest":
+        """
+        Load the manifest of an export to resume, or start a new one.
+
+        Raises:
+            ValueError: Raised if the export to resume was split into a different number of shards.
+        """
+        path = os.path.join(output, MANIFEST_FILE)
+        if os.path.exists(path):
+            with open(path, "rb") as file:
+                manifest = cls(path, orjson.loads(file.read()))
+            if manifest.data["shards"] != shards:
+                raise ValueError(f"The export in {output} has {manifest.data['shards']} shards, not {shards}.")
+            return manifest
+        manifest = cls(
+            path,
+            {
+                "version": MANIFEST_VERSION,
+                "as_of": as_of.isoformat(),
+                "shards": shards,
+                "compression": "zstd",
+                "tutors": tutors,
+                "completed": {},
+            },
+        )
+        manifest.save()
+        return manifest
+
+    @property
+    def as_of(self) -> datetime:
+        return datetime.fromisoformat(self.data["as_of"])
+
+    def is_completed(self, shard: int) -> bool:
+        return str(shard) in self.data["completed"]
+
+    def complete(self, shard: int, entry: Dict[str, Any]) -> None:
+        """Record a completed shard."""
+        self.data["completed"][str(shard)] = entry
+        self.save()
+
+    def save(self) -> None:
+        """Write the manifest atomically, so that an interrupted export can always be resumed."""
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "wb") as file:
+            file.write(orjson.dumps(self.data, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS))
+        os.replace(temporary_path, self.path)
+
+
+async def export_shard(
+    pool: asyncpg.Pool,
+    executor: ProcessPoolExecutor,
+    manifest: Manifest,
+    shard: int,
+    key: bytes,
+    level: int,
+    batch_bytes: int,
+) -> None:
+    """
+    Stream the chat sessions of a shard with `COPY`, redact them in the process pool and write the shard.
+
+    The shard is written to a temporary file, renamed once complete, and then recorded in the manifest.
+    """
+    loop = asyncio.get_running_loop()
+    file_name = f"shard-{shard:05d}.jsonl.zst"
+    path = os.path.join(os.path.dirname(manifest.path), file_name)
+    start, end = shard_range(shard, manifest.data["shards"])
+    as_of_ms = int(manifest.as_of.timestamp() * 1e3)
+    buffer = bytearray()
+    checksum = hashlib.sha256()
+    raw_bytes = compressed_bytes = 0
+    counts: Dict[str, Dict[str, int]] = {}
+
+    with open(f"{path}.part", "wb") as file:
+
+        async def write_batch(rows: bytes) -> None:
+            nonlocal raw_bytes, compressed_bytes
+            frame, raw_size, batch_counts = await loop.run_in_executor(
+                executor, redact_batch, rows, key, level, as_of_ms
+            )
+            file.write(frame)
+            checksum.update(frame)
+            raw_bytes += raw_size
+            compressed_bytes += len(frame)
+            for tutor_id, (sessions, messages) in batch_counts.items():
+                tutor_counts = counts.setdefault(tutor_id, {"sessions": 0, "messages": 0})
+                tutor_counts["sessions"] += sessions
+                tutor_counts["messages"] += messages
+
+        async def consume(chunk: bytes) -> None:
+            buffer.extend(chunk)
+            if len(buffer) >= batch_bytes:  # Awaiting the batch holds back COPY, bounding the memory used
+                end_of_rows = buffer.rfind(b"\n") + 1
+                rows = bytes(buffer[:end_of_rows])
+                del buffer[:end_of_rows]
+                await write_batch(rows)
+
+        async with pool.acquire() as connection:
+            await connection.copy_from_query(EXPORT_QUERY, manifest.as_of, start, end, output=consume)
+        if buffer:
+            await write_batch(bytes(buffer))
+    os.replace(f"{path}.part", path)
+
+    manifest.complete(
+        shard,
+        {
+            "file": file_name,
+            "sessions": sum(tutor_counts["sessions"] for tutor_counts in counts.values()),
+            "messages": sum(tutor_counts["messages"] for tutor_counts in counts.values()),
+            "raw_bytes": raw_bytes,
+            "compressed_bytes": compressed_bytes,
+            "sha256": checksum.hexdigest(),
+            "counts": counts,
+        },
+    )
+
+
+async def export_conversations(
+    output: str, shards: int, jobs: int, level: int, batch_bytes: int, as_of: datetime
+) -> None:
+    """
+    Export the conversations into shards, resuming the export in the output directory if any.
+
+    Args:
+        output (str): The output directory.
+        shards (int): The number of ranges the chat sessions are split into.
+        jobs (int): The number of shards exported, and of batches redacted, in parallel.
+        level (int): The zstd compression level.
+        batch_bytes (int): The size of the batches of rows redacted at a time.
+        as_of (datetime): Only chat sessions created and messages sent before this time are exported, unless the
+            export is resumed.
+    """
+    os.makedirs(output, exist_ok=True)
+    dsn = make_url(settings.DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+    key = settings.APP_SECRET.encode()
+    started_at = time.perf_counter()
+    async with asyncpg.create_pool(dsn, min_size=1, max_size=jobs) as pool:
+        tutors = {
+            str(row["id"]): {"name": row["name"], "language": row["language"]}
+            for row in await pool.fetch(f"SELECT id, name, language FROM {Tutor.__tablename__}")
+        }
+        manifest = Manifest.load_or_create(output, shards, as_of, tutors)
+        manifest.data["tutors"].update(tutors)
+        remaining = [shard for shard in range(shards) if not manifest.is_completed(shard)]
+        print(f"Exporting {len(remaining)} of {shards} shards, as of {manifest.as_of.isoformat()}", flush=True)
+
+        with ProcessPoolExecutor(jobs) as executor:
+            semaphore = asyncio.Semaphore(jobs)
+
+            async def run(shard: int) -> None:
+                async with semaphore:
+                    await export_shard(pool, executor, manifest, shard, key, level, batch_bytes)
+                completed = manifest.data["completed"]
+                exported = sum(entry["sessions"] for entry in completed.values())
+                print(
+                    f"{len(completed)}/{shards} shards, {exported} chat sessions"
+                    f" ({time.perf_counter() - started_at:.0f}s)",
+                    flush=True,
+                )
+
+            await asyncio.gather(*(run(shard) for shard in remaining))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", required=True, help="The output directory, holding the export to resume if any.")
+    parser.add_argument("--shards", type=int, default=64, help="The number of shards.")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="The number of parallel jobs.")
+    parser.add_argument("--level", type=int, default=3, help="The zstd compression level.")
+    parser.add_argument("--batch-bytes", type=int, default=4 << 20, help="The size of the batches redacted at a time.")
+    parser.add_argument(
+        "--as-of",
+        type=datetime.fromisoformat,
+        default=datetime.now(timezone.utc),
+        help="Export chat sessions and messages before this ISO 8601 timestamp (default: now), ignored when resuming.",
+    )
+    args = parser.parse_args()
+    as_of = args.as_of if args.as_of.tzinfo is not None else args.as_of.replace(tzinfo=timezone.utc)
+    asyncio.run(export_conversations(args.output, args.shards, args.jobs, args.level, args.batch_bytes, as_of))
+
+
+if __name__ == "__main__":
+    main()
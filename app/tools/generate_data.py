@@ -0,0 +1,301 @@
+"""
+Generate a large, realistic dataset to test query plans, indexes and performance at production scale.
+
+Users, tutors and chat sessions are bulk-loaded with `COPY`, in batches generated in parallel by worker processes.
+Users do not exist in Firebase; sign in as them with offline ID tokens (see `benchmarks/loadtest/tokens.py`). The
+same seed and `--now` generate the same rows, so datasets can be recreated exactly.
+
+- Chat sessions per user follow a geometric distribution: most users have a few, some have many.
+- Message history lengths follow a log-normal distribution, capped at `--max-messages`.
+- A fraction of chat sessions is soft-deleted, some time after their last message.
+
+Usage:
+    python app/tools/generate_data.py [--users USERS] [--sessions-per-user MEAN] [--median-messages MEDIAN]
+        [--deleted-fraction FRACTION] [--days DAYS] [--jobs JOBS] [--batch-size USERS] [--seed SEED] [--now NOW]
+"""
+
+import argparse
+import asyncio
+import math
+import random
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, List, NamedTuple, Optional, Tuple
+
+import asyncpg
+import orjson
+from sqlalchemy.engine import make_url
+
+from app.chat.models import DEFAULT_MAX_MESSAGES, DEFAULT_MAX_TOKENS, ChatSession
+from app.config import settings
+from app.tutor.models import SYSTEM_TEMPLATE_STRING, ModelName, Tutor
+from app.user.models import User
+
+USER_COLUMNS = ("id", "email", "firebase_uid", "name", "language", "is_superuser", "created_at", "updated_at")
+TUTOR_COLUMNS = (
+    "id",
+    "name",
+    "avatar_url",
+    "visible",
+    "language",
+    "system_prompt",
+    "personality_prompt",
+    "model",
+    "created_at",
+    "updated_at",
+)
+CHAT_SESSION_COLUMNS = (
+    "id",
+    "user_id",
+    "tutor_id",
+    "message_history",
+    "max_tokens",
+    "max_messages",
+    "created_at",
+    "updated_at",
+    "deleted_at",
+)
+TUTORS = [
+    ("Amélie", "french"),
+    ("Louis", "french"),
+    ("Emma", "english"),
+    ("Oliver", "english"),
+]
+NAMES = ["Jean", "Marie", "Alex", "Sam", "Léa", "Hugo", "Chloé", "Noah", "Mia", "Lucas", "Inès", "Tom"]
+WORDS = (
+    "bonjour merci comment allez vous je suis très bien et toi aujourd'hui nous allons parler de la cuisine "
+    "française hello thank you how are doing today we will talk about cooking travel weekend favourite book"
+).split()
+# Mean time between two messages of a chat session, in seconds
+MESSAGE_INTERVAL = 40
+
+
+class GenerationOptions(NamedTuple):
+    """
+    The shape of the generated dataset.
+
+    Attributes:
+        seed (int): The seed all the rows are derived from.
+        sessions_per_user (float): The mean number of chat sessions per user.
+        median_messages (int): The median length of message histories.
+        max_messages (int): The maximum length of message histories.
+        deleted_fraction (float): The fraction of chat sessions soft-deleted.
+        days (int): How far back in time users are created.
+        now (datetime): The end of the generated time span.
+    """
+
+    seed: int
+    sessions_per_user: float
+    median_messages: int
+    max_messages: int
+    deleted_fraction: float
+    days: int
+    now: datetime
+
+
+def _uuid(rng: random.Random) -> uuid.UUID:
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+
+def _timestamp_between(rng: random.Random, start: datetime, end: datetime) -> datetime:
+    return start + (end - start) * rng.random()
+
+
+def generate_tutors(options: GenerationOptions) -> List[Tuple[Any, ...]]:
+    """Generate the tutor rows."""
+    rng = random.Random(f"{options.seed}:tutors")
+    created_at = options.now - timedelta(days=options.days)
+    return [
+        (
+            _uuid(rng),
+            name,
+            "https://cdn-icons-png.flaticon.com/512/168/168726.png",
+            True,
+            language,
+            SYSTEM_TEMPLATE_STRING,
+            "",
+            ModelName.GPT3_5_TURBO.value,
+            created_at,
+            created_at,
+        )
+        for name, language in TUTORS
+    ]
+
+
+def _generate_message_history(
+    rng: random.Random, options: GenerationOptions, started_at: datetime
+) -> Tuple[str, datetime]:
+    length = min(max(round(rng.lognormvariate(math.log(options.median_messages), 1.0)), 1), options.max_messages)
+    timestamp = started_at
+    message_history = []
+    for index in range(length):
+        message_history.append(
+            {
+                "role": "assistant" if index % 2 == 0 else "user",
+                "content": " ".join(rng.choices(WORDS, k=rng.randint(3, 40))),
+                "name": None,
+                "uuid": str(_uuid(rng)),
+                "timestamp_ms": int(timestamp.timestamp() * 1e3),
+                "function_call": None,
+            }
+        )
+        timestamp += timedelta(seconds=rng.expovariate(1 / MESSAGE_INTERVAL))
+    return orjson.dumps(message_history).decode(), timestamp
+
+
+def generate_batch(
+    options: GenerationOptions, batch: int, batch_size: int, tutor_ids: List[uuid.UUID], count: Optional[int] = None
+) -> Tuple[List[Tuple[Any, ...]], List[Tuple[Any, ...]]]:
+    """
+    Generate a batch of users and their chat sessions.
+
+    The rows depend only on the options and the batch number, so that batches can be generated in any order. A
+    shortened batch holds the first users of the full batch.
+
+    Args:
+        options (GenerationOptions): The shape of the dataset.
+        batch (int): The number of the batch.
+        batch_size (int): The number of users per batch.
+        tutor_ids (List[uuid.UUID]): The tutors of the chat sessions.
+        count (Optional[int]): The number of users to generate, to shorten the last batch. Defaults to `batch_size`.
+
+    Returns:
+        Tuple[List[Tuple[Any, ...]], List[Tuple[Any, ...]]]: The user rows and the chat session rows.
+    """
+    rng = random.Random(f"{options.seed}:{batch}")
+    start = options.now - timedelta(days=options.days)
+    # Geometric distribution of the number of chat sessions per user, with the requested mean
+    stop_probability = 1 / (options.sessions_per_user + 1)
+    users, chat_sessions = [], []
+    for index in range(batch * batch_size, batch * batch_size + (batch_size if count is None else count)):
+        user_id = _uuid(rng)
+        user_created_at = _timestamp_between(rng, start, options.now)
+        users.append(
+            (
+                user_id,
+                f"user{index}.{options.seed}@example.com",
+                f"generated-{options.seed}-{index}",
+                rng.choice(NAMES),
+                rng.choice(settings.SUPPORTED_LANGUAGES),
+                False,
+                user_created_at,
+                user_created_at,
+            )
+        )
+        while rng.random() >= stop_probability:
+            created_at = _timestamp_between(rng, user_created_at, options.now)
+            message_history, updated_at = _generate_message_history(rng, options, created_at)
+            deleted_at = None
+            if rng.random() < options.deleted_fraction:
+                deleted_at = _timestamp_between(rng, updated_at, max(updated_at, options.now))
+            chat_sessions.append(
+                (
+                    _uuid(rng),
+                    user_id,
+                    rng.choice(tutor_ids),
+                    message_history,
+                    DEFAULT_MAX_TOKENS,
+                    DEFAULT_MAX_MESSAGES,
+                    created_at,
+                    updated_at,
+                    deleted_at,
+                )
+            )
+    return users, chat_sessions
+
+
+async def load_batch(pool: asyncpg.Pool, users: List[Tuple[Any, ...]], chat_sessions: List[Tuple[Any, ...]]) -> None:
+    """Load a batch of users and their chat sessions in one transaction."""
+    async with pool.acquire() as connection, connection.transaction():
+        await connection.copy_records_to_table(User.__tablename__, records=users, columns=USER_COLUMNS)
+        await connection.copy_records_to_table(
+            ChatSession.__tablename__, records=chat_sessions, columns=CHAT_SESSION_COLUMNS
+        )
+
+
+async def generate_data(options: GenerationOptions, users: int, batch_size: int, jobs: int) -> None:
+    """
+    Generate and load the dataset.
+
+    Args:
+        options (GenerationOptions): The shape of the dataset.
+        users (int): The number of users.
+        batch_size (int): The number of users per batch.
+        jobs (int): The number of batches generated and loaded in parallel.
+    """
+    dsn = make_url(settings.DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+    loop = asyncio.get_running_loop()
+    batches = math.ceil(users / batch_size)
+    started_at = time.perf_counter()
+    loaded_users = loaded_chat_sessions = 0
+    async with asyncpg.create_pool(dsn, min_size=1, max_size=jobs) as pool:
+        tutors = generate_tutors(options)
+        await pool.copy_records_to_table(Tutor.__tablename__, records=tutors, columns=TUTOR_COLUMNS)
+        tutor_ids = [tutor[0] for tutor in tutors]
+
+        with ProcessPoolExecutor(jobs) as executor:
+            semaphore = asyncio.Semaphore(jobs * 2)  # Bound the batches held in memory
+
+            async def generate_and_load(batch: int) -> None:
+                nonlocal loaded_users, loaded_chat_sessions
+                async with semaphore:
+                    batch_users, batch_chat_sessions = await loop.run_in_executor(
+                        executor,
+                        generate_batch,
+                        options,
+                        batch,
+                        batch_size,
+                        tutor_ids,
+                        min(batch_size, users - batch * batch_size),
+                    )
+                    await load_batch(pool, batch_users, batch_chat_sessions)
+                loaded_users += len(batch_users)
+                loaded_chat_sessions += len(batch_chat_sessions)
+                print(
+                    f"{loaded_users} users, {loaded_chat_sessions} chat sessions"
+                    f" ({loaded_users / (time.perf_counter() - started_at):.0f} users/s)",
+                    flush=True,
+                )
+
+            await asyncio.gather(*(generate_and_load(batch) for batch in range(batches)))
+
+        async with pool.acquire() as connection:  # Fresh statistics, for realistic query plans
+            for table in (User.__tablename__, Tutor.__tablename__, ChatSession.__tablename__):
+                await connection.execute(f'ANALYZE "{table}"')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100_000, help="The number of users.")
+    parser.add_argument("--sessions-per-user", type=float, default=3, help="The mean number of sessions per user.")
+    parser.add_argument("--median-messages", type=int, default=12, help="The median length of message histories.")
+    parser.add_argument("--max-messages", type=int, default=500, help="The maximum length of message histories.")
+    parser.add_argument("--deleted-fraction", type=float, default=0.05, help="The fraction of sessions soft-deleted.")
+    parser.add_argument("--days", type=int, default=365, help="How far back in time the data goes.")
+    parser.add_argument("--jobs", type=int, default=4, help="The number of batches generated and loaded in parallel.")
+    parser.add_argument("--batch-size", type=int, default=1000, help="The number of users per batch.")
+    parser.add_argument("--seed", type=int, default=0, help="The seed the data is derived from.")
+    parser.add_argument(
+        "--now",
+        type=datetime.fromisoformat,
+        default=datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0),
+        help="The end of the generated time span, as an ISO 8601 timestamp (default: today, 00:00 UTC).",
+    )
+    args = parser.parse_args()
+
+    options = GenerationOptions(
+        seed=args.seed,
+        sessions_per_user=args.sessions_per_user,
+        median_messages=args.median_messages,
+        max_messages=args.max_messages,
+        deleted_fraction=args.deleted_fraction,
+        days=args.days,
+        now=args.now if args.now.tzinfo is not None else args.now.replace(tzinfo=timezone.utc),
+    )
+    asyncio.run(generate_data(options, args.users, args.batch_size, args.jobs))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,17 +2,15 @@ import asyncio
 import uuid
 from datetime import datetime
 
-import firebase_admin
-from firebase_admin import auth, credentials
+from firebase_admin import auth
 
 from app.chat.models import ChatSession
 from app.chat.schemas import OpenAIMessage, OpenAIMessageRole
-from app.config import settings
 from app.tutor.models import ModelName, Tutor
+from app.user.firebase import get_firebase_app
 from app.user.models import User
 
-cred = credentials.Certificate(settings.FIREBASE_KEY_FILE)
-firebase_admin.initialize_app(cred)
+get_firebase_app()
 
 
 async def create_user(email: str, firebase_uid: str, name: str, language: str, is_superuser: bool) -> User:
@@ -0,0 +1,433 @@
+"""
+Distributed tracing.
+
+Each sampled request is recorded as a trace: a tree of timed spans covering authentication, database statements,
+JSONB decoding and chat completions. Traces continue the W3C `traceparent` of incoming requests and are propagated to
+the OpenAI API. The sampling decision is taken once per trace, when it starts, and spans of unsampled traces cost a
+context variable lookup.
+
+Finished spans are exported in batches by a background thread, as OTLP/JSON, to a local file (one export request per
+line) or to an OTLP/HTTP endpoint such as a local collector.
+"""
+
+import abc
+import logging
+import os
+import random
+import threading
+import time
+import urllib.request
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, List, NamedTuple, Optional, Union
+
+import orjson
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+from app.utils import route_template
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT_VERSION = "00"
+SAMPLED_FLAG = 0x01
+
+
+class SpanContext(NamedTuple):
+    """The identity of a span, as propagated in W3C `traceparent` headers."""
+
+    trace_id: str
+    span_id: str
+    sampled: bool
+
+    @classmethod
+    def from_traceparent(cls, traceparent: str) -> Optional["SpanContext"]:
+        """
+        Parse a `traceparent` header.
+
+        Args:
+            traceparent (str): The header value, e.g. `00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01`.
+
+        Returns:
+            Optional[SpanContext]: The context of the parent span, or None if the header is invalid.
+        """
+        parts = traceparent.strip().split("-")
+        if len(parts) < 4 or len(parts[0]) != 2 or parts[0] == "ff":
+            return None
+        version, trace_id, span_id, flags = parts[:4]
+        if version == TRACEPARENT_VERSION and len(parts) != 4:
+            return None
+        if len(trace_id) != 32 or len(span_id) != 16 or len(flags) != 2:
+            return None
+        try:
+            int(trace_id, 16), int(span_id, 16)
+            sampled = bool(int(flags, 16) & SAMPLED_FLAG)
+        except ValueError:
+            return None
+        if trace_id == "0" * 32 or span_id == "0" * 16:
+            return None
+        return cls(trace_id.lower(), span_id.lower(), sampled)
+
+    @property
+    def traceparent(self) -> str:
+        return f"{TRACEPARENT_VERSION}-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+
+def _random_id(bits: int) -> str:
+    return f"{random.getrandbits(bits) or 1:0{bits // 4}x}"
+
+
+class Span:
+    """
+    A timed operation of a trace.
+
+    Spans of unsampled traces are not recording: their attributes are ignored and they are never exported.
+
+    Attributes:
+        name (str): The name of the operation.
+        context (SpanContext): The identity of the span.
+        parent_id (Optional[str]): The span ID of the parent span, if any.
+        attributes (Dict[str, Any]): Details of the operation.
+        error (Optional[str]): The error that ended the operation, if any.
+    """
+
+    __slots__ = ("name", "context", "parent_id", "attributes", "error", "start_ns", "end_ns")
+
+    def __init__(self, name: str, context: SpanContext, parent_id: Optional[str] = None, **attributes: Any) -> None:
+        self.name = name
+        self.context = context
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+
+    @property
+    def recording(self) -> bool:
+        return self.context.sampled
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        if self.recording:
+            self.attributes[key] = value
+
+    def record_exception(self, exception: BaseException) -> None:
+        if self.recording:
+            self.error = f"{type(exception).__name__}: {exception}"
+
+
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class SpanExporter(abc.ABC):
+    """Where finished spans are sent."""
+
+    @abc.abstractmethod
+    def export(self, spans: List[Span]) -> None:
+        """
+        Send a batch of finished spans, from the exporter thread.
+
+        Args:
+            spans (List[Span]): The spans.
+        """
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def encode_otlp(spans: List[Span], service_name: str) -> bytes:
+    """
+    Encode spans as an OTLP/JSON export request.
+
+    Args:
+        spans (List[Span]): The finished spans.
+        service_name (str): The name of the service that recorded them.
+
+    Returns:
+        bytes: The JSON export request.
+    """
+    otlp_spans = []
+    for span in spans:
+        otlp_span = {
+            "traceId": span.context.trace_id,
+            "spanId": span.context.span_id,
+            "name": span.name,
+            "kind": 2 if span.parent_id is None else 1,  # Server for roots, internal otherwise
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items()],
+            "status": {"code": 2, "message": span.error} if span.error is not None else {},
+        }
+        if span.parent_id is not None:
+            otlp_span["parentSpanId"] = span.parent_id
+        otlp_spans.append(otlp_span)
+    request = {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+                "scopeSpans": [{"scope": {"name": __name__}, "spans": otlp_spans}],
+            }
+        ]
+    }
+    return orjson.dumps(request)
+
+
+class FileSpanExporter(SpanExporter):
+    """Appends spans to a file, one OTLP/JSON export request per line."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def export(self, spans: List[Span]) -> None:
+        with open(self.path, "ab") as file:
+            file.write(encode_otlp(spans, settings.PROJECT_NAME) + b"\n")
+
+
+class OTLPSpanExporter(SpanExporter):
+    """Posts spans to an OTLP/HTTP endpoint, e.g. `http://localhost:4318/v1/traces`."""
+
+    def __init__(self, url: str, timeout: float = 10) -> None:
+        self.url = url
+        self.timeout = timeout
+
+    def export(self, spans: List[Span]) -> None:
+        request = urllib.request.Request(
+            self.url,
+            data=encode_otlp(spans, settings.PROJECT_NAME),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+class BatchSpanProcessor:
+    """
+    Exports finished spans in batches from a background thread, so that request handling never waits on I/O.
+
+    When the queue is full, spans are dropped rather than slowing down requests.
+
+    Attributes:
+        exporter (SpanExporter): Where spans are sent.
+        max_queue_size (int): The maximum number of spans waiting to be exported.
+        max_batch_size (int): The maximum number of spans per export.
+        schedule_delay (float): The maximum time a span waits to be exported, in seconds.
+        dropped (int): The number of spans dropped because the queue was full.
+    """
+
+    def __init__(
+        self, exporter: SpanExporter, max_queue_size: int = 2048, max_batch_size: int = 512, schedule_delay: float = 5
+    ) -> None:
+        self.exporter = exporter
+        self.max_queue_size = max_queue_size
+        self.max_batch_size = max_batch_size
+        self.schedule_delay = schedule_delay
+        self.dropped = 0
+        self._queue: Deque[Span] = deque()  # Appends and pops are thread-safe
+        self._wake_up = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._flush_lock = threading.Lock()
+
+    def on_end(self, span: Span) -> None:
+        """Queue a finished span for export."""
+        if len(self._queue) >= self.max_queue_size:
+            self.dropped += 1
+            return
+        self._queue.append(span)
+        if self._thread is None or self._pid != os.getpid():  # Threads do not survive forks
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+            self._thread.start()
+        if len(self._queue) >= self.max_batch_size:
+            self._wake_up.set()
+
+    def _run(self) -> None:
+        while True:
+            self._wake_up.wait(self.schedule_delay)
+            self._wake_up.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        """Export the queued spans, in batches."""
+        with self._flush_lock:
+            while self._queue:
+                batch = []
+                while self._queue and len(batch) < self.max_batch_size:
+                    batch.append(self._queue.popleft())
+                try:
+                    self.exporter.export(batch)
+                except Exception:
+                    logger.warning("Failed to export %d spans", len(batch), exc_info=True)
+
+
+class _ActiveSpan:
+    """Makes a span the current span for the duration of a `with` block, then ends it."""
+
+    __slots__ = ("tracer", "span", "token")
+
+    def __init__(self, tracer: "Tracer", span: Span) -> None:
+        self.tracer = tracer
+        self.span = span
+
+    def __enter__(self) -> Span:
+        self.token = current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exception, traceback) -> None:
+        if exception is not None:
+            self.span.record_exception(exception)
+        current_span.reset(self.token)
+        self.tracer.end_span(self.span)
+
+
+class _InactiveSpan:
+    """Stands in for a span outside of a sampled trace, yielding the current span."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> Span:
+        return current_span.get() or NON_RECORDING_SPAN
+
+    def __exit__(self, exc_type, exception, traceback) -> None:
+        pass
+
+
+NON_RECORDING_SPAN = Span("", SpanContext("0" * 32, "0" * 16, False))
+_INACTIVE_SPAN = _InactiveSpan()
+
+SpanScope = Union[_ActiveSpan, _InactiveSpan]
+
+
+class Tracer:
+    """
+    Starts traces and spans.
+
+    Spans are started with `with` blocks, which are plain context managers rather than generators so that spans of
+    unsampled traces stay cheap.
+
+    Attributes:
+        sample_rate (float): The fraction of traces recorded, for requests without a sampled parent.
+        processor (Optional[BatchSpanProcessor]): Exports finished spans; tracing is disabled if None.
+    """
+
+    def __init__(self, sample_rate: float, processor: Optional[BatchSpanProcessor]) -> None:
+        self.sample_rate = sample_rate
+        self.processor = processor
+
+    def start_trace(self, name: str, traceparent: Optional[str] = None, **attributes: Any) -> SpanScope:
+        """
+        Start the root span of this process for a request, taking the sampling decision of the trace.
+
+        Args:
+            name (str): The name of the operation.
+            traceparent (Optional[str]): The `traceparent` header of the request, if any. Its trace is continued
+                and its sampling decision is kept.
+            **attributes: Details of the operation.
+
+        Returns:
+            SpanScope: A context manager yielding the root span.
+        """
+        parent = SpanContext.from_traceparent(traceparent) if traceparent else None
+        if parent is not None:
+            trace_id, parent_id, sampled = parent
+        else:
+            trace_id, parent_id, sampled = _random_id(128), None, random.random() < self.sample_rate
+        sampled = sampled and self.processor is not None
+        return _ActiveSpan(self, Span(name, SpanContext(trace_id, _random_id(64), sampled), parent_id, **attributes))
+
+    def span(self, name: str, **attributes: Any) -> SpanScope:
+        """
+        Start a child span of the current span.
+
+        Outside of a sampled trace, the current span (if any) is yielded and nothing is recorded.
+
+        Args:
+            name (str): The name of the operation.
+            **attributes: Details of the operation.
+
+        Returns:
+            SpanScope: A context manager yielding the new span.
+        """
+        span = self.start_span(name, **attributes)
+        if span is None:
+            return _INACTIVE_SPAN
+        return _ActiveSpan(self, span)
+
+    def start_span(self, name: str, **attributes: Any) -> Optional[Span]:
+        """
+        Create a child span of the current span, without activating it.
+
+        Args:
+            name (str): The name of the operation.
+            **attributes: Details of the operation.
+
+        Returns:
+            Optional[Span]: The new span, or None outside of a sampled trace.
+        """
+        parent = current_span.get()
+        if parent is None or not parent.context.sampled:
+            return None
+        return Span(
+            name, SpanContext(parent.context.trace_id, _random_id(64), True), parent.context.span_id, **attributes
+        )
+
+    def end_span(self, span: Span) -> None:
+        """End a span and queue it for export."""
+        span.end_ns = time.time_ns()
+        if span.context.sampled and self.processor is not None:
+            self.processor.on_end(span)
+
+
+def create_tracer() -> Tracer:
+    """Create the tracer configured in the settings."""
+    exporter: Optional[SpanExporter] = None
+    if settings.TRACE_EXPORT_URL is not None:
+        exporter = OTLPSpanExporter(settings.TRACE_EXPORT_URL)
+    elif settings.TRACE_EXPORT_PATH is not None:
+        exporter = FileSpanExporter(settings.TRACE_EXPORT_PATH)
+    processor = BatchSpanProcessor(exporter) if exporter is not None else None
+    return Tracer(sample_rate=settings.TRACE_SAMPLE_RATE, processor=processor)
+
+
+tracer = create_tracer()
+
+
+def traceparent_headers() -> Dict[str, str]:
+    """Get the headers propagating the current trace to an outgoing request."""
+    span = current_span.get()
+    if span is None:
+        return {}
+    return {"traceparent": span.context.traceparent}
+
+
+class TracingMiddleware:
+    """ASGI middleware starting a trace per HTTP request, named after the route template."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        traceparent = next((value.decode("latin-1") for key, value in scope["headers"] if key == b"traceparent"), None)
+        with tracer.start_trace(scope["method"], traceparent, **{"http.method": scope["method"]}) as span:
+
+            async def send_wrapper(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.status_code", message["status"])
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = route_template(scope)
+                span.name = f"{scope['method']} {route}"
+                span.set_attribute("http.route", route)
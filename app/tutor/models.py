@@ -1,10 +1,10 @@
 import uuid
 from enum import StrEnum
-from typing import List, Optional
+from typing import Iterable, List, Optional
 
 from sqlalchemy import Boolean, String, select
 from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.orm import InstrumentedAttribute, Mapped, load_only, mapped_column
 
 from app.database import Base, TimestampMixin, async_session
 
@@ -158,27 +158,50 @@ class Tutor(Base, TimestampMixin):
             await session.commit()
 
     @classmethod
-    async def get_visible(cls) -> List["Tutor"]:
+    def columns(cls, fields: Iterable[str]) -> List[InstrumentedAttribute]:
+        """
+        Get the column attributes backing the given field names.
+
+        Args:
+            fields (Iterable[str]): The names of the fields, which match the column names.
+
+        Returns:
+            List[InstrumentedAttribute]: The column attributes, always including the primary key.
+        """
+        return [cls.id] + [getattr(cls, field) for field in fields if field != "id"]
+
+    @classmethod
+    async def get_visible(cls, fields: Optional[Iterable[str]] = None) -> List["Tutor"]:
         """
         Get a list of visible Tutor objects.
 
+        Args:
+            fields (Optional[Iterable[str]]): If given, only load these columns.
+
         Returns:
             List[Tutor]: A list of visible Tutor objects.
         """
         query = select(cls).where(cls.visible == True)  # noqa
+        if fields is not None:
+            query = query.options(load_only(*cls.columns(fields)))
         async with async_session() as session:
             result = await session.execute(query)
             return list(result.scalars().all())
 
     @classmethod
-    async def get_all(cls) -> List["Tutor"]:
+    async def get_all(cls, fields: Optional[Iterable[str]] = None) -> List["Tutor"]:
         """
         Get a list of all Tutor objects.
 
+        Args:
+            fields (Optional[Iterable[str]]): If given, only load these columns.
+
         Returns:
             List[Tutor]: A list of all Tutor objects.
         """
         query = select(cls)
+        if fields is not None:
+            query = query.options(load_only(*cls.columns(fields)))
         async with async_session() as session:
             result = await session.execute(query)
             return list(result.scalars().all())
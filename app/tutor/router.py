@@ -1,7 +1,9 @@
-from typing import List
+from typing import Annotated, List, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, HTTPException, Response, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 
 from app.tutor.models import Tutor
 from app.tutor.schemas import (
@@ -11,6 +13,7 @@ from app.tutor.schemas import (
     public_to_internal_model_name,
 )
 from app.user.auth import ActiveVerifiedUser, SuperUser
+from app.utils import FieldSelection, sparse_fields
 
 router = APIRouter(
     responses={404: {"description": "Not found"}},
@@ -38,16 +41,21 @@ async def create_tutor(tutor_create: TutorCreate, user: SuperUser) -> TutorRead:
 
 
 @router.get("/tutors")
-async def get_tutors(user: ActiveVerifiedUser) -> List[TutorRead]:
+async def get_tutors(
+    user: ActiveVerifiedUser, fields: Annotated[Optional[FieldSelection], Depends(sparse_fields(TutorRead))]
+) -> List[TutorRead]:
     """
     Get all tutors.
     """
     if user.is_superuser:
-        tutors = await Tutor.get_all()
+        tutors = await Tutor.get_all(fields=fields)
     elif user:
-        tutors = await Tutor.get_visible()
+        tutors = await Tutor.get_visible(fields=fields)
 
-    return [TutorRead.from_tutor(tutor) for tutor in tutors]
+    tutor_reads = [TutorRead.from_tutor(tutor, fields=fields) for tutor in tutors]
+    if fields is not None:  # Partial objects would fail response model validation
+        return JSONResponse(jsonable_encoder(tutor_reads, exclude_unset=True))  # type: ignore
+    return tutor_reads
 
 
 @router.get("/tutor/{tutor_id}")
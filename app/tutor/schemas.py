@@ -1,5 +1,5 @@
 from enum import StrEnum
-from typing import Optional
+from typing import Iterable, Optional
 from uuid import UUID
 
 from pydantic import AnyHttpUrl, BaseModel
@@ -65,8 +65,18 @@ class TutorRead(BaseModel):
     model: PublicModelName
 
     @classmethod
-    def from_tutor(cls, tutor: Tutor) -> "TutorRead":
-        """Create a TutorRead object from a Tutor ORM object."""
+    def from_tutor(cls, tutor: Tutor, fields: Optional[Iterable[str]] = None) -> "TutorRead":
+        """
+        Create a TutorRead object from a Tutor ORM object.
+
+        When `fields` is given, only those fields are read from the ORM object (so deferred columns are never loaded)
+        and the object is built without validation; serialize it with `exclude_unset=True`.
+        """
+        if fields is not None:
+            values = {field: getattr(tutor, field) for field in fields}
+            if "model" in values:
+                values["model"] = internal_to_public_model_name(values["model"])
+            return cls.construct(**values)
         return cls(
             id=tutor.id,
             name=tutor.name,
@@ -1,29 +1,44 @@
-from typing import Annotated
+from contextvars import ContextVar
+from typing import Annotated, Dict, Optional
 
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from firebase_admin import auth
 
+from app.log import user_id_var
+from app.tracing import tracer
+from app.user.firebase import verify_id_token
 from app.user.models import User
 
 security = HTTPBearer()
 
+# Users already authenticated in the current request scope, keyed by ID token.
+# Set by endpoints that dispatch sub-requests (e.g. /batch) so that each sub-request does not re-authenticate.
+authenticated_users: ContextVar[Optional[Dict[str, User]]] = ContextVar("authenticated_users", default=None)
+
 
 async def authenticate_user(credentials: Annotated[HTTPAuthorizationCredentials, Depends(security)]) -> User:
     id_token = credentials.credentials
-    try:
-        decoded_token = auth.verify_id_token(id_token)
-        firebase_uid = decoded_token['uid']
-        email_verified = decoded_token['email_verified']
-        if not email_verified:
-            raise HTTPException(status_code=403, detail="Email not verified")
-    except ValueError:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Unauthorized")
-
-    user = await User.get_by_firebase_uid(firebase_uid)
-    if user is None:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Unauthorized")
-
+    cached_users = authenticated_users.get()
+    if cached_users is not None and id_token in cached_users:
+        user_id_var.set(str(cached_users[id_token].id))
+        return cached_users[id_token]
+    with tracer.span("authenticate_user"):
+        try:
+            with tracer.span("firebase.verify_id_token"):
+                decoded_token = await run_in_threadpool(verify_id_token, id_token)
+            firebase_uid = decoded_token['uid']
+            email_verified = decoded_token['email_verified']
+            if not email_verified:
+                raise HTTPException(status_code=403, detail="Email not verified")
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Unauthorized")
+
+        user = await User.get_by_firebase_uid(firebase_uid)
+        if user is None:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Unauthorized")
+
+    user_id_var.set(str(user.id))
     return user
 
 
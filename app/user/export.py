@@ -0,0 +1,142 @@
+"""
+Export of all the data of a user, for data access requests or to move to another device.
+
+The export is newline-delimited JSON (NDJSON): a `user` record, then each chat session (soft-deleted ones included)
+as a `chat_session` record followed by a `message` record per message. Chat sessions are read from a server-side
+cursor and written out one at a time, so that exports of any size run in bounded memory, and the database is only
+read as fast as the client downloads the export. Clients that stop reading are disconnected after
+`settings.EXPORT_SEND_TIMEOUT`, so that they do not hold a database connection for as long as they stay connected.
+"""
+
+import asyncio
+import contextlib
+import logging
+import zlib
+from typing import Any, AsyncGenerator, Optional
+
+import orjson
+from starlette.responses import StreamingResponse
+from starlette.types import Message, Receive, Scope, Send
+
+from app.chat.models import ChatSession
+from app.chat.schemas import internal_to_external_role
+from app.config import settings
+from app.user.models import User
+
+logger = logging.getLogger(__name__)
+
+EXPORT_MEDIA_TYPE = "application/x-ndjson"
+
+
+def _record(record_type: str, **fields: Any) -> bytes:
+    return orjson.dumps({"type": record_type, **fields}) + b"\n"
+
+
+async def export_user_data(user: User) -> AsyncGenerator[bytes, None]:
+    """
+    Export all the data of a user as NDJSON.
+
+    Args:
+        user (User): The user.
+
+    Yields:
+        bytes: The records of the user, then those of each chat session and its messages.
+    """
+    yield _record("user", id=user.id, email=user.email, name=user.name, language=user.language)
+    async for chat_session in ChatSession.stream_by_user_id(user.id, batch_size=settings.EXPORT_BATCH_SIZE):
+        records = [
+            _record(
+                "chat_session",
+                id=chat_session.id,
+                tutor_id=chat_session.tutor_id,
+                tutor_name=chat_session.tutor.name,
+                created_at=chat_session.created_at,
+                updated_at=chat_session.updated_at,
+                deleted_at=chat_session.deleted_at,
+            )
+        ]
+        records.extend(
+            _record(
+                "message",
+                chat_session_id=chat_session.id,
+                role=internal_to_external_role.get(message.role, message.role),
+                content=message.content,
+                uuid=message.uuid,
+                timestamp_ms=message.timestamp_ms,
+            )
+            for message in chat_session.message_history
+        )
+        yield b"".join(records)
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    """
+    Check whether a client accepts gzip responses.
+
+    Args:
+        accept_encoding (Optional[str]): The `Accept-Encoding` header of the request.
+
+    Returns:
+        bool: Whether `gzip` (or `*`, if gzip is not listed) is accepted with a non-zero quality value.
+    """
+    qualities = {}
+    for item in (accept_encoding or "").split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.lower()] = quality
+    return qualities.get("gzip", qualities.get("x-gzip", qualities.get("*", 0.0))) > 0
+
+
+async def gzip_stream(chunks: AsyncGenerator[bytes, None], level: int = 6) -> AsyncGenerator[bytes, None]:
+    """
+    Compress a stream of bytes with gzip as it is produced.
+
+    Args:
+        chunks (AsyncGenerator[bytes, None]): The stream to compress, closed along with the gzip stream.
+        level (int): The compression level.
+
+    Yields:
+        bytes: The gzip stream, whenever the compressor outputs a block.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async with contextlib.aclosing(chunks):
+        async for chunk in chunks:
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+    yield compressor.flush()
+
+
+class ExportResponse(StreamingResponse):
+    """
+    Streams an export, disconnecting clients that stop reading it.
+
+    The export is closed as soon as the response ends, however it ends, to release its database connection.
+
+    Attributes:
+        send_timeout (float): How long sending a chunk may block on the client, in seconds.
+    """
+
+    def __init__(
+        self, content: AsyncGenerator[bytes, None], send_timeout: float = settings.EXPORT_SEND_TIMEOUT, **kwargs: Any
+    ) -> None:
+        super().__init__(content, **kwargs)
+        self.send_timeout = send_timeout
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        async def send_with_timeout(message: Message) -> None:
+            await asyncio.wait_for(send(message), self.send_timeout)
+
+        try:
+            await super().__call__(scope, receive, send_with_timeout)
+        except* TimeoutError:
+            logger.warning("Export stalled for %s seconds, disconnecting the client", self.send_timeout)
+        finally:
+            await self.body_iterator.aclose()  # type: ignore[attr-defined]
@@ -0,0 +1,60 @@
+"""
+Firebase Authentication, initialized on first use.
+
+Importing `firebase_admin` and loading the service account take a noticeable part of the start-up time, so both are
+deferred until an ID token is first verified, or until the application starts up.
+"""
+
+import threading
+from typing import TYPE_CHECKING, Any, Dict
+
+from app.config import settings
+
+if TYPE_CHECKING:
+    import firebase_admin
+
+_initializing = threading.Lock()  # ID tokens are verified in the threadpool
+
+
+class InvalidIdTokenError(ValueError):
+    """Raised when a Firebase ID token is invalid, expired or revoked."""
+
+    pass
+
+
+def get_firebase_app() -> "firebase_admin.App":
+    """
+    Get the default Firebase app, initializing it with the `FIREBASE_KEY_FILE` service account on first use.
+
+    Returns:
+        firebase_admin.App: The Firebase app.
+    """
+    import firebase_admin
+    from firebase_admin import credentials
+
+    with _initializing:
+        try:
+            return firebase_admin.get_app()
+        except ValueError:  # Not initialized yet
+            return firebase_admin.initialize_app(credentials.Certificate(settings.FIREBASE_KEY_FILE))
+
+
+def verify_id_token(id_token: str) -> Dict[str, Any]:
+    """
+    Verify a Firebase ID token. Blocks on I/O to fetch the public keys of Firebase, run it in the threadpool.
+
+    Args:
+        id_token (str): The ID token.
+
+    Returns:
+        Dict[str, Any]: The claims of the token, including the Firebase `uid`.
+
+    Raises:
+        InvalidIdTokenError: Raised if the token is invalid, expired or revoked.
+    """
+    from firebase_admin import auth
+
+    try:
+        return auth.verify_id_token(id_token, app=get_firebase_app())
+    except (ValueError, auth.InvalidIdTokenError, auth.ExpiredIdTokenError, auth.RevokedIdTokenError) as e:
+        raise InvalidIdTokenError(str(e)) from e
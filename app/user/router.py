@@ -1,12 +1,20 @@
-from fastapi import APIRouter, HTTPException, status
-from firebase_admin import auth
-from firebase_admin.auth import (
-    ExpiredIdTokenError,
-    InvalidIdTokenError,
-    RevokedIdTokenError,
-)
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 
+from app.admission import admit
+from app.ratelimit import rate_limit
 from app.user.auth import ActiveVerifiedUser
+from app.user.export import (
+    EXPORT_MEDIA_TYPE,
+    ExportResponse,
+    accepts_gzip,
+    export_user_data,
+    gzip_stream,
+)
+from app.user.firebase import InvalidIdTokenError, verify_id_token
 from app.user.models import User
 from app.user.schemas import UserCreate, UserRead
 
@@ -25,8 +33,8 @@ router = APIRouter(
 )
 async def create_user(user: UserCreate) -> UserRead:
     try:
-        decoded_token = auth.verify_id_token(user.firebase_id_token)
-    except (ValueError, InvalidIdTokenError, ExpiredIdTokenError, RevokedIdTokenError):
+        decoded_token = await run_in_threadpool(verify_id_token, user.firebase_id_token)
+    except InvalidIdTokenError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired Firebase ID token")
 
     firebase_uid = decoded_token['uid']
@@ -64,3 +72,25 @@ async def get_me(user: ActiveVerifiedUser) -> UserRead:
         name=user.name,
         language=user.language,
     )
+
+
+@router.get(
+    "/me/export",
+    dependencies=[Depends(admit), Depends(rate_limit("export"))],
+    response_class=StreamingResponse,
+    responses={
+        status.HTTP_200_OK: {"content": {EXPORT_MEDIA_TYPE: {}}, "description": "NDJSON export"},
+        status.HTTP_429_TOO_MANY_REQUESTS: {"description": "Rate limit exceeded"},
+        status.HTTP_503_SERVICE_UNAVAILABLE: {"description": "Service overloaded"},
+    },
+)
+async def export_me(user: ActiveVerifiedUser, accept_encoding: Optional[str] = Header(None)) -> ExportResponse:
+    """
+    Export all the data of the current user as NDJSON, compressed with gzip if the client accepts it.
+    """
+    headers = {"Content-Disposition": 'attachment; filename="polyglot-export.ndjson"', "Vary": "Accept-Encoding"}
+    body = export_user_data(user)
+    if accepts_gzip(accept_encoding):
+        headers["Content-Encoding"] = "gzip"
+        body = gzip_stream(body)
+    return ExportResponse(body, media_type=EXPORT_MEDIA_TYPE, headers=headers)
@@ -0,0 +1,178 @@
+import asyncio
+from inspect import isclass
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    TypeVar,
+)
+
+from fastapi import HTTPException, Query, status
+from pydantic import BaseModel
+from pydantic.fields import SHAPE_SINGLETON
+from starlette.types import Scope
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+# Maps a top-level field name to the selected sub-fields of a nested model, or None when the whole field is selected.
+FieldSelection = Dict[str, Optional[Set[str]]]
+
+
+class InvalidFieldsError(ValueError):
+    """Raised when a sparse fieldset references a field that does not exist."""
+
+    pass
+
+
+def parse_fields(fields: str, model: Type[BaseModel]) -> FieldSelection:
+    """
+    Parse a comma-separated sparse fieldset such as `id,tutor.name` against a Pydantic model.
+
+    Dotted names select a sub-field of a nested (non-list) model field.
+
+    Args:
+        fields (str): The comma-separated list of field names.
+        model (Type[BaseModel]): The Pydantic model the fields are selected from.
+
+    Returns:
+        FieldSelection: The parsed field selection.
+
+    Raises:
+        InvalidFieldsError: If a field does not exist on the model or the selection is empty.
+    """
+    selection: FieldSelection = {}
+    for name in (part.strip() for part in fields.split(",")):
+        if not name:
+            continue
+        field_name, _, sub_field_name = name.partition(".")
+        field = model.__fields__.get(field_name)
+        if field is None:
+            raise InvalidFieldsError(f"Unknown field: {name}")
+        if not sub_field_name:
+            selection[field_name] = None
+            continue
+        nested = field.type_
+        if (
+            field.shape != SHAPE_SINGLETON
+            or not (isclass(nested) and issubclass(nested, BaseModel))
+            or sub_field_name not in nested.__fields__
+        ):
+            raise InvalidFieldsError(f"Unknown field: {name}")
+        sub_fields = selection.setdefault(field_name, set())
+        if sub_fields is not None:  # Selecting the whole field takes precedence over sub-fields
+            sub_fields.add(sub_field_name)
+    if not selection:
+        raise InvalidFieldsError("At least one field must be selected")
+    return selection
+
+
+def sparse_fields(model: Type[BaseModel]) -> Callable[..., Optional[FieldSelection]]:
+    """
+    Build a FastAPI dependency that parses the `fields` query parameter against the given model.
+
+    Args:
+        model (Type[BaseModel]): The Pydantic model returned by the endpoint.
+
+    Returns:
+        Callable: A dependency returning the parsed FieldSelection, or None when `fields` is not provided.
+    """
+
+    def dependency(
+        fields: Optional[str] = Query(
+            None,
+            description=f"Comma-separated list of {model.__name__} fields to return, e.g. `id,tutor.name`.",
+        )
+    ) -> Optional[FieldSelection]:
+        if fields is None:
+            return None
+        try:
+            return parse_fields(fields, model)
+        except InvalidFieldsError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    return dependency
+
+
+T = TypeVar("T")
+
+
+class SingleFlightConflictError(Exception):
+    """Raised when a call joins an in-flight call with the same key but different arguments."""
+
+    pass
+
+
+class SingleFlight(Generic[T]):
+    """
+    Coalesce concurrent calls sharing a key so that only one of them runs.
+
+    The call runs in its own task: every caller awaits the same result, and cancelling one caller (e.g. on client
+    disconnect) does not cancel the call for the others.
+    """
+
+    def __init__(self) -> None:
+        self._tasks: Dict[Hashable, Tuple[asyncio.Task[T], Hashable]] = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._tasks
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]], tag: Hashable = None) -> T:
+        """
+        Run `fn` unless a call with the same key is already in flight, and return its result.
+
+        Args:
+            key (Hashable): The key identifying duplicate calls.
+            fn (Callable[[], Awaitable[T]]): The call to run.
+            tag (Hashable): Identifies the arguments of the call, which calls joining it must share.
+
+        Returns:
+            T: The result of the (possibly shared) call.
+
+        Raises:
+            SingleFlightConflictError: Raised if the call in flight with the same key has a different tag.
+        """
+        entry = self._tasks.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(fn())
+            self._tasks[key] = (task, tag)
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        else:
+            task, in_flight_tag = entry
+            if in_flight_tag != tag:
+                raise SingleFlightConflictError(f"A call with key {key!r} and different arguments is in flight.")
+        return await asyncio.shield(task)
+
+
+_route_templates: Dict[Any, str] = {}
+
+
+def route_template(scope: Scope) -> str:
+    """
+    Get the path template of the route that handled a request, e.g. `/chat/{chat_session_id}`.
+
+    Templates, unlike paths, have a bounded number of values, so they can label metrics and name spans.
+
+    Args:
+        scope (Scope): The ASGI scope of the request, once routed.
+
+    Returns:
+        str: The path template, or `UNMATCHED_ROUTE` if no route matched.
+    """
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return UNMATCHED_ROUTE
+    template = _route_templates.get(endpoint)
+    if template is None:
+        template = next(
+            (route.path for route in scope["app"].routes if getattr(route, "endpoint", None) is endpoint),
+            UNMATCHED_ROUTE,
+        )
+        _route_templates[endpoint] = template
+    return template
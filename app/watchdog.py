@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Deque, NamedTuple, Optional
+
+from app.config import settings
+from app.metrics import Counter, Histogram, registry
+
+logger = logging.getLogger(__name__)
+
+# Number of blocking episodes kept for inspection
+MAX_BLOCKS_KEPT = 100
+
+event_loop_lag_samples = registry.register(
+    Histogram(
+        "event_loop_lag_sample_seconds",
+        "Event-loop scheduling lag, sampled continuously.",
+        buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+    )
+)
+event_loop_blocks = registry.register(Counter("event_loop_blocks_total", "Episodes of the event loop being blocked."))
+
+
+class LoopLagMonitor:
+    """
+    Measures the event-loop scheduling lag of this process.
+
+    A sampling task sleeps for `interval` seconds and measures how late it wakes up. A loop busy running callbacks,
+    or blocked by a synchronous call, wakes it up late.
+
+    Attributes:
+        interval (float): The time between samples, in seconds.
+        lag (float): The lag of the last sample, in seconds.
+    """
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self.lag = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start sampling in the running event loop, unless already started."""
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._loop is not loop:  # The sampler is bound to the loop that started it
+            self._loop = loop
+            self._task = loop.create_task(self._run(loop))
+
+    async def _run(self, loop: asyncio.AbstractEventLoop) -> None:
+        while True:
+            scheduled_at = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lag = max(loop.time() - scheduled_at, 0.0)
+            event_loop_lag_samples.observe(self.lag)
+
+
+class BlockedLoop(NamedTuple):
+    """An episode of the event loop being blocked, with the stack that was running."""
+
+    duration: float
+    stack: str
+
+
+class LoopWatchdog:
+    """
+    Detects calls blocking the event loop and captures their stack.
+
+    A thread pings the event loop every `interval` seconds. When the loop takes longer than `threshold` seconds to
+    answer, the stack of the event-loop thread is captured while it is still blocked, logged, and kept in `blocks`.
+
+    Attributes:
+        threshold (float): How long the loop may be unresponsive before it is considered blocked, in seconds.
+        interval (float): The time between pings, in seconds.
+        blocks (Deque[BlockedLoop]): The most recent blocking episodes.
+        blocked_count (int): The number of blocking episodes since the watchdog started.
+    """
+
+    def __init__(self, threshold: float, interval: float) -> None:
+        self.threshold = threshold
+        self.interval = interval
+        self.blocks: Deque[BlockedLoop] = deque(maxlen=MAX_BLOCKS_KEPT)
+        self.blocked_count = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread_id: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Watch the running event loop, unless already watching it."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:  # The watchdog thread follows the loop of the last call
+            self._loop = loop
+            self._thread_id = threading.get_ident()
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="loop-watchdog", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            loop, thread_id = self._loop, self._thread_id
+            if loop is None or thread_id is None or not loop.is_running():
+                continue
+            pong = threading.Event()
+            pinged_at = time.monotonic()
+            try:
+                loop.call_soon_threadsafe(pong.set)
+            except RuntimeError:  # The loop was closed
+                continue
+            if pong.wait(self.threshold) or not loop.is_running():
+                continue
+            frame = sys._current_frames().get(thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+            while not pong.wait(self.interval) and loop.is_running():
+                pass
+            self._record(BlockedLoop(time.monotonic() - pinged_at, stack))
+
+    def _record(self, block: BlockedLoop) -> None:
+        self.blocks.append(block)
+        self.blocked_count += 1
+        event_loop_blocks.inc()
+        logger.warning("Event loop blocked for %.3fs in:\n%s", block.duration, block.stack)
+
+
+loop_watchdog = LoopWatchdog(threshold=settings.LOOP_BLOCK_THRESHOLD, interval=settings.LOOP_LAG_INTERVAL)
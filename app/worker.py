@@ -0,0 +1,41 @@
+"""
+Background job worker.
+
+Run with `python -m app.worker [JOB_TYPE ...]`; without job types, all registered job types are run.
+"""
+
+import argparse
+import asyncio
+import signal
+
+import app.chat.jobs  # noqa: F401 Register job handlers
+from app.chat.usage import usage_meter
+from app.chat.utils import close_llm_connections
+from app.database import dispose_engine
+from app.jobs.worker import Worker, job_types
+from app.log import configure_logging
+from app.watchdog import loop_watchdog
+
+
+async def run(worker: Worker) -> None:
+    loop = asyncio.get_running_loop()
+    loop_watchdog.start()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+    await worker.run()
+    await usage_meter.flush()
+    await close_llm_connections()
+    await dispose_engine()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run background jobs.")
+    parser.add_argument("job_types", nargs="*", choices=sorted(job_types), help="The job types to run.")
+    args = parser.parse_args()
+    configure_logging()
+    worker = Worker(job_types[name] for name in args.job_types or job_types)
+    asyncio.run(run(worker))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmark the cold-storage archive format of chat sessions.
+
+Reports the storage saved by archiving message histories of various lengths, and the CPU cost of archiving and
+rehydrating them (excluding the database round trips).
+
+Usage:
+    python -m benchmarks.archive [--level LEVEL] [--repeat REPEAT]
+"""
+
+import argparse
+import random
+import timeit
+import uuid
+from typing import List
+
+import orjson
+
+from app.chat.archive import pack_message_history, unpack_message_history
+from app.chat.schemas import OpenAIMessage, OpenAIMessageRole
+
+HISTORY_LENGTHS = [10, 50, 100, 500]
+WORDS = (
+    "bonjour merci comment allez vous je suis très bien et toi aujourd'hui nous allons parler de la cuisine "
+    "française hello thank you how are doing today we will talk about cooking travel weekend favourite book"
+).split()
+
+
+def make_message_history(length: int, rng: random.Random) -> List[OpenAIMessage]:
+    """Make a synthetic message history alternating between the tutor and the student."""
+    message_history = []
+    for index in range(length):
+        role = OpenAIMessageRole.ASSISTANT if index % 2 == 0 else OpenAIMessageRole.USER
+        content = " ".join(rng.choices(WORDS, k=rng.randint(5, 60)))
+        message_history.append(
+            OpenAIMessage(
+                role=role,
+                content=content,
+                name="Jean" if role == OpenAIMessageRole.USER else None,
+                timestamp_ms=1_700_000_000_000 + index * 30_000,
+                uuid=str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            )
+        )
+    return message_history
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--level", type=int, default=3, help="The zstd compression level.")
+    parser.add_argument("--repeat", type=int, default=200, help="The number of timed runs per history length.")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    print(f"{'messages':>8} {'raw':>10} {'archived':>10} {'ratio':>6} {'archive':>12} {'rehydrate':>12}")
+    for length in HISTORY_LENGTHS:
+        message_history = make_message_history(length, rng)
+        raw_size = len(orjson.dumps([message.dict() for message in message_history]))
+        data = pack_message_history(message_history, args.level)
+        pack_time = min(
+            timeit.repeat(lambda: pack_message_history(message_history, args.level), number=1, repeat=args.repeat)
+        )
+        unpack_time = min(timeit.repeat(lambda: unpack_message_history(data), number=1, repeat=args.repeat))
+        print(
+            f"{length:>8} {raw_size:>10} {len(data):>10} {raw_size / len(data):>6.1f}"
+            f" {pack_time * 1e6:>10.0f}us {unpack_time * 1e6:>10.0f}us"
+        )
+
+
+if __name__ == "__main__":
+    main()
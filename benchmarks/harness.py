@@ -0,0 +1,129 @@
+"""
+A minimal micro-benchmark harness with JSON baselines.
+
+Benchmarks are timed with `timeit`: the number of calls per timed run is calibrated to last at least 0.2s, and the
+best run of `repeat` is kept, as it is the least disturbed by other processes. Results can be saved as a baseline, and
+later runs compared to it to flag regressions. Baselines are only comparable on the same machine and Python version.
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import timeit
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+
+class Benchmark(NamedTuple):
+    """A function to time, under a name such as `process_result_value[messages=100]`."""
+
+    name: str
+    function: Callable[[], object]
+
+
+class Result(NamedTuple):
+    """The time per call of a benchmark, in seconds."""
+
+    name: str
+    best: float
+    median: float
+
+
+def run_benchmark(benchmark: Benchmark, repeat: int) -> Result:
+    """
+    Time a benchmark.
+
+    Args:
+        benchmark (Benchmark): The benchmark.
+        repeat (int): The number of timed runs.
+
+    Returns:
+        Result: The best and median time per call.
+    """
+    timer = timeit.Timer(benchmark.function)
+    number, _ = timer.autorange()
+    timings = [timing / number for timing in timer.repeat(repeat=repeat, number=number)]
+    return Result(benchmark.name, min(timings), statistics.median(timings))
+
+
+def save_baseline(results: List[Result], path: str) -> None:
+    """Save results as a JSON baseline."""
+    baseline = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": {result.name: {"best": result.best, "median": result.median} for result in results},
+    }
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2)
+        f.write("\n")
+
+
+def load_baseline(path: str) -> Dict[str, float]:
+    """Load the best time per call of each benchmark of a JSON baseline."""
+    with open(path) as f:
+        baseline = json.load(f)
+    return {name: result["best"] for name, result in baseline["results"].items()}
+
+
+def compare(results: List[Result], baseline: Dict[str, float], tolerance: float) -> List[str]:
+    """
+    Compare results to a baseline.
+
+    Args:
+        results (List[Result]): The results.
+        baseline (Dict[str, float]): The best time per call of each benchmark of the baseline.
+        tolerance (float): The relative slowdown above which a benchmark regressed, e.g. 0.1 for 10%.
+
+    Returns:
+        List[str]: The names of the benchmarks that regressed.
+    """
+    return [
+        result.name
+        for result in results
+        if result.name in baseline and result.best > baseline[result.name] * (1 + tolerance)
+    ]
+
+
+def _format_time(seconds: float) -> str:
+    return f"{seconds * 1e6:>10.2f}us"
+
+
+def main(benchmarks: List[Benchmark], description: Optional[str] = None) -> None:
+    """
+    Run benchmarks from the command line, optionally saving a baseline or comparing to one.
+
+    Exits with status 1 if a benchmark regressed compared to the baseline.
+
+    Args:
+        benchmarks (List[Benchmark]): The benchmarks.
+        description (Optional[str]): The help text of the command.
+    """
+    parser = argparse.ArgumentParser(description=description, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="The number of timed runs per benchmark.")
+    parser.add_argument("--filter", default="", help="Only run the benchmarks whose name contains this string.")
+    parser.add_argument("--save", metavar="PATH", help="Save the results as a JSON baseline.")
+    parser.add_argument("--compare", metavar="PATH", help="Compare the results to a JSON baseline.")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.1, help="The relative slowdown flagged as a regression (default: 0.1)."
+    )
+    args = parser.parse_args()
+
+    baseline = load_baseline(args.compare) if args.compare else {}
+    results = []
+    for benchmark in benchmarks:
+        if args.filter not in benchmark.name:
+            continue
+        result = run_benchmark(benchmark, args.repeat)
+        results.append(result)
+        line = f"{result.name:<60} {_format_time(result.best)} {_format_time(result.median)}"
+        if result.name in baseline:
+            line += f" {(result.best / baseline[result.name] - 1) * 100:>+7.1f}%"
+        print(line, flush=True)
+
+    if args.save:
+        save_baseline(results, args.save)
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}:", *regressions, sep="\n  ")
+        sys.exit(1)
@@ -0,0 +1,106 @@
+"""
+Benchmark the serialization and prompt building hot paths of the chat endpoints.
+
+Covers the conversion of message histories to and from their JSONB column, the building and encoding of the
+`/chats` response, the system prompt, and the messages sent to the OpenAI API, for message histories of various
+lengths. Runs offline: no database, network or Firebase is used.
+
+Usage:
+    python -m benchmarks.hot_paths [--filter NAME] [--save PATH] [--compare PATH] [--tolerance TOLERANCE]
+
+Save a baseline before a change, and compare to it after:
+    python -m benchmarks.hot_paths --save /tmp/before.json
+    python -m benchmarks.hot_paths --compare /tmp/before.json
+"""
+
+import random
+import uuid
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+
+from app.chat.models import ChatSession
+from app.chat.schemas import ChatSessionRead, MessageRead, OpenAIMessage
+from app.chat.utils import to_message_dicts
+from app.database import ListPydanticType
+from app.tutor.models import SYSTEM_TEMPLATE_STRING, ModelName, Tutor
+from benchmarks.archive import HISTORY_LENGTHS, make_message_history
+from benchmarks.harness import Benchmark, main
+
+# Number of chat sessions of a user listed by `/chats`
+CHAT_SESSIONS_LISTED = 20
+
+
+def make_tutor() -> Tutor:
+    return Tutor(
+        id=uuid.UUID(int=1),
+        name="Amélie",
+        avatar_url="https://example.com/amelie.png",
+        visible=True,
+        language="french",
+        system_prompt=SYSTEM_TEMPLATE_STRING,
+        personality_prompt="You are cheerful and love to talk about cooking and travel.",
+        model=ModelName.GPT3_5_TURBO,
+    )
+
+
+def make_chat_sessions(count: int, length: int, rng: random.Random) -> List[ChatSession]:
+    """Make transient chat sessions of a user with the same tutor, as loaded for `/chats`."""
+    tutor = make_tutor()
+    return [
+        ChatSession(
+            id=uuid.UUID(int=rng.getrandbits(128), version=4),
+            user_id=uuid.UUID(int=2),
+            tutor_id=tutor.id,
+            tutor=tutor,
+            message_history=make_message_history(length, rng),
+        )
+        for _ in range(count)
+    ]
+
+
+def make_benchmarks() -> List[Benchmark]:
+    rng = random.Random(0)
+    column_type = ListPydanticType(OpenAIMessage)
+    tutor = make_tutor()
+    benchmarks = [Benchmark("Tutor.get_system_prompt", lambda: tutor.get_system_prompt(student_name="Jean"))]
+    for length in HISTORY_LENGTHS:
+        message_history = make_message_history(length, rng)
+        stored_history = column_type.process_bind_param(message_history, None)
+        chat_sessions = make_chat_sessions(CHAT_SESSIONS_LISTED, length, rng)
+        chat_session_reads = [ChatSessionRead.from_chat_session(chat_session) for chat_session in chat_sessions]
+        benchmarks += [
+            Benchmark(
+                f"process_bind_param[messages={length}]",
+                lambda message_history=message_history: column_type.process_bind_param(message_history, None),
+            ),
+            Benchmark(
+                f"process_result_value[messages={length}]",
+                lambda stored_history=stored_history: column_type.process_result_value(stored_history, None),
+            ),
+            Benchmark(
+                f"MessageRead.from_openai_message[messages={length}]",
+                lambda message_history=message_history: [
+                    MessageRead.from_openai_message(message) for message in message_history
+                ],
+            ),
+            Benchmark(
+                f"to_message_dicts[messages={length}]",
+                lambda message_history=message_history: to_message_dicts(message_history),
+            ),
+            Benchmark(
+                f"ChatSessionRead.from_chat_session[sessions={CHAT_SESSIONS_LISTED},messages={length}]",
+                lambda chat_sessions=chat_sessions: [
+                    ChatSessionRead.from_chat_session(chat_session) for chat_session in chat_sessions
+                ],
+            ),
+            Benchmark(
+                f"jsonable_encoder[sessions={CHAT_SESSIONS_LISTED},messages={length}]",
+                lambda chat_session_reads=chat_session_reads: jsonable_encoder(chat_session_reads),
+            ),
+        ]
+    return benchmarks
+
+
+if __name__ == "__main__":
+    main(make_benchmarks(), __doc__)
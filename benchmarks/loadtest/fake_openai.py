@@ -0,0 +1,169 @@
+"""
+A fake OpenAI Chat Completion API for load tests.
+
+Answers `POST /v1/chat/completions` with filler text after a simulated latency: a time to first token drawn from a
+log-normal distribution, then a fixed generation speed per token. Supports streamed responses and injected errors,
+and reports token usage like the real API, so that quotas and usage metering are exercised.
+
+Usage:
+    python -m benchmarks.loadtest.fake_openai [--port PORT] [--latency-median SECONDS] [--latency-sigma SIGMA]
+        [--tokens-per-second TOKENS] [--error-rate RATE] [--error-status STATUS]
+
+Point the API at it with `OPENAI_API_BASE=http://localhost:8001/v1`.
+"""
+
+import argparse
+import asyncio
+import math
+import random
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, List, NamedTuple
+
+import orjson
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+WORDS = (
+    "bonjour merci comment allez vous je suis très bien et toi aujourd'hui nous allons parler de la cuisine "
+    "française hello thank you how are doing today we will talk about cooking travel weekend favourite book"
+).split()
+# Completion length when the request sets no max_tokens, in tokens
+MIN_TOKENS, MAX_TOKENS = 20, 150
+
+
+class FakeCompletionConfig(NamedTuple):
+    """
+    The simulated behaviour of the completion API.
+
+    Attributes:
+        latency_median (float): The median time to first token, in seconds.
+        latency_sigma (float): The shape of the log-normal time to first token; 0 makes it constant.
+        tokens_per_second (float): The generation speed after the first token.
+        error_rate (float): The fraction of requests answered with an error.
+        error_status (int): The HTTP status of errors, e.g. 429 for rate limits or 500 for server errors.
+    """
+
+    latency_median: float = 1.0
+    latency_sigma: float = 0.5
+    tokens_per_second: float = 50.0
+    error_rate: float = 0.0
+    error_status: int = 500
+
+
+def _count_tokens(messages: List[Dict[str, Any]]) -> int:
+    # About 4 characters per token in English, close enough for usage accounting
+    return sum(len(message.get("content") or "") // 4 + 4 for message in messages)
+
+
+def _chunk(completion_id: str, created: int, model: str, delta: Dict[str, str], finish_reason=None) -> bytes:
+    chunk = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": created,
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return b"data: " + orjson.dumps(chunk) + b"\n\n"
+
+
+def create_app(config: FakeCompletionConfig, rng: random.Random) -> Starlette:
+    """
+    Create the fake completion API.
+
+    Args:
+        config (FakeCompletionConfig): The simulated behaviour.
+        rng (random.Random): The source of latencies, lengths and errors.
+
+    Returns:
+        Starlette: The ASGI app.
+    """
+
+    async def chat_completions(request: Request) -> Response:
+        body = await request.json()
+        time_to_first_token = (
+            rng.lognormvariate(math.log(config.latency_median), config.latency_sigma) if config.latency_median else 0
+        )
+        if rng.random() < config.error_rate:
+            await asyncio.sleep(time_to_first_token)
+            return JSONResponse(
+                {"error": {"message": "Injected error", "type": "server_error", "param": None, "code": None}},
+                status_code=config.error_status,
+            )
+
+        tokens = [rng.choice(WORDS) for _ in range(body.get("max_tokens") or rng.randint(MIN_TOKENS, MAX_TOKENS))]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        model = body["model"]
+        token_delay = 1 / config.tokens_per_second
+
+        if body.get("stream"):
+
+            async def stream() -> AsyncIterator[bytes]:
+                await asyncio.sleep(time_to_first_token)
+                yield _chunk(completion_id, created, model, {"role": "assistant"})
+                for index, token in enumerate(tokens):
+                    if index:
+                        await asyncio.sleep(token_delay)
+                    yield _chunk(completion_id, created, model, {"content": token + " "})
+                yield _chunk(completion_id, created, model, {}, finish_reason="stop")
+                yield b"data: [DONE]\n\n"
+
+            return StreamingResponse(stream(), media_type="text/event-stream")
+
+        await asyncio.sleep(time_to_first_token + token_delay * (len(tokens) - 1))
+        prompt_tokens = _count_tokens(body["messages"])
+        return Response(
+            orjson.dumps(
+                {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": model,
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": " ".join(tokens)},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": len(tokens),
+                        "total_tokens": prompt_tokens + len(tokens),
+                    },
+                }
+            ),
+            media_type="application/json",
+        )
+
+    return Starlette(routes=[Route("/v1/chat/completions", chat_completions, methods=["POST"])])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-median", type=float, default=1.0, help="Median time to first token, in seconds.")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Log-normal shape of the time to first token.")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="Generation speed.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with an error.")
+    parser.add_argument("--error-status", type=int, default=500, help="HTTP status of the injected errors.")
+    parser.add_argument("--seed", type=int, default=None, help="Seed, to replay the same latencies.")
+    args = parser.parse_args()
+
+    config = FakeCompletionConfig(
+        latency_median=args.latency_median,
+        latency_sigma=args.latency_sigma,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+    )
+    uvicorn.run(create_app(config, random.Random(args.seed)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""
+Load test a running API by replaying user journeys.
+
+Each virtual user repeatedly signs up as a new user, lists the tutors, starts a chat session with one of them,
+exchanges a few messages and lists its chat sessions, pausing between requests like a person would. Users are ramped
+up over time. The report gives the throughput, the latency percentiles and errors per route, and the saturation of
+the database pool, scraped from the `/metrics` endpoint of the API during the run.
+
+Run the API against the fake completion server and the Firebase Auth emulator settings, with rate limits raised to
+let the virtual users through, e.g.:
+    python -m benchmarks.loadtest.fake_openai --port 8001 &
+    OPENAI_API_BASE=http://localhost:8001/v1 FIREBASE_AUTH_EMULATOR_HOST=localhost:9099 \
+        RATE_LIMITS='{"chat_turn": "1000/minute", "chat_read": "1000/minute"}' uvicorn app.main:app --port 8080 &
+    python -m benchmarks.loadtest.run --url http://localhost:8080 --project-id polyglot-dev --users 50
+
+The database must hold visible tutors, e.g. from `make seed_db`.
+
+Usage:
+    python -m benchmarks.loadtest.run --project-id PROJECT_ID [--url URL] [--users USERS] [--duration SECONDS]
+        [--ramp-up SECONDS] [--turns TURNS] [--think-time SECONDS]
+"""
+
+import argparse
+import asyncio
+import math
+import random
+import re
+import time
+import uuid
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.loadtest.tokens import issue_id_token
+
+PERCENTILES = (50, 95, 99)
+METRIC_LINE = re.compile(r'^(?P<name>[a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(?P<labels>[^}]*)\})? (?P<value>\S+)$')
+LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+class JourneyError(Exception):
+    """Raised when a request of a journey fails, which ends the journey."""
+
+    pass
+
+
+class Stats:
+    """
+    The requests made during a load test.
+
+    Attributes:
+        latencies (Dict[str, List[float]]): The latencies of successful requests per route, in seconds.
+        statuses (Dict[str, Counter[str]]): The number of responses per route and status, or error type.
+        pool_samples (List[Tuple[float, float]]): The checked out and idle connections of the database pool.
+    """
+
+    def __init__(self) -> None:
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter[str]] = defaultdict(Counter)
+        self.pool_samples: List[Tuple[float, float]] = []
+
+    def record(self, route: str, status: str, seconds: Optional[float] = None) -> None:
+        self.statuses[route][status] += 1
+        if seconds is not None:
+            self.latencies[route].append(seconds)
+
+
+async def request(
+    client: httpx.AsyncClient, stats: Stats, method: str, route: str, url: str, **kwargs: Any
+) -> httpx.Response:
+    """
+    Make a request of a journey and record it under its route template.
+
+    Raises:
+        JourneyError: Raised if the request fails or gets an error response.
+    """
+    started_at = time.perf_counter()
+    try:
+        response = await client.request(method, url, **kwargs)
+    except httpx.HTTPError as e:
+        stats.record(f"{method} {route}", type(e).__name__)
+        raise JourneyError(f"{method} {url}: {e!r}")
+    if response.is_success:
+        stats.record(f"{method} {route}", str(response.status_code), time.perf_counter() - started_at)
+        return response
+    stats.record(f"{method} {route}", str(response.status_code))
+    raise JourneyError(f"{method} {url}: {response.status_code} {response.text[:200]}")
+
+
+async def journey(client: httpx.AsyncClient, stats: Stats, args: argparse.Namespace, rng: random.Random) -> None:
+    """Sign up as a new user, list the tutors, chat with one of them and list the chat sessions."""
+
+    async def think() -> None:
+        await asyncio.sleep(rng.expovariate(1 / args.think_time) if args.think_time else 0)
+
+    uid = uuid.uuid4().hex
+    email = f"loadtest+{uid}@example.com"
+    id_token = issue_id_token(args.project_id, uid, email)
+    await request(
+        client,
+        stats,
+        "POST",
+        "/users",
+        "/users",
+        json={"email": email, "firebase_id_token": id_token, "name": "Load Test", "language": "en"},
+    )
+    headers = {"Authorization": f"Bearer {id_token}"}
+    await think()
+
+    tutors = (await request(client, stats, "GET", "/tutors", "/tutors", headers=headers)).json()
+    if not tutors:
+        raise JourneyError("No visible tutors, seed the database first")
+    await think()
+
+    chat_session = (
+        await request(
+            client, stats, "GET", "/chat", "/chat", params={"tutor_id": rng.choice(tutors)["id"]}, headers=headers
+        )
+    ).json()
+    for _ in range(args.turns):
+        await think()
+        await request(
+            client,
+            stats,
+            "POST",
+            "/chat/{chat_id}",
+            f"/chat/{chat_session['id']}",
+            json={"content": "Bonjour, comment ça va aujourd'hui ?", "uuid": str(uuid.uuid4())},
+            headers=headers,
+        )
+    await think()
+
+    await request(client, stats, "GET", "/chats", "/chats", headers=headers)
+
+
+async def virtual_user(
+    client: httpx.AsyncClient, stats: Stats, args: argparse.Namespace, start_delay: float, deadline: float
+) -> None:
+    rng = random.Random()
+    await asyncio.sleep(start_delay)
+    while time.monotonic() < deadline:
+        try:
+            await journey(client, stats, args, rng)
+        except JourneyError as e:
+            print(f"Journey failed: {e}", flush=True)
+
+
+def parse_metrics(text: str) -> Dict[str, List[Tuple[Dict[str, str], float]]]:
+    """Parse the Prometheus text format into the labelled values of each sample name."""
+    samples: Dict[str, List[Tuple[Dict[str, str], float]]] = defaultdict(list)
+    for line in text.splitlines():
+        match = METRIC_LINE.match(line)
+        if match is None:
+            continue
+        labels = dict(LABEL.findall(match["labels"] or ""))
+        samples[match["name"]].append((labels, float(match["value"])))
+    return samples
+
+
+def checkout_histogram(samples: Dict[str, List[Tuple[Dict[str, str], float]]]) -> List[Tuple[float, float]]:
+    """Get the cumulative buckets of the pool checkout duration histogram, as (upper bound, count) pairs."""
+    return sorted((float(labels["le"]), value) for labels, value in samples["db_pool_checkout_duration_seconds_bucket"])
+
+
+async def sample_pool(client: httpx.AsyncClient, stats: Stats, deadline: float) -> None:
+    """Sample the connections of the database pool every second until the deadline."""
+    while time.monotonic() < deadline:
+        try:
+            samples = parse_metrics((await client.get("/metrics")).text)
+        except httpx.HTTPError:
+            pass
+        else:
+            pool = {labels["state"]: value for labels, value in samples["db_pool_connections"]}
+            stats.pool_samples.append((pool.get("checked_out", 0.0), pool.get("idle", 0.0)))
+        await asyncio.sleep(1)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Get a percentile of sorted values, by the nearest-rank method."""
+    return values[max(math.ceil(len(values) * q / 100) - 1, 0)]
+
+
+def histogram_percentile(buckets: List[Tuple[float, float]], q: float) -> float:
+    """Get the upper bound of the bucket holding a percentile of cumulative histogram buckets."""
+    total = buckets[-1][1] if buckets else 0
+    for bound, count in buckets:
+        if total and count >= total * q / 100:
+            return bound
+    return 0.0
+
+
+def report(
+    stats: Stats,
+    elapsed: float,
+    checkout_before: List[Tuple[float, float]],
+    checkout_after: List[Tuple[float, float]],
+) -> None:
+    print(f"\n{'route':<24} {'ok':>7} {'errors':>7} {'req/s':>8}" + "".join(f" {f'p{q}':>9}" for q in PERCENTILES))
+    for route in sorted(stats.statuses):
+        latencies = sorted(stats.latencies[route])
+        errors = sum(stats.statuses[route].values()) - len(latencies)
+        line = f"{route:<24} {len(latencies):>7} {errors:>7} {len(latencies) / elapsed:>8.1f}"
+        line += "".join(
+            f" {percentile(latencies, q) * 1e3:>7.0f}ms" if latencies else f" {'-':>9}" for q in PERCENTILES
+        )
+        print(line)
+    total = sum(len(latencies) for latencies in stats.latencies.values())
+    print(f"\n{total} successful requests in {elapsed:.0f}s: {total / elapsed:.1f} req/s")
+    for route, statuses in sorted(stats.statuses.items()):
+        failures = {status: count for status, count in statuses.items() if not status.startswith("2")}
+        if failures:
+            print(f"  {route} errors: {failures}")
+
+    if stats.pool_samples:
+        checked_out = [checked_out for checked_out, _ in stats.pool_samples]
+        saturation = [
+            checked_out / (checked_out + idle) if checked_out + idle else 0 for checked_out, idle in stats.pool_samples
+        ]
+        print(
+            f"\nDB pool: {sum(checked_out) / len(checked_out):.1f} connections checked out on average, "
+            f"{max(checked_out):.0f} at most; {sum(saturation) / len(saturation):.0%} of open connections in use"
+        )
+    if checkout_after:
+        before = dict(checkout_before)
+        buckets = [(bound, count - before.get(bound, 0)) for bound, count in checkout_after]
+        print(
+            "DB pool checkout wait: "
+            + ", ".join(f"p{q} <= {histogram_percentile(buckets, q) * 1e3:.0f}ms" for q in PERCENTILES)
+        )
+
+
+async def run(args: argparse.Namespace) -> None:
+    limits = httpx.Limits(max_connections=args.users + 1, max_keepalive_connections=args.users + 1)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        try:
+            checkout_before = checkout_histogram(parse_metrics((await client.get("/metrics")).text))
+        except httpx.HTTPError as e:
+            raise SystemExit(f"API unreachable at {args.url}: {e!r}")
+        started_at = time.monotonic()
+        deadline = started_at + args.duration
+        stats = Stats()
+        await asyncio.gather(
+            sample_pool(client, stats, deadline),
+            *(
+                virtual_user(client, stats, args, args.ramp_up * index / args.users, deadline)
+                for index in range(args.users)
+            ),
+        )
+        elapsed = time.monotonic() - started_at
+        checkout_after = checkout_histogram(parse_metrics((await client.get("/metrics")).text))
+    report(stats, elapsed, checkout_before, checkout_after)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8080", help="The base URL of the API.")
+    parser.add_argument("--project-id", required=True, help="The Firebase project ID of the API.")
+    parser.add_argument("--users", type=int, default=10, help="The number of concurrent virtual users.")
+    parser.add_argument("--duration", type=float, default=60, help="How long to run for, in seconds.")
+    parser.add_argument("--ramp-up", type=float, default=10, help="The time to start all the users, in seconds.")
+    parser.add_argument("--turns", type=int, default=5, help="The messages sent per chat session.")
+    parser.add_argument("--think-time", type=float, default=1, help="The mean pause between requests, in seconds.")
+    parser.add_argument("--timeout", type=float, default=120, help="The timeout of a request, in seconds.")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark the overhead of the Prometheus metrics.
+
+Reports the cost of updating each kind of metric, of the metrics middleware per HTTP request (against the same ASGI
+app without it), and of rendering the `/metrics` endpoint.
+
+Usage:
+    python -m benchmarks.metrics [--number NUMBER] [--repeat REPEAT]
+"""
+
+import argparse
+import asyncio
+import timeit
+
+from app.metrics import Counter, Histogram, MetricsMiddleware, Registry, registry
+
+
+async def endpoint():
+    pass
+
+
+class App:
+    """A minimal ASGI app routing every request to the same endpoint."""
+
+    routes = [type("Route", (), {"path": "/chat/{chat_session_id}", "endpoint": endpoint})()]
+
+    async def __call__(self, scope, receive, send):
+        scope["endpoint"] = endpoint
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+
+async def receive():
+    return {"type": "http.request", "body": b""}
+
+
+async def send(message):
+    pass
+
+
+def time_requests(app, number: int, repeat: int) -> float:
+    """Get the best time per request through an ASGI app, in seconds."""
+    scope = {"type": "http", "method": "GET", "path": "/chat/1", "app": App}
+
+    async def run():
+        for _ in range(number):
+            await app(dict(scope), receive, send)
+
+    loop = asyncio.new_event_loop()
+    try:
+        return min(timeit.repeat(lambda: loop.run_until_complete(run()), number=1, repeat=repeat)) / number
+    finally:
+        loop.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=10_000, help="The number of operations per timed run.")
+    parser.add_argument("--repeat", type=int, default=5, help="The number of timed runs.")
+    args = parser.parse_args()
+
+    benchmark_registry = Registry()
+    counter = benchmark_registry.register(Counter("benchmark_total", "Benchmark.", ["route"]))
+    histogram = benchmark_registry.register(Histogram("benchmark_seconds", "Benchmark.", ["route"]))
+    timings = {
+        "counter.inc": min(timeit.repeat(lambda: counter.inc("/chat"), number=args.number, repeat=args.repeat)),
+        "histogram.observe": min(
+            timeit.repeat(lambda: histogram.observe(0.042, "/chat"), number=args.number, repeat=args.repeat)
+        ),
+    }
+    for name, seconds in timings.items():
+        print(f"{name:>20} {seconds / args.number * 1e6:>8.2f}us")
+
+    bare = time_requests(App(), args.number, args.repeat)
+    instrumented = time_requests(MetricsMiddleware(App()), args.number, args.repeat)
+    print(f"{'middleware':>20} {(instrumented - bare) * 1e6:>8.2f}us per request")
+
+    render_time = min(
+        timeit.repeat(lambda: registry.render(registry.read_snapshots(None)), number=100, repeat=args.repeat)
+    )
+    print(f"{'render':>20} {render_time / 100 * 1e6:>8.2f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark the start-up time of the API.
+
+Times the import of `app.main`, which creates the application, in fresh interpreters, and lists the packages slowest
+to import, from `python -X importtime`. Exits with status 1 if the start-up time exceeds the budget, to keep cold starts in
+check as the application grows. Resources created in the lifespan (Firebase, pre-warmed connections) are excluded.
+
+Usage:
+    python -m benchmarks.startup [--module MODULE] [--repeat REPEAT] [--budget SECONDS] [--top TOP]
+"""
+
+import argparse
+import subprocess
+import sys
+from typing import List, Tuple
+
+TIMING_SCRIPT = (
+    "import time; started_at = time.perf_counter(); import {module}; print(time.perf_counter() - started_at)"
+)
+
+
+def time_import(module: str) -> float:
+    """Time the import of a module in a fresh interpreter, in seconds."""
+    output = subprocess.run(
+        [sys.executable, "-c", TIMING_SCRIPT.format(module=module)], capture_output=True, text=True, check=True
+    ).stdout
+    return float(output.splitlines()[-1])
+
+
+def slowest_packages(module: str, top: int) -> List[Tuple[int, str]]:
+    """
+    Get the packages slowest to import with a module, in a fresh interpreter.
+
+    Returns:
+        List[Tuple[int, str]]: The cumulative import time in microseconds and name of the packages. Times overlap
+            when packages import each other; the first package to import a shared dependency pays for it.
+    """
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True, check=True
+    ).stderr
+    own_package = module.split(".")[0]
+    packages = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        name = name.strip()
+        if "." not in name and name != own_package:
+            packages.append((int(cumulative), name))
+    return sorted(packages, reverse=True)[:top]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main", help="The module creating the application.")
+    parser.add_argument("--repeat", type=int, default=5, help="The number of timed imports.")
+    parser.add_argument("--budget", type=float, default=None, help="The maximum start-up time, in seconds.")
+    parser.add_argument("--top", type=int, default=15, help="The number of slowest imports listed.")
+    args = parser.parse_args()
+
+    timings = [time_import(args.module) for _ in range(args.repeat)]
+    best = min(timings)
+    print(f"import {args.module}: {best * 1e3:.0f}ms (best of {args.repeat}, worst {max(timings) * 1e3:.0f}ms)\n")
+    print(f"{'cumulative':>12}  package")
+    for cumulative, name in slowest_packages(args.module, args.top):
+        print(f"{cumulative / 1e3:>10.1f}ms  {name}")
+
+    if args.budget is not None and best > args.budget:
+        print(f"\nStart-up time over budget: {best * 1e3:.0f}ms > {args.budget * 1e3:.0f}ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,10 @@ from app.database import Base
 from app.user.models import User  # noqa isort:skip
 from app.chat.models import ChatSession  # noqa isort:skip
 from app.tutor.models import Tutor  # noqa isort:skip
+from app.chat.cache import CompletionCacheEntry  # noqa isort:skip
+from app.chat.archive import ChatSessionArchive  # noqa isort:skip
+from app.chat.usage import TokenUsage  # noqa isort:skip
+from app.jobs.models import Job  # noqa isort:skip
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
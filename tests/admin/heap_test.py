@@ -0,0 +1,61 @@
+import httpx
+import pytest
+import pytest_asyncio
+
+from app.admin.heap import heap_profiler
+
+
+@pytest_asyncio.fixture
+async def heap_profiling():
+    heap_profiler.start(frames=5, sample_rate=1)
+    yield heap_profiler
+    heap_profiler.stop()
+
+
+@pytest.mark.asyncio
+async def test_heap_profiler_records_routes(heap_profiling, authenticated_client_superuser: httpx.AsyncClient):
+    """Test that the allocations of sampled requests are recorded per route template."""
+    response = await authenticated_client_superuser.get("/tutors")
+    assert response.status_code == 200
+
+    allocations = heap_profiling.routes["/tutors"]
+    assert allocations.requests == 1
+    assert allocations.peak_bytes > 0
+
+
+@pytest.mark.asyncio
+async def test_heap_diff(heap_profiling, authenticated_client_superuser: httpx.AsyncClient):
+    """Test that allocations made after the baseline snapshot show up in the diff."""
+    response = await authenticated_client_superuser.post("/admin/heap/snapshot")
+    assert response.status_code == 204
+    retained = [bytearray(1024) for _ in range(1000)]  # noqa: F841
+
+    response = await authenticated_client_superuser.get("/admin/heap/diff", params={"limit": 5})
+    assert response.status_code == 200
+    sites = response.json()
+    assert any("heap_test.py" in site["traceback"][-1] and site["size_diff"] >= 1024 * 1000 for site in sites)
+
+
+@pytest.mark.asyncio
+async def test_heap_start_stop(authenticated_client_superuser: httpx.AsyncClient):
+    """Test that superusers can switch heap profiling on and off at runtime."""
+    response = await authenticated_client_superuser.post("/admin/heap/start", json={"frames": 1, "sample_rate": 0.5})
+    assert response.status_code == 200
+    assert response.json()["tracing"] is True
+    assert response.json()["sample_rate"] == 0.5
+
+    response = await authenticated_client_superuser.get("/admin/heap/top")
+    assert response.status_code == 200
+    assert response.json()
+
+    response = await authenticated_client_superuser.post("/admin/heap/stop")
+    assert response.status_code == 204
+    response = await authenticated_client_superuser.get("/admin/heap/top")
+    assert response.status_code == 409
+
+
+@pytest.mark.asyncio
+async def test_heap_forbidden(authenticated_client_user: httpx.AsyncClient):
+    """Test that other users cannot switch heap profiling on."""
+    response = await authenticated_client_user.post("/admin/heap/start", json={})
+    assert response.status_code == 403
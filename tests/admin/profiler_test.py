@@ -0,0 +1,73 @@
+import asyncio
+import time
+from collections import Counter
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from app.admin.profiler import ProfilerBusyError, profile, request_profiles
+
+
+def busy_wait(seconds: float) -> None:
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+@pytest.mark.allow_blocking
+@pytest.mark.asyncio
+async def test_profile():
+    """Test that the profile attributes the time the event loop spends in a function to it."""
+    task = asyncio.create_task(profile(seconds=0.3, interval=0.001))
+    await asyncio.sleep(0.01)
+    busy_wait(0.2)
+    collapsed = await task
+
+    leaf_counts: Counter[str] = Counter()
+    for line in collapsed.splitlines():
+        stack, count = line.rsplit(" ", 1)
+        leaf_counts[stack.rsplit(";", 1)[-1].split(" ")[0]] += int(count)
+    assert leaf_counts["busy_wait"] > 10  # Samples wait for the GIL, released every 5ms by the busy thread
+
+
+@pytest.mark.asyncio
+async def test_profile_busy():
+    """Test that only one profile runs at a time."""
+    task = asyncio.create_task(profile(seconds=0.1, interval=0.01))
+    await asyncio.sleep(0)
+    with pytest.raises(ProfilerBusyError):
+        await profile(seconds=0.1, interval=0.01)
+    await task
+
+
+@pytest.mark.asyncio
+async def test_get_cpu_profile(authenticated_client_superuser: httpx.AsyncClient):
+    """Test that superusers can profile the worker."""
+    response = await authenticated_client_superuser.get("/admin/profile", params={"seconds": 0.1})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+
+
+@pytest.mark.asyncio
+async def test_get_cpu_profile_forbidden(authenticated_client_user: httpx.AsyncClient):
+    """Test that other users cannot profile the worker."""
+    response = await authenticated_client_user.get("/admin/profile", params={"seconds": 0.1})
+    assert response.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_request_profile(authenticated_client_superuser: httpx.AsyncClient):
+    """Test that a request sent with the profile token is profiled and its profile can be retrieved."""
+    with patch("app.admin.profiler.settings.PROFILE_REQUEST_TOKEN", "secret"):
+        response = await authenticated_client_superuser.get("/tutors", headers={"X-Profile": "secret"})
+        assert response.status_code == 200
+        profile_id = response.headers["x-profile-id"]
+        assert profile_id in request_profiles
+
+        response = await authenticated_client_superuser.get("/tutors", headers={"X-Profile": "wrong"})
+        assert "x-profile-id" not in response.headers
+
+    response = await authenticated_client_superuser.get(f"/admin/profile/requests/{profile_id}")
+    assert response.status_code == 200
+    assert response.text == request_profiles[profile_id]
@@ -0,0 +1,59 @@
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from app.admission import AdmissionController, admission_controller
+from app.chat.models import ChatSession
+from app.watchdog import LoopLagMonitor
+
+
+def make_controller() -> AdmissionController:
+    return AdmissionController(
+        max_in_flight=10, max_pool_wait=0.5, max_loop_lag=0.2, loop_lag_monitor=LoopLagMonitor(interval=0.1)
+    )
+
+
+def test_admission_controller_in_flight():
+    """Test that too many requests in flight overload the process."""
+    controller = make_controller()
+    controller.in_flight = 10
+    assert controller.overload_reason() is None
+    controller.in_flight = 11
+    assert controller.overload_reason() == "11 requests in flight"
+
+
+def test_admission_controller_pool_wait():
+    """Test that slow pool checkouts overload the process, and that it recovers once they are fast again."""
+    controller = make_controller()
+    for _ in range(10):
+        controller.observe_pool_wait(2)
+    assert "database pool" in controller.overload_reason()
+    for _ in range(20):
+        controller.observe_pool_wait(0.001)
+    assert controller.overload_reason() is None
+
+
+def test_admission_controller_loop_lag():
+    """Test that event-loop lag overloads the process."""
+    controller = make_controller()
+    controller.loop_lag_monitor.lag = 0.5
+    assert "event loop" in controller.overload_reason()
+
+
+@pytest.mark.asyncio
+async def test_admission_sheds_expensive_requests(
+    test_chat_session: ChatSession, authenticated_client_user: httpx.AsyncClient
+):
+    """Test that an overloaded process rejects chat turns, but still serves cheap reads and health checks."""
+    with patch.object(admission_controller, "max_in_flight", 0):
+        response = await authenticated_client_user.post(f"/chat/{test_chat_session.id}", json={"content": "Hello"})
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+        response = await authenticated_client_user.get("/chat", params={"tutor_id": str(test_chat_session.tutor_id)})
+        assert response.status_code == 503
+        response = await authenticated_client_user.get(f"/chat/{test_chat_session.id}")
+        assert response.status_code == 200
+        response = await authenticated_client_user.get("/_health")
+        assert response.status_code == 200
+    assert admission_controller.in_flight == 0
@@ -0,0 +1,78 @@
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from app.chat.models import ChatSession
+from app.config import settings
+from app.tutor.models import Tutor
+from app.user import firebase
+from app.user.models import User
+
+
+@pytest.fixture(autouse=True)
+def _serialize_sub_requests():
+    """The database fixture shares a single session between all callers, which cannot be used concurrently."""
+    with patch.object(settings, "BATCH_MAX_CONCURRENCY", 1):
+        yield
+
+
+@pytest.mark.asyncio
+async def test_batch(
+    test_user: User, test_tutor: Tutor, test_chat_session: ChatSession, authenticated_client_user: httpx.AsyncClient
+):
+    """Test running the app start-up requests in a single batch."""
+    response = await authenticated_client_user.post(
+        "/batch",
+        json={
+            "requests": [
+                {"id": "me", "path": "/users/me"},
+                {"id": "tutors", "path": "/tutors?fields=id"},
+                {"id": "chats", "path": "/chats?fields=id"},
+                {"id": "chat", "path": f"/chat/{test_chat_session.id}"},
+            ]
+        },
+    )
+    assert response.status_code == 200
+    responses = response.json()["responses"]
+    assert [item["id"] for item in responses] == ["me", "tutors", "chats", "chat"]
+    assert all(item["status"] == 200 for item in responses)
+    assert responses[0]["body"]["id"] == str(test_user.id)
+    assert responses[2]["body"] == [{"id": str(test_chat_session.id)}]
+    assert responses[3]["body"]["id"] == str(test_chat_session.id)
+
+
+@pytest.mark.asyncio
+async def test_batch_authenticates_once(authenticated_client_user: httpx.AsyncClient):
+    """Test that sub-requests reuse the authentication of the batch request."""
+    with patch("app.user.auth.verify_id_token", wraps=firebase.verify_id_token) as verify:
+        response = await authenticated_client_user.post(
+            "/batch", json={"requests": [{"path": "/users/me"}, {"path": "/tutors"}]}
+        )
+    assert response.status_code == 200
+    assert verify.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_batch_sub_request_error(authenticated_client_user: httpx.AsyncClient):
+    """Test that a failing sub-request does not fail the whole batch."""
+    response = await authenticated_client_user.post(
+        "/batch",
+        json={"requests": [{"path": "/chat/00000000-0000-0000-0000-000000000000"}, {"path": "/users/me"}]},
+    )
+    assert response.status_code == 200
+    assert [item["status"] for item in response.json()["responses"]] == [404, 200]
+
+
+@pytest.mark.asyncio
+async def test_batch_nested(authenticated_client_user: httpx.AsyncClient):
+    """Test that batch requests cannot be nested."""
+    response = await authenticated_client_user.post("/batch", json={"requests": [{"method": "POST", "path": "/batch"}]})
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_batch_unauthenticated(client: httpx.AsyncClient):
+    """Test that batch requests require authentication."""
+    response = await client.post("/batch", json={"requests": [{"path": "/_health"}]})
+    assert response.status_code == 403
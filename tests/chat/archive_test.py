@@ -0,0 +1,142 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.chat.archive import (
+    ChatSessionArchive,
+    InvalidArchiveError,
+    pack_message_history,
+    unpack_message_history,
+)
+from app.chat.models import ChatSession
+from app.chat.schemas import MessageWrite, OpenAIMessage, OpenAIMessageRole
+
+MESSAGE_HISTORY = [
+    OpenAIMessage(role=OpenAIMessageRole.ASSISTANT, content="Bonjour ! " * 50, timestamp_ms=0, uuid="a"),
+    OpenAIMessage(role=OpenAIMessageRole.USER, content="Salut", name="Jean", timestamp_ms=1, uuid="b"),
+]
+
+
+def test_pack_unpack_message_history():
+    """Test that an archived message history round-trips and is compressed."""
+    data = pack_message_history(MESSAGE_HISTORY)
+    assert unpack_message_history(data) == MESSAGE_HISTORY
+    assert len(data) < len(str([message.dict() for message in MESSAGE_HISTORY]))
+
+
+@pytest.mark.parametrize(
+    "data",
+    [b"", b"\x02\x00\x00\x00\x01x", pack_message_history(MESSAGE_HISTORY)[:-4]],
+    ids=["empty", "unknown_version", "truncated"],
+)
+def test_unpack_message_history_invalid(data: bytes):
+    """Test that truncated, corrupted or unknown archives are rejected."""
+    with pytest.raises(InvalidArchiveError):
+        unpack_message_history(data)
+
+
+async def make_idle(async_session: AsyncSession, chat_session: ChatSession, days: int) -> None:
+    updated_at = datetime.now(timezone.utc) - timedelta(days=days)
+    await async_session.execute(
+        sa.update(ChatSession).where(ChatSession.id == chat_session.id).values(updated_at=updated_at)
+    )
+    await async_session.commit()
+
+
+@pytest.mark.asyncio
+async def test_chat_session_archive_idle(async_session: AsyncSession, test_chat_session: ChatSession):
+    """Test that idle chat sessions are archived, keeping a stub row."""
+    await make_idle(async_session, test_chat_session, days=30)
+    report = await ChatSession.archive_idle(idle=timedelta(days=14))
+    assert report.rows == 1
+    assert 0 < report.compressed_bytes and 0 < report.raw_bytes
+    stub = (
+        await async_session.execute(
+            sa.select(ChatSession.message_history, ChatSession.archived_at).where(
+                ChatSession.id == test_chat_session.id
+            )
+        )
+    ).one()
+    assert stub.message_history == []
+    assert stub.archived_at is not None
+    assert await async_session.get(ChatSessionArchive, test_chat_session.id) is not None
+    assert (await ChatSession.archive_idle(idle=timedelta(days=14))).rows == 0
+
+
+@pytest.mark.asyncio
+async def test_chat_session_archive_idle_skips_active(test_chat_session: ChatSession):
+    """Test that recently updated chat sessions are not archived."""
+    report = await ChatSession.archive_idle(idle=timedelta(days=14))
+    assert report.rows == 0
+
+
+@pytest.mark.asyncio
+async def test_chat_session_get_rehydrates(async_session: AsyncSession, test_chat_session: ChatSession):
+    """Test that loading an archived chat session moves it back from cold storage."""
+    message_history = test_chat_session.message_history
+    await make_idle(async_session, test_chat_session, days=30)
+    await ChatSession.archive_idle(idle=timedelta(days=14))
+    chat_session = await ChatSession.get_by_id_user_id(test_chat_session.id, test_chat_session.user_id)
+    assert chat_session is not None
+    assert chat_session.message_history == message_history
+    assert chat_session.archived_at is None
+    assert await async_session.get(ChatSessionArchive, test_chat_session.id) is None
+
+
+@pytest.mark.asyncio
+async def test_chat_session_rehydrate_keeps_updated_at(async_session: AsyncSession, test_chat_session: ChatSession):
+    """Test that archiving and rehydrating a chat session do not count as activity in it."""
+    await make_idle(async_session, test_chat_session, days=30)
+    query = sa.select(ChatSession.updated_at).where(ChatSession.id == test_chat_session.id)
+    updated_at = (await async_session.execute(query)).scalar_one()
+    await ChatSession.archive_idle(idle=timedelta(days=14))
+    assert (await async_session.execute(query)).scalar_one() == updated_at
+    await ChatSession.get_by_id_user_id(test_chat_session.id, test_chat_session.user_id)
+    assert (await async_session.execute(query)).scalar_one() == updated_at
+
+
+@pytest.mark.asyncio
+async def test_chat_session_reply_to_archived_meanwhile(async_session: AsyncSession, test_chat_session: ChatSession):
+    """Test that a chat session archived between loading it and storing a reply keeps its full message history."""
+    message_history = test_chat_session.message_history
+    chat_session = await ChatSession.get(test_chat_session.id)
+    assert chat_session is not None
+    await make_idle(async_session, test_chat_session, days=30)
+    assert (await ChatSession.archive_idle(idle=timedelta(days=14))).rows == 1
+    message = await chat_session.add_message(MessageWrite(content="Salut"), commit=True)
+    reply = OpenAIMessage(role=OpenAIMessageRole.ASSISTANT, content="Bonjour")
+    with patch("app.chat.models.get_chat_response", return_value=reply):
+        await chat_session.reply_to(message.uuid, commit=True)
+    chat_session = await ChatSession.get_by_id_user_id(test_chat_session.id, test_chat_session.user_id)
+    assert chat_session is not None
+    assert chat_session.message_history == message_history + [message, reply]
+    assert chat_session.archived_at is None
+    assert await async_session.get(ChatSessionArchive, test_chat_session.id) is None
+
+
+@pytest.mark.asyncio
+async def test_chat_session_get_by_user_id_reads_archives(async_session: AsyncSession, test_chat_session: ChatSession):
+    """Test that listing chat sessions decompresses archived ones without moving them back."""
+    message_history = test_chat_session.message_history
+    await make_idle(async_session, test_chat_session, days=30)
+    await ChatSession.archive_idle(idle=timedelta(days=14))
+    (chat_session,) = await ChatSession.get_by_user_id(test_chat_session.user_id)
+    assert chat_session.message_history == message_history
+    assert await async_session.get(ChatSessionArchive, test_chat_session.id) is not None
+
+
+@pytest.mark.asyncio
+async def test_chat_session_stream_by_user_id(async_session: AsyncSession, test_chat_session: ChatSession):
+    """Test that streaming a user's chat sessions decompresses archived ones and includes soft-deleted ones."""
+    message_history = test_chat_session.message_history
+    await make_idle(async_session, test_chat_session, days=30)
+    await ChatSession.archive_idle(idle=timedelta(days=14))
+    await ChatSession.delete(test_chat_session.id, soft=True)
+    chat_sessions = [chat_session async for chat_session in ChatSession.stream_by_user_id(test_chat_session.user_id)]
+    assert [chat_session.id for chat_session in chat_sessions] == [test_chat_session.id]
+    assert chat_sessions[0].message_history == message_history
+    assert chat_sessions[0].is_deleted
+    assert await async_session.get(ChatSessionArchive, test_chat_session.id) is not None
@@ -0,0 +1,105 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.chat.cache import CompletionCache
+from app.chat.schemas import OpenAIMessage, OpenAIMessageRole
+from app.chat.utils import get_chat_response
+
+RESPONSE = {"role": "assistant", "content": "Bonjour"}
+
+
+def test_completion_cache_key_is_canonical():
+    """Test that the cache key does not depend on parameter order."""
+    messages = [{"role": "system", "content": "Hello"}]
+    assert CompletionCache.key("model", messages, max_tokens=10, temperature=0.2) == CompletionCache.key(
+        "model", messages, temperature=0.2, max_tokens=10
+    )
+    assert CompletionCache.key("model", messages, max_tokens=10) != CompletionCache.key(
+        "model", messages, max_tokens=11
+    )
+
+
+@pytest.mark.asyncio
+async def test_completion_cache_memory_hit():
+    """Test that a cached completion is served from memory."""
+    cache = CompletionCache(max_size=10)
+    create = AsyncMock(return_value=RESPONSE)
+    assert await cache.get_or_create("key", create, ttl=60) == RESPONSE
+    assert await cache.get_or_create("key", create, ttl=60) == RESPONSE
+    assert create.await_count == 1
+    assert cache.stats == {"memory_hits": 1, "db_hits": 0, "misses": 1}
+
+
+@pytest.mark.asyncio
+async def test_completion_cache_expiry():
+    """Test that expired completions are created again."""
+    cache = CompletionCache(max_size=10)
+    create = AsyncMock(return_value=RESPONSE)
+    await cache.get_or_create("key", create, ttl=0)
+    await cache.get_or_create("key", create, ttl=0)
+    assert create.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_completion_cache_lru_eviction():
+    """Test that the least recently used completion is evicted first."""
+    cache = CompletionCache(max_size=2)
+    create = AsyncMock(return_value=RESPONSE)
+    for key in ("a", "b", "a", "c"):
+        await cache.get_or_create(key, create, ttl=60)
+    assert create.await_count == 3
+    await cache.get_or_create("a", create, ttl=60)
+    assert create.await_count == 3
+    await cache.get_or_create("b", create, ttl=60)
+    assert create.await_count == 4
+
+
+@pytest.mark.asyncio
+async def test_completion_cache_coalesces_concurrent_misses():
+    """Test that concurrent misses for the same key create a single completion."""
+    cache = CompletionCache(max_size=10)
+
+    async def create():
+        await asyncio.sleep(0.01)
+        return RESPONSE
+
+    create_mock = AsyncMock(side_effect=create)
+    responses = await asyncio.gather(*(cache.get_or_create("key", create_mock, ttl=60) for _ in range(5)))
+    assert responses == [RESPONSE] * 5
+    assert create_mock.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_completion_cache_db_tier():
+    """Test that completions are shared through the database tier."""
+    create = AsyncMock(return_value=RESPONSE)
+    await CompletionCache(max_size=10, use_db=True).get_or_create("key", create, ttl=60)
+    cache = CompletionCache(max_size=10, use_db=True)
+    assert await cache.get_or_create("key", create, ttl=60) == RESPONSE
+    assert create.await_count == 1
+    assert cache.stats["db_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_get_chat_response_cache_ignores_message_metadata():
+    """Test that cached responses ignore message uuids and timestamps, and get fresh ones."""
+    cache = CompletionCache(max_size=10)
+    create = AsyncMock(return_value=RESPONSE)
+    with patch("app.chat.utils.completion_cache", cache), patch("app.chat.utils._create_chat_completion", create):
+        first = await get_chat_response(
+            "model",
+            [OpenAIMessage(role=OpenAIMessageRole.SYSTEM, content="Hello", uuid="a", timestamp_ms=1)],
+            cache_ttl=60,
+            max_tokens=10,
+        )
+        second = await get_chat_response(
+            "model",
+            [OpenAIMessage(role=OpenAIMessageRole.SYSTEM, content="Hello", uuid="b", timestamp_ms=2)],
+            cache_ttl=60,
+            max_tokens=10,
+        )
+    assert create.await_count == 1
+    assert first.content == second.content == "Bonjour"
+    assert first.uuid != second.uuid
@@ -5,7 +5,12 @@ from uuid import UUID
 import pytest
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.chat.models import ChatSession, MessageHistoryTooLongError
+from app.chat.models import (
+    ChatSession,
+    MessageHistoryTooLongError,
+    MessageUUIDReusedError,
+    idempotency_key_to_uuid,
+)
 from app.chat.schemas import MessageWrite, OpenAIMessage, OpenAIMessageRole
 from app.tutor.models import Tutor
 from app.user.models import User
@@ -89,6 +94,18 @@ async def test_chat_session_get_by_user_id(test_chat_session: ChatSession):
     assert chat_sessions
 
 
+@pytest.mark.asyncio
+async def test_chat_session_get_by_user_id_sparse_fields(test_chat_session: ChatSession):
+    """Test that get_by_user_id only loads the columns needed for a sparse fieldset."""
+    chat_sessions = await ChatSession.get_by_user_id(test_chat_session.user_id, fields={"id": None, "tutor": {"name"}})
+    assert len(chat_sessions) == 1
+    loaded = chat_sessions[0].__dict__
+    assert "message_history" not in loaded
+    assert loaded["tutor"].name == test_chat_session.tutor.name
+    assert "system_prompt" not in loaded["tutor"].__dict__
+    assert loaded["user"] is None
+
+
 @pytest.mark.asyncio
 async def test_chat_session_get_by_user_id_excludes_soft_deleted(test_chat_session: ChatSession):
     """Test that get_by_user_id doesn't return soft-deleted ChatSession objects."""
@@ -157,6 +174,40 @@ async def test_chat_session_get_response_too_long_message_history(test_chat_sess
         await test_chat_session.get_response(user_message)
 
 
+@pytest.mark.asyncio
+@pytest.mark.keep_it_short
+async def test_chat_session_add_message_and_reply_to(test_chat_session: ChatSession):
+    """Test storing a user message first and answering it later."""
+    initial_message_history = test_chat_session.message_history
+    user_message = await test_chat_session.add_message(MessageWrite(content="Hello"), commit=True)
+    assert user_message.uuid is not None
+    chat_session = await ChatSession.get(test_chat_session.id)
+    assert chat_session is not None
+    assert chat_session.message_history == initial_message_history + [user_message]
+    assert chat_session.get_reply(user_message.uuid) is None
+
+    response = await chat_session.reply_to(user_message.uuid, commit=True)
+    chat_session = await ChatSession.get(test_chat_session.id)
+    assert chat_session is not None
+    assert chat_session.message_history == initial_message_history + [user_message, response]
+    assert chat_session.get_reply(user_message.uuid) == response
+
+
+@pytest.mark.asyncio
+async def test_chat_session_reply_to_keeps_concurrent_messages(test_chat_session: ChatSession):
+    """Test that a reply does not overwrite the messages stored while the completion was awaited."""
+    first = await test_chat_session.add_message(MessageWrite(content="First"), commit=True)
+    stale_chat_session = await ChatSession.get(test_chat_session.id)
+    assert stale_chat_session is not None
+    second = await test_chat_session.add_message(MessageWrite(content="Second"), commit=True)
+    reply = OpenAIMessage(role=OpenAIMessageRole.ASSISTANT, content="Bonjour")
+    with patch("app.chat.models.get_chat_response", return_value=reply):
+        assert await stale_chat_session.reply_to(first.uuid, commit=True) == reply
+    chat_session = await ChatSession.get(test_chat_session.id)
+    assert chat_session is not None
+    assert chat_session.message_history[-3:] == [first, reply, second]
+
+
 @pytest.mark.asyncio
 @pytest.mark.keep_it_short
 async def test_chat_session_get_conversation_opener(empty_test_chat_session: ChatSession):
@@ -166,3 +217,26 @@ async def test_chat_session_get_conversation_opener(empty_test_chat_session: Cha
     chat_session = await ChatSession.get(empty_test_chat_session.id)
     assert chat_session is not None
     assert len(chat_session.message_history) == 1
+
+
+def test_idempotency_key_to_uuid():
+    """Test that idempotency keys map to stable, user-scoped version 4 uuids."""
+    user_id, other_user_id = UUID(int=1), UUID(int=2)
+    message_uuid = idempotency_key_to_uuid(user_id, "key")
+    assert message_uuid == idempotency_key_to_uuid(user_id, "key")
+    assert message_uuid != idempotency_key_to_uuid(other_user_id, "key")
+    assert message_uuid.version == 4
+
+
+def test_chat_session_get_stored_response(test_chat_session: ChatSession):
+    """Test getting the stored response to an already answered message."""
+    message_uuid = UUID("22222222-2222-4222-8222-222222222222")
+    user_message = OpenAIMessage(role=OpenAIMessageRole.USER, content="Hello", uuid=str(message_uuid))
+    ai_message = OpenAIMessage(role=OpenAIMessageRole.ASSISTANT, content="Hi", uuid=str(UUID(int=3)))
+    test_chat_session.message_history = test_chat_session.message_history + [user_message, ai_message]
+
+    assert test_chat_session.get_stored_response(MessageWrite(content="Hello", uuid=message_uuid)) == ai_message
+    assert test_chat_session.get_stored_response(MessageWrite(content="Hello")) is None
+    assert test_chat_session.get_stored_response(MessageWrite(content="Hello", uuid=UUID(int=4, version=4))) is None
+    with pytest.raises(MessageUUIDReusedError):
+        test_chat_session.get_stored_response(MessageWrite(content="Goodbye", uuid=message_uuid))
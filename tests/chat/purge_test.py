@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+from unittest.mock import patch
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.chat.models import ChatSession
+from app.chat.purge import purge_deleted_chat_sessions
+from app.tutor.models import Tutor
+from app.user.models import User
+
+
+async def create_chat_sessions(
+    async_session: AsyncSession, user: User, tutor: Tutor, deleted_days_ago: List[Optional[int]]
+) -> List[ChatSession]:
+    """Create chat sessions, soft-deleted the given number of days ago or not deleted if None."""
+    chat_sessions = []
+    for days_ago in deleted_days_ago:
+        chat_session = await ChatSession.create(user_id=user.id, tutor_id=tutor.id, message_history=[])
+        if days_ago is not None:
+            deleted_at = datetime.now(timezone.utc) - timedelta(days=days_ago)
+            await async_session.execute(
+                sa.update(ChatSession).where(ChatSession.id == chat_session.id).values(deleted_at=deleted_at)
+            )
+        chat_sessions.append(chat_session)
+    await async_session.commit()
+    return chat_sessions
+
+
+@pytest.mark.asyncio
+async def test_purge_deleted_chat_sessions(async_session: AsyncSession, test_user: User, test_tutor: Tutor):
+    """Test that only sessions soft-deleted longer than the retention period are purged, in batches."""
+    kept, recent, *expired = await create_chat_sessions(
+        async_session, test_user, test_tutor, [None, 1, 40, 41, 42, 43, 44]
+    )
+    report = await purge_deleted_chat_sessions(retention=timedelta(days=30), batch_size=2)
+    assert report.rows == 5
+    assert report.batches == 3
+    assert report.bytes > 0
+    remaining = (await async_session.execute(sa.select(ChatSession.id))).scalars().all()
+    assert set(remaining) == {kept.id, recent.id}
+
+
+@pytest.mark.asyncio
+async def test_purge_deleted_chat_sessions_nothing_to_purge(
+    async_session: AsyncSession, test_user: User, test_tutor: Tutor
+):
+    """Test that a purge with nothing to delete reports nothing."""
+    await create_chat_sessions(async_session, test_user, test_tutor, [None, 1])
+    report = await purge_deleted_chat_sessions(retention=timedelta(days=30), vacuum=True)
+    assert (report.rows, report.bytes, report.batches) == (0, 0, 0)
+
+
+@pytest.mark.asyncio
+async def test_purge_deleted_chat_sessions_continues_after_short_batches():
+    """Test that a batch shortened by locked rows does not end the purge."""
+    batches = [(1, 10, (datetime.now(timezone.utc), None)), (2, 20, (datetime.now(timezone.utc), None)), (0, 0, None)]
+    with patch("app.chat.purge._purge_batch", side_effect=batches):
+        report = await purge_deleted_chat_sessions(retention=timedelta(days=30), batch_size=2)
+    assert (report.rows, report.bytes, report.batches) == (3, 30, 2)
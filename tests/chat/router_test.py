@@ -1,11 +1,14 @@
 import json
+from unittest.mock import patch
 
 import httpx
 import pytest
 
 from app.chat.models import ChatSession
-from app.chat.router import CHAT_SESSION_NOT_FOUND
-from app.chat.schemas import MessageRole
+from app.chat.router import CHAT_SESSION_NOT_FOUND, TURN_NOT_FOUND
+from app.chat.schemas import MessageRole, TurnStatus
+from app.chat.usage import UsageAttribution, UsageMeter
+from app.config import settings
 from app.tutor.schemas import TutorRead
 
 
@@ -52,6 +55,38 @@ async def test_get_chat_session(test_chat_session: ChatSession, authenticated_cl
     }
 
 
+@pytest.mark.asyncio
+async def test_get_chat_sessions_sparse_fields(
+    test_chat_session: ChatSession, authenticated_client_user: httpx.AsyncClient
+):
+    """Test getting a list of ChatSession objects restricted to a sparse fieldset."""
+    response = await authenticated_client_user.get("/chats", params={"fields": "id,tutor.name"})
+    assert response.status_code == 200
+    assert response.json() == [{"id": str(test_chat_session.id), "tutor": {"name": test_chat_session.tutor.name}}]
+
+
+@pytest.mark.asyncio
+async def test_get_chat_session_sparse_fields(
+    test_chat_session: ChatSession, authenticated_client_user: httpx.AsyncClient
+):
+    """Test getting a ChatSession object restricted to a sparse fieldset."""
+    response = await authenticated_client_user.get(
+        f"/chat/{test_chat_session.id}", params={"fields": "tutor_id,message_history"}
+    )
+    assert response.status_code == 200
+    assert response.json().keys() == {"tutor_id", "message_history"}
+    assert response.json()["tutor_id"] == str(test_chat_session.tutor_id)
+    assert len(response.json()["message_history"]) == 1
+
+
+@pytest.mark.asyncio
+async def test_get_chat_sessions_unknown_field(authenticated_client_user: httpx.AsyncClient):
+    """Test that requesting an unknown field is rejected."""
+    response = await authenticated_client_user.get("/chats", params={"fields": "id,tutor.password"})
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Unknown field: tutor.password"}
+
+
 @pytest.mark.asyncio
 async def test_get_chat_session_not_found(authenticated_client_user: httpx.AsyncClient):
     """Test getting a ChatSession object that does not exist."""
@@ -110,6 +145,80 @@ async def test_post_chat_message(test_chat_session: ChatSession, authenticated_c
     assert response.json()["content"] == chat_session.message_history[-1].content
 
 
+@pytest.mark.asyncio
+@pytest.mark.keep_it_short
+async def test_post_chat_message_idempotency_key(
+    test_chat_session: ChatSession, authenticated_client_user: httpx.AsyncClient
+):
+    """Test that retrying a chat message with the same Idempotency-Key returns the stored reply."""
+    initial_message_history_length = len(test_chat_session.message_history)
+    headers = {"Idempotency-Key": "retry-me"}
+    first = await authenticated_client_user.post(
+        f"/chat/{test_chat_session.id}", json={"content": "Hello, world!"}, headers=headers
+    )
+    retry = await authenticated_client_user.post(
+        f"/chat/{test_chat_session.id}", json={"content": "Hello, world!"}, headers=headers
+    )
+    assert first.status_code == 200
+    assert retry.status_code == 200
+    assert retry.json() == first.json()
+    chat_session = await ChatSession.get(test_chat_session.id)
+    assert chat_session is not None
+    assert len(chat_session.message_history) == initial_message_history_length + 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.keep_it_short
+async def test_post_chat_message_uuid_reused(
+    test_chat_session: ChatSession, authenticated_client_user: httpx.AsyncClient
+):
+    """Test that reusing a message uuid for a different message is rejected."""
+    message_uuid = "22222222-2222-4222-8222-222222222222"
+    response = await authenticated_client_user.post(
+        f"/chat/{test_chat_session.id}", json={"content": "Hello, world!", "uuid": message_uuid}
+    )
+    assert response.status_code == 200
+    response = await authenticated_client_user.post(
+        f"/chat/{test_chat_session.id}", json={"content": "Goodbye, world!", "uuid": message_uuid}
+    )
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+@pytest.mark.keep_it_short
+async def test_post_chat_message_async(test_chat_session: ChatSession, authenticated_client_user: httpx.AsyncClient):
+    """Test posting a chat message asynchronously and long-polling the reply."""
+    initial_message_history_length = len(test_chat_session.message_history)
+    response = await authenticated_client_user.post(
+        f"/chat/{test_chat_session.id}",
+        json={"content": "Hello, world!"},
+        headers={"Prefer": "respond-async"},
+    )
+    assert response.status_code == 202
+    assert response.json()["status"] == TurnStatus.PENDING
+    turn_id = response.json()["id"]
+    assert response.headers["Location"] == f"/chat/{test_chat_session.id}/turns/{turn_id}"
+
+    response = await authenticated_client_user.get(response.headers["Location"], params={"timeout": 30})
+    assert response.status_code == 200
+    assert response.json()["status"] == TurnStatus.COMPLETED
+    assert response.json()["message"]["role"] == MessageRole.TUTOR
+    chat_session = await ChatSession.get(test_chat_session.id)
+    assert chat_session is not None
+    assert len(chat_session.message_history) == initial_message_history_length + 2
+    assert chat_session.message_history[-2].uuid == turn_id
+
+
+@pytest.mark.asyncio
+async def test_get_chat_turn_not_found(test_chat_session: ChatSession, authenticated_client_user: httpx.AsyncClient):
+    """Test polling a turn that does not exist."""
+    response = await authenticated_client_user.get(
+        f"/chat/{test_chat_session.id}/turns/22222222-2222-4222-8222-222222222222", params={"timeout": 0}
+    )
+    assert response.status_code == 404
+    assert response.json() == {"detail": TURN_NOT_FOUND.detail}
+
+
 @pytest.mark.asyncio
 async def test_delete_chat_session(test_chat_session: ChatSession, authenticated_client_user: httpx.AsyncClient):
     """Test deleting a chat session."""
@@ -125,3 +234,16 @@ async def test_delete_chat_session_not_found(authenticated_client_user: httpx.As
     response = await authenticated_client_user.delete("/chat/00000000-0000-0000-0000-000000000000")
     assert response.status_code == 404
     assert response.json() == {"detail": CHAT_SESSION_NOT_FOUND.detail}
+
+
+@pytest.mark.asyncio
+async def test_post_chat_message_token_quota_exceeded(
+    test_chat_session: ChatSession, authenticated_client_user: httpx.AsyncClient
+):
+    """Test that users who used up their daily token quota are rejected until midnight UTC."""
+    meter = UsageMeter(flush_size=100, flush_interval=60, refresh_interval=60)
+    meter.record(UsageAttribution(user_id=test_chat_session.user_id), "gpt-3.5-turbo", 90, 10)
+    with patch.object(settings, "DAILY_TOKEN_QUOTA", 100), patch("app.chat.router.usage_meter", meter):
+        response = await authenticated_client_user.post(f"/chat/{test_chat_session.id}", json={"content": "Hello"})
+    assert response.status_code == 429
+    assert 0 < int(response.headers["Retry-After"]) <= 24 * 60 * 60
@@ -0,0 +1,40 @@
+import asyncio
+from unittest.mock import patch
+from uuid import uuid4
+
+import pytest
+
+from app.chat.turns import TurnQueueFullError, TurnWorkerPool
+
+
+@pytest.mark.asyncio
+async def test_turn_pool_drain():
+    """Test that draining the turn pool answers the queued turns, then rejects new ones."""
+    pool = TurnWorkerPool(workers=1, queue_size=10)
+    answered = []
+
+    async def answer(chat_session_id, user_id, turn_id):
+        await asyncio.sleep(0.01)
+        answered.append(turn_id)
+
+    with patch.object(pool, "_answer", answer):
+        pool.submit(uuid4(), uuid4(), "first")
+        pool.submit(uuid4(), uuid4(), "second")
+        assert await pool.drain(timeout=5) == 0
+    assert answered == ["first", "second"]
+    assert pool.full()
+    with pytest.raises(TurnQueueFullError):
+        pool.submit(uuid4(), uuid4(), "third")
+
+
+@pytest.mark.asyncio
+async def test_turn_pool_drain_timeout():
+    """Test that turns still in progress at the drain timeout are abandoned."""
+    pool = TurnWorkerPool(workers=1, queue_size=10)
+
+    async def answer(chat_session_id, user_id, turn_id):
+        await asyncio.sleep(10)
+
+    with patch.object(pool, "_answer", answer):
+        pool.submit(uuid4(), uuid4(), "slow")
+        assert await pool.drain(timeout=0.01) == 1
@@ -0,0 +1,100 @@
+import asyncio
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from unittest.mock import MagicMock, patch
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.chat.usage import TokenUsage, UsageAttribution, UsageMeter
+from app.user.models import User
+
+
+@pytest.mark.asyncio
+async def test_usage_meter_flush(async_session: AsyncSession, test_user: User):
+    """Test that buffered usage records are written in a batch."""
+    meter = UsageMeter(flush_size=100, flush_interval=60, refresh_interval=60)
+    tutor_id = uuid.uuid4()
+    for _ in range(3):
+        meter.record(UsageAttribution(user_id=test_user.id, tutor_id=tutor_id), "gpt-3.5-turbo", 10, 5)
+    assert (await async_session.execute(sa.select(sa.func.count()).select_from(TokenUsage))).scalar_one() == 0
+    assert await meter.flush() == 3
+    records = (await async_session.execute(sa.select(TokenUsage))).scalars().all()
+    assert [(record.tutor_id, record.prompt_tokens, record.completion_tokens) for record in records] == [
+        (tutor_id, 10, 5)
+    ] * 3
+    assert await meter.flush() == 0
+
+
+@pytest.mark.asyncio
+async def test_usage_meter_flushes_when_full(async_session: AsyncSession, test_user: User):
+    """Test that a full buffer is flushed right away."""
+    meter = UsageMeter(flush_size=2, flush_interval=60, refresh_interval=60)
+    with patch.object(meter, "flush", wraps=meter.flush) as flush:
+        meter.record(UsageAttribution(user_id=test_user.id), "gpt-3.5-turbo", 10, 5)
+        assert flush.call_count == 0
+        meter.record(UsageAttribution(user_id=test_user.id), "gpt-3.5-turbo", 10, 5)
+        assert flush.call_count == 1
+        await asyncio.gather(*meter._flushes)
+    assert (await async_session.execute(sa.select(sa.func.count()).select_from(TokenUsage))).scalar_one() == 2
+
+
+@pytest.mark.asyncio
+async def test_usage_meter_tokens_used_today(test_user: User):
+    """Test that daily counters include buffered and flushed usage, and are kept up to date in memory."""
+    meter = UsageMeter(flush_size=100, flush_interval=60, refresh_interval=60)
+    attribution = UsageAttribution(user_id=test_user.id)
+    meter.record(attribution, "gpt-3.5-turbo", 10, 5)
+    await meter.flush()
+    meter.record(attribution, "gpt-3.5-turbo", 20, 5)
+    assert await meter.tokens_used_today(test_user.id) == 40
+    with patch.object(meter, "_load", wraps=meter._load) as load:
+        meter.record(attribution, "gpt-3.5-turbo", 1, 1)
+        assert await meter.tokens_used_today(test_user.id) == 42
+        load.assert_not_called()
+
+
+class BlockingSession:
+    """A database session whose inserts wait until released, summing the tokens of the inserted records."""
+
+    def __init__(self) -> None:
+        self.release = asyncio.Event()
+        self.records: List[Dict[str, Any]] = []
+
+    async def __aenter__(self) -> "BlockingSession":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        pass
+
+    async def execute(self, statement: Any, parameters: Optional[List[Dict[str, Any]]] = None) -> MagicMock:
+        if parameters is not None:
+            await self.release.wait()
+            self.records.extend(parameters)
+        result = MagicMock()
+        result.scalar_one.return_value = sum(
+            record["prompt_tokens"] + record["completion_tokens"] for record in self.records
+        )
+        return result
+
+    async def commit(self) -> None:
+        pass
+
+
+@pytest.mark.asyncio
+async def test_usage_meter_counts_records_being_flushed():
+    """Test that daily counters loaded while a flush is being written include its records."""
+    meter = UsageMeter(flush_size=100, flush_interval=60, refresh_interval=60)
+    user_id = uuid.uuid4()
+    session = BlockingSession()
+    today = datetime.now(timezone.utc).date()
+    with patch("app.chat.usage.async_session", return_value=session):
+        meter.record(UsageAttribution(user_id=user_id), "gpt-3.5-turbo", 10, 5)
+        flush = asyncio.create_task(meter.flush())
+        await asyncio.sleep(0)  # The insert is in flight
+        assert (await meter._load(user_id, today)).tokens == 15
+        session.release.set()
+        assert await flush == 1
+        assert (await meter._load(user_id, today)).tokens == 15
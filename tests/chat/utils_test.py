@@ -0,0 +1,31 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.chat.utils import _get_http_session, close_llm_connections
+
+
+async def get_http_session():
+    return _get_http_session()
+
+
+@pytest.mark.asyncio
+async def test_close_llm_connections_of_every_loop():
+    """Test that each event loop gets its own HTTP session, and that all of them are closed."""
+    other_loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=other_loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        other_session = await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(get_http_session(), other_loop))
+        session = _get_http_session()
+        assert session is not other_session
+        assert _get_http_session() is session
+
+        await close_llm_connections()
+        assert session.closed
+        assert other_session.closed
+    finally:
+        other_loop.call_soon_threadsafe(other_loop.stop)
+        thread.join()
+        other_loop.close()
@@ -1,14 +1,18 @@
 from typing import AsyncGenerator, Generator
 
 import httpx
+import pytest
 import pytest_asyncio
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from firebase_admin import auth
 
 from app.app import create_app
-from app.config import settings
+from app.config import Env, settings
 from app.user.auth import ActiveVerifiedUser, SuperUser
+from app.user.firebase import get_firebase_app
 from app.user.models import User
+from app.watchdog import loop_watchdog
 
 
 @pytest_asyncio.fixture(autouse=True)
@@ -16,6 +20,7 @@ def test_app() -> Generator[FastAPI, None, None]:
     """
     Test the FastAPI app.
     """
+    get_firebase_app()  # Initialized by the lifespan of the app otherwise, which test clients do not run
     app = create_app()
 
     @app.get("/verifieduser")
@@ -29,22 +34,43 @@ def test_app() -> Generator[FastAPI, None, None]:
     yield app
 
 
+@pytest_asyncio.fixture(autouse=True)
+async def fail_on_blocked_loop(request: pytest.FixtureRequest) -> AsyncGenerator[None, None]:
+    """
+    Fail tests that block the event loop, when run with ENV=test.
+    """
+    if settings.ENV != Env.TEST or request.node.get_closest_marker("allow_blocking"):
+        yield
+        return
+    loop_watchdog.start()
+    blocked_count = loop_watchdog.blocked_count
+    yield
+    new_blocks = min(loop_watchdog.blocked_count - blocked_count, len(loop_watchdog.blocks))
+    if new_blocks:
+        blocks = list(loop_watchdog.blocks)[-new_blocks:]
+        pytest.fail(
+            "Event loop blocked:\n" + "\n".join(f"{block.duration:.3f}s in:\n{block.stack}" for block in blocks),
+            pytrace=False,
+        )
+
+
 HOST, PORT = "127.0.0.1", "8080"
 
 
 async def create_firebase_user(email: str, verified: bool) -> auth.UserRecord:
-    """Creates a new Firebase user."""
+    """Creates a new Firebase user, calling the emulator from the threadpool so as not to block the event loop."""
     firebase_user = None
     try:
-        firebase_user = auth.get_user_by_email(email)
+        firebase_user = await run_in_threadpool(auth.get_user_by_email, email)
     except auth.UserNotFoundError:
-        firebase_user = auth.create_user(
+        firebase_user = await run_in_threadpool(
+            auth.create_user,
             email=email,
             password='secretPassword',
             email_verified=verified,
         )
     yield firebase_user
-    auth.delete_user(firebase_user.uid)
+    await run_in_threadpool(auth.delete_user, firebase_user.uid)
 
 
 @pytest_asyncio.fixture
@@ -130,7 +156,7 @@ async def exchange_custom_token_for_id_token(custom_token: str) -> str:
 async def authenticated_client_user(
     client: httpx.AsyncClient, test_user: User
 ) -> AsyncGenerator[httpx.AsyncClient, None]:
-    custom_token = auth.create_custom_token(test_user.firebase_uid)
+    custom_token = await run_in_threadpool(auth.create_custom_token, test_user.firebase_uid)
     id_token = await exchange_custom_token_for_id_token(custom_token.decode('utf-8'))
     client.headers["Authorization"] = f"Bearer {id_token}"
     yield client
@@ -140,7 +166,7 @@ async def authenticated_client_user(
 async def authenticated_client_unverified_user(
     client: httpx.AsyncClient, test_unverified_user: User
 ) -> AsyncGenerator[httpx.AsyncClient, None]:
-    custom_token = auth.create_custom_token(test_unverified_user.firebase_uid)
+    custom_token = await run_in_threadpool(auth.create_custom_token, test_unverified_user.firebase_uid)
     id_token = await exchange_custom_token_for_id_token(custom_token.decode('utf-8'))
     client.headers["Authorization"] = f"Bearer {id_token}"
     yield client
@@ -150,7 +176,7 @@ async def authenticated_client_unverified_user(
 async def authenticated_client_superuser(
     client: httpx.AsyncClient, test_superuser: User
 ) -> AsyncGenerator[httpx.AsyncClient, None]:
-    custom_token = auth.create_custom_token(test_superuser.firebase_uid)
+    custom_token = await run_in_threadpool(auth.create_custom_token, test_superuser.firebase_uid)
     id_token = await exchange_custom_token_for_id_token(custom_token.decode('utf-8'))
     client.headers["Authorization"] = f"Bearer {id_token}"
     yield client
@@ -68,5 +68,5 @@ async def async_session(async_engine: AsyncEngine) -> AsyncGenerator[AsyncSessio
 @pytest.fixture(autouse=True)
 def _patch_async_session(async_session: AsyncSession):
     """Patch app. to return the async_session fixture"""
-    with mock.patch("app.database._async_session", lambda: async_session):
+    with mock.patch("app.database._async_session", lambda bind: async_session):
         yield
@@ -0,0 +1,75 @@
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.jobs.models import Job, JobStatus
+
+
+@pytest.mark.asyncio
+async def test_job_enqueue_and_claim():
+    """Test claiming a due job."""
+    job_id = await Job.enqueue("test.job", payload={"value": 1})
+    assert job_id is not None
+    jobs = await Job.claim("test.job", limit=10, visibility_timeout=60)
+    assert [job.id for job in jobs] == [job_id]
+    assert jobs[0].status == JobStatus.RUNNING
+    assert jobs[0].attempts == 1
+    assert jobs[0].payload == {"value": 1}
+
+
+@pytest.mark.asyncio
+async def test_job_claim_skips_claimed_jobs():
+    """Test that a claimed job is invisible until its visibility timeout expires."""
+    await Job.enqueue("test.job")
+    assert len(await Job.claim("test.job", limit=10, visibility_timeout=60)) == 1
+    assert await Job.claim("test.job", limit=10, visibility_timeout=60) == []
+
+
+@pytest.mark.asyncio
+async def test_job_claim_reclaims_expired_jobs():
+    """Test that a job whose visibility timeout expired is claimed again."""
+    await Job.enqueue("test.job")
+    assert len(await Job.claim("test.job", limit=10, visibility_timeout=0)) == 1
+    jobs = await Job.claim("test.job", limit=10, visibility_timeout=60)
+    assert len(jobs) == 1
+    assert jobs[0].attempts == 2
+
+
+@pytest.mark.asyncio
+async def test_job_claim_fails_expired_jobs_out_of_attempts(async_session: AsyncSession):
+    """Test that a job whose visibility timeout expired on its last attempt is failed instead of claimed again."""
+    job_id = await Job.enqueue("test.job", max_attempts=1)
+    assert len(await Job.claim("test.job", limit=10, visibility_timeout=0)) == 1
+    assert await Job.claim("test.job", limit=10, visibility_timeout=60) == []
+    job = await async_session.get(Job, job_id, populate_existing=True)
+    assert job.status == JobStatus.FAILED
+
+
+@pytest.mark.asyncio
+async def test_job_claim_respects_type_and_limit():
+    """Test that only jobs of the requested type are claimed, up to the limit."""
+    for _ in range(3):
+        await Job.enqueue("test.job")
+    await Job.enqueue("test.other")
+    assert len(await Job.claim("test.job", limit=2, visibility_timeout=60)) == 2
+    assert len(await Job.claim("test.job", limit=2, visibility_timeout=60)) == 1
+
+
+@pytest.mark.asyncio
+async def test_job_enqueue_dedupe_key():
+    """Test that at most one active job has a given dedupe key."""
+    assert await Job.enqueue("test.job", dedupe_key="key") is not None
+    assert await Job.enqueue("test.job", dedupe_key="key") is None
+    (job,) = await Job.claim("test.job", limit=10, visibility_timeout=60)
+    await job.complete()
+    assert await Job.enqueue("test.job", dedupe_key="key") is not None
+
+
+@pytest.mark.asyncio
+async def test_job_fail_retries_until_max_attempts():
+    """Test that a failed job is retried until it runs out of attempts."""
+    await Job.enqueue("test.job", max_attempts=2)
+    (job,) = await Job.claim("test.job", limit=10, visibility_timeout=60)
+    assert await job.fail("error", retry_in=0) is True
+    (job,) = await Job.claim("test.job", limit=10, visibility_timeout=60)
+    assert await job.fail("error", retry_in=0) is False
+    assert await Job.claim("test.job", limit=10, visibility_timeout=60) == []
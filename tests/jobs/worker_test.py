@@ -0,0 +1,76 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from app.jobs.models import Job
+from app.jobs.worker import JobType, Worker
+
+
+@pytest.mark.asyncio
+async def test_worker_runs_jobs():
+    """Test that the worker runs queued jobs with their payload."""
+    received = []
+
+    async def handler(value: int) -> None:
+        received.append(value)
+        if len(received) == 2:
+            worker.stop()
+
+    worker = Worker([JobType("test.job", handler)], poll_interval=0.01)
+    await Job.enqueue("test.job", payload={"value": 1})
+    await Job.enqueue("test.job", payload={"value": 2})
+    await asyncio.wait_for(worker.run(), timeout=5)
+    assert sorted(received) == [1, 2]
+    assert await Job.claim("test.job", limit=10, visibility_timeout=60) == []
+
+
+@pytest.mark.asyncio
+async def test_worker_retries_failed_jobs():
+    """Test that a failing job is retried."""
+    attempts = 0
+
+    async def handler() -> None:
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            raise RuntimeError("transient")
+        worker.stop()
+
+    worker = Worker([JobType("test.job", handler, backoff=0)], poll_interval=0.01)
+    await Job.enqueue("test.job")
+    await asyncio.wait_for(worker.run(), timeout=5)
+    assert attempts == 2
+
+
+@pytest.mark.asyncio
+async def test_worker_survives_claim_errors():
+    """Test that the worker keeps polling after failing to claim jobs."""
+    received = []
+    claim = Job.claim
+    calls = 0
+
+    async def handler() -> None:
+        received.append(1)
+        worker.stop()
+
+    async def flaky_claim(*args, **kwargs):
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise ConnectionError("database unavailable")
+        return await claim(*args, **kwargs)
+
+    worker = Worker([JobType("test.job", handler)], poll_interval=0.01)
+    await Job.enqueue("test.job")
+    with patch.object(Job, "claim", flaky_claim):
+        await asyncio.wait_for(worker.run(), timeout=5)
+    assert received == [1]
+
+
+def test_job_type_retry_delay():
+    """Test that retries back off exponentially up to the maximum."""
+    job_type = JobType("test.job", lambda: None, backoff=10, max_backoff=60)  # type: ignore
+    assert 5 <= job_type.retry_delay(1) <= 10
+    assert 20 <= job_type.retry_delay(3) <= 40
+    assert 30 <= job_type.retry_delay(10) <= 60
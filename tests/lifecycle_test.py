@@ -0,0 +1,57 @@
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from app.chat.models import ChatSession
+from app.lifecycle import Readiness, readiness
+
+
+def make_readiness(max_pool_usage: float = 0.9) -> Readiness:
+    return Readiness(cache_ttl=60, timeout=1, max_pool_usage=max_pool_usage)
+
+
+@pytest.mark.asyncio
+async def test_ready(client: httpx.AsyncClient):
+    """Test that the process is ready when the database is reachable and the pool has headroom."""
+    with patch("app.app.readiness", make_readiness()):
+        response = await client.get("/_ready")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok", "checks": {"pool": "ok", "database": "ok"}}
+
+
+@pytest.mark.asyncio
+async def test_not_ready_without_pool_headroom(client: httpx.AsyncClient):
+    """Test that the process is not ready when the pool is exhausted, and that results are cached."""
+    not_ready = make_readiness(max_pool_usage=0)
+    with patch("app.app.readiness", not_ready):
+        response = await client.get("/_ready")
+        assert response.status_code == 503
+        assert response.json()["checks"]["pool"] == "0 of 30 connections checked out"
+        not_ready.max_pool_usage = 1
+        response = await client.get("/_ready")
+        assert response.status_code == 503
+
+
+@pytest.mark.asyncio
+async def test_not_ready_while_draining():
+    """Test that a draining process is never ready, and that the shutdown deadline counts down."""
+    draining = make_readiness()
+    draining.start_draining(10)
+    result = await draining.check()
+    assert not result.ready
+    assert result.checks == {"shutdown": "draining"}
+    assert 9 < draining.time_left() <= 10
+
+
+@pytest.mark.asyncio
+async def test_draining_rejects_chat_turns(
+    test_chat_session: ChatSession, authenticated_client_user: httpx.AsyncClient
+):
+    """Test that a draining process rejects new chat turns, but still serves reads."""
+    with patch.object(readiness, "draining", True):
+        response = await authenticated_client_user.post(f"/chat/{test_chat_session.id}", json={"content": "Hello"})
+        assert response.status_code == 503
+        assert response.json()["detail"] == "Service shutting down, try again later"
+        response = await authenticated_client_user.get(f"/chat/{test_chat_session.id}")
+        assert response.status_code == 200
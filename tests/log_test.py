@@ -0,0 +1,75 @@
+import logging
+import queue
+import sys
+
+import httpx
+import orjson
+import pytest
+
+from app.log import (
+    ContextQueueHandler,
+    DebugSampler,
+    JSONFormatter,
+    chat_session_id_var,
+    request_id_var,
+    user_id_var,
+)
+
+
+def make_record(level: int = logging.INFO, **extra) -> logging.LogRecord:
+    record = logging.LogRecord("app.test", level, __file__, 1, "Answered in %dms", (42,), None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_formatter():
+    """Test that records are formatted as JSON with their extra fields."""
+    entry = orjson.loads(JSONFormatter().format(make_record(model="gpt-4", request_id=None)))
+    assert entry["level"] == "INFO"
+    assert entry["logger"] == "app.test"
+    assert entry["message"] == "Answered in 42ms"
+    assert entry["model"] == "gpt-4"
+    assert "request_id" not in entry
+    assert entry["time"].endswith("Z")
+
+
+def test_json_formatter_exception():
+    """Test that the traceback of a logged exception is included."""
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = logging.LogRecord("app.test", logging.ERROR, __file__, 1, "Failed", (), sys.exc_info())
+    entry = orjson.loads(JSONFormatter().format(record))
+    assert "ValueError: boom" in entry["exception"]
+
+
+def test_context_queue_handler():
+    """Test that records are enqueued unformatted, with the context IDs of the caller."""
+    log_queue = queue.SimpleQueue()
+    handler = ContextQueueHandler(log_queue)
+    tokens = [request_id_var.set("req"), user_id_var.set("user"), chat_session_id_var.set("chat")]
+    try:
+        handler.handle(make_record())
+    finally:
+        for var, token in zip((request_id_var, user_id_var, chat_session_id_var), tokens):
+            var.reset(token)
+    record = log_queue.get_nowait()
+    assert (record.request_id, record.user_id, record.chat_session_id) == ("req", "user", "chat")
+    assert record.args == (42,)
+
+
+def test_debug_sampler():
+    """Test that only debug records are sampled."""
+    sampler = DebugSampler(rate=0)
+    assert not sampler.filter(make_record(logging.DEBUG))
+    assert sampler.filter(make_record(logging.INFO))
+    assert DebugSampler(rate=1).filter(make_record(logging.DEBUG))
+
+
+@pytest.mark.asyncio
+async def test_request_id_header(client: httpx.AsyncClient):
+    """Test that the request ID is taken from the request headers and returned, or generated."""
+    response = await client.get("/_health", headers={"X-Request-ID": "abc"})
+    assert response.headers["x-request-id"] == "abc"
+    response = await client.get("/_health")
+    assert len(response.headers["x-request-id"]) == 32
@@ -0,0 +1,100 @@
+import os
+from types import SimpleNamespace
+
+import orjson
+import pytest
+from httpx import AsyncClient
+
+from app.metrics import (
+    Counter,
+    Gauge,
+    Histogram,
+    Registry,
+    _after_cursor_execute,
+    _before_cursor_execute,
+    db_query_duration,
+    http_requests,
+)
+
+
+@pytest.fixture
+def registry():
+    registry = Registry()
+    registry.register(Counter("turns_total", "Chat turns.", ["route"]))
+    registry.register(Gauge("in_flight", "Requests in flight."))
+    registry.register(Histogram("latency_seconds", "Latency.", buckets=(0.1, 1)))
+    return registry
+
+
+@pytest.mark.asyncio
+async def test_render(registry):
+    """Test that metrics are rendered in the Prometheus text format, with cumulative histogram buckets."""
+    registry.metrics["turns_total"].inc('/chat/"x"')
+    registry.metrics["in_flight"].set(3)
+    for value in (0.05, 0.1, 0.5, 2):
+        registry.metrics["latency_seconds"].observe(value)
+
+    text = registry.render(registry.read_snapshots(None))
+
+    assert "# TYPE turns_total counter" in text
+    assert 'turns_total{route="/chat/\\"x\\""} 1.0' in text
+    assert "in_flight 3.0" in text
+    assert 'latency_seconds_bucket{le="0.1"} 2.0' in text
+    assert 'latency_seconds_bucket{le="1.0"} 3.0' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 4.0' in text
+    assert "latency_seconds_sum 2.65" in text
+    assert "latency_seconds_count 4.0" in text
+
+
+@pytest.mark.asyncio
+async def test_render_merges_worker_snapshots(registry, tmp_path):
+    """Test that counters and histograms of all workers are summed, and gauges of dead workers are dropped."""
+    registry.metrics["turns_total"].inc("/chat", amount=2)
+    registry.metrics["in_flight"].set(1)
+    registry.metrics["latency_seconds"].observe(0.5)
+    registry.write_snapshot(str(tmp_path))
+    snapshot = orjson.loads((tmp_path / f"{os.getpid()}.json").read_bytes())
+    assert snapshot["metrics"]["turns_total"] == [[["/chat"], 2.0]]
+    snapshot["pid"] = 999_999_999  # A worker that exited
+    (tmp_path / "999999999.json").write_bytes(orjson.dumps(snapshot))
+
+    text = registry.render(registry.read_snapshots(str(tmp_path)))
+
+    assert 'turns_total{route="/chat"} 4.0' in text
+    assert "in_flight 1.0" in text
+    assert "latency_seconds_count 2.0" in text
+
+
+def test_query_duration_failed_statements():
+    """Test that statements failing before `after_cursor_execute` leave no timing state behind."""
+    conn = SimpleNamespace(info={})
+    _before_cursor_execute(conn, None, "SELECT 1", (), SimpleNamespace(), False)  # Fails, never completes
+    context = SimpleNamespace()
+    _before_cursor_execute(conn, None, "UPDATE job SET status = 'running'", (), context, False)
+    count = sum(db_query_duration._values.get(("UPDATE",), [0, 0])[:-1])
+    _after_cursor_execute(conn, None, "UPDATE job SET status = 'running'", (), context, False)
+    assert sum(db_query_duration._values[("UPDATE",)][:-1]) == count + 1
+    assert conn.info == {}
+
+
+@pytest.mark.asyncio
+async def test_register_duplicate(registry):
+    """Test that a metric name can only be registered once."""
+    with pytest.raises(ValueError):
+        registry.register(Counter("turns_total", "Chat turns."))
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint(authenticated_client_superuser: AsyncClient, test_tutor):
+    """Test that requests are counted per route template and exposed on /metrics."""
+    before = http_requests._values.get(("GET", "/tutor/{tutor_id}", "200"), 0)
+
+    response = await authenticated_client_superuser.get(f"/tutor/{test_tutor.id}")
+    assert response.status_code == 200
+
+    assert http_requests._values[("GET", "/tutor/{tutor_id}", "200")] == before + 1
+    response = await authenticated_client_superuser.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'http_requests_total{method="GET",route="/tutor/{tutor_id}",status="200"}' in response.text
+    assert "db_query_duration_seconds_bucket" in response.text
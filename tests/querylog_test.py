@@ -0,0 +1,61 @@
+import httpx
+import pytest
+
+from app.chat.models import ChatSession
+from app.querylog import (
+    QueryBudgetExceeded,
+    _before_cursor_execute,
+    query_budget,
+    record_queries,
+    statement_shape,
+)
+
+SELECT_MESSAGES = "SELECT chat_session.id FROM chat_session\n WHERE chat_session.id IN ($1, $2, $3)"
+
+
+def run_statement(statement: str) -> None:
+    _before_cursor_execute(None, None, statement, (), None, False)
+
+
+def test_statement_shape():
+    """Test that statements differing only by their number of parameters share the same shape."""
+    assert statement_shape(SELECT_MESSAGES) == "SELECT chat_session.id FROM chat_session WHERE chat_session.id IN (?)"
+    assert statement_shape(SELECT_MESSAGES) == statement_shape(SELECT_MESSAGES.replace(", $3", ""))
+
+
+def test_record_queries_nested():
+    """Test that statements are counted by every active recorder."""
+    with record_queries() as outer:
+        run_statement("SELECT 1")
+        with record_queries() as inner:
+            run_statement(SELECT_MESSAGES)
+    run_statement("SELECT 1")
+    assert outer.count == 2
+    assert inner.count == 1
+    assert inner.shapes == {statement_shape(SELECT_MESSAGES): 1}
+
+
+def test_query_budget_exceeded():
+    """Test that running more statements than the budget fails."""
+    with pytest.raises(QueryBudgetExceeded, match="Ran 3 statements, budget is 2"):
+        with query_budget(2):
+            for statement in ("SELECT 1", "SELECT 2", "SELECT 3"):
+                run_statement(statement)
+
+
+def test_query_budget_repeated_statement():
+    """Test that running the same statement shape in a loop fails, even within the budget."""
+    with pytest.raises(QueryBudgetExceeded, match="Ran the same statement 3 times"):
+        with query_budget(10, max_repeats=2):
+            for _ in range(3):
+                run_statement(SELECT_MESSAGES)
+
+
+@pytest.mark.asyncio
+async def test_get_chat_session_query_budget(
+    test_chat_session: ChatSession, authenticated_client_user: httpx.AsyncClient
+):
+    """Test that getting a chat session authenticates the user and loads the session in a few statements."""
+    with query_budget(3, max_repeats=1):
+        response = await authenticated_client_user.get(f"/chat/{test_chat_session.id}")
+    assert response.status_code == 200
@@ -0,0 +1,109 @@
+import time
+import uuid
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import httpx
+import pytest
+import redis.asyncio as redis
+
+from app.chat.models import ChatSession
+from app.config import settings
+from app.ratelimit import (
+    MemoryRateLimitBackend,
+    RateLimit,
+    RateLimiter,
+    RedisRateLimitBackend,
+)
+
+
+def test_rate_limit_parse():
+    """Test parsing rate limits."""
+    assert RateLimit.parse("10/minute") == RateLimit(10, 60)
+    for value in ("10", "0/minute", "ten/minute", "10/week"):
+        with pytest.raises(ValueError):
+            RateLimit.parse(value)
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_burst_then_steady_rate():
+    """Test that clients can burst up to the limit, then wait for the emission interval."""
+    limiter = RateLimiter({"chat_turn": RateLimit(3, 60)}, MemoryRateLimitBackend())
+    assert [await limiter.acquire("chat_turn", "user") for _ in range(3)] == [0, 0, 0]
+    wait = await limiter.acquire("chat_turn", "user")
+    assert 19 < wait <= 20
+    assert await limiter.acquire("chat_turn", "other_user") == 0
+    assert await limiter.acquire("unlimited", "user") == 0
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_shared_backend():
+    """Test that replicas sharing a backend share the limit, using the in-process backend as a stand-in."""
+    backend = MemoryRateLimitBackend()
+    replicas = [RateLimiter({"chat_turn": RateLimit(2, 60)}, backend) for _ in range(2)]
+    assert await replicas[0].acquire("chat_turn", "user") == 0
+    assert await replicas[1].acquire("chat_turn", "user") == 0
+    assert await replicas[0].acquire("chat_turn", "user") > 0
+    assert await replicas[1].acquire("chat_turn", "user") > 0
+
+
+@pytest.mark.asyncio
+async def test_memory_backend_drops_idle_clients():
+    """Test that the in-process backend stays bounded."""
+    backend = MemoryRateLimitBackend(max_keys=2)
+    for client in ("a", "b", "c"):
+        await backend.acquire(client, RateLimit(1000, 0.001))
+        time.sleep(0.001)
+    assert len(backend._tats) <= 2
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_fails_open():
+    """Test that the Redis backend passes the GCRA parameters to the script, and fails open."""
+    client = MagicMock()
+    script = client.register_script.return_value = AsyncMock()
+    backend = RedisRateLimitBackend(client)
+    script.side_effect = [b"1.5", redis.ConnectionError()]
+    assert await backend.acquire("chat_turn:user", RateLimit(10, 60)) == 1.5
+    script.assert_called_with(keys=["ratelimit:chat_turn:user"], args=[6, 54])
+    assert await backend.acquire("chat_turn:user", RateLimit(10, 60)) == 0
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_script():
+    """Test the GCRA script on a Redis server, skipped if none is available."""
+    client = redis.from_url(settings.RATE_LIMIT_REDIS_URL or "redis://localhost:6379")
+    try:
+        await client.ping()
+    except redis.ConnectionError:
+        pytest.skip("Redis is not available")
+    backend = RedisRateLimitBackend(client, prefix=f"test:{uuid.uuid4()}:")
+    try:
+        assert [await backend.acquire("chat_turn:user", RateLimit(2, 60)) for _ in range(2)] == [0, 0]
+        assert 29 < await backend.acquire("chat_turn:user", RateLimit(2, 60)) <= 30
+        assert await backend.acquire("chat_turn:other_user", RateLimit(2, 60)) == 0
+        assert 0 < await client.pttl(f"{backend.prefix}chat_turn:user") <= 60_000
+    finally:
+        await client.delete(f"{backend.prefix}chat_turn:user", f"{backend.prefix}chat_turn:other_user")
+        await client.close()
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_overhead():
+    """Test that an in-process rate limit check costs well under a millisecond."""
+    limiter = RateLimiter({"chat_read": RateLimit(1_000_000, 1)}, MemoryRateLimitBackend())
+    started_at = time.perf_counter()
+    for client in range(10_000):
+        await limiter.acquire("chat_read", str(client % 100))
+    assert (time.perf_counter() - started_at) / 10_000 < 1e-4
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_route(test_chat_session: ChatSession, authenticated_client_user: httpx.AsyncClient):
+    """Test that rate limited requests get a 429 with a Retry-After header."""
+    limiter = RateLimiter({"chat_read": RateLimit(1, 60)}, MemoryRateLimitBackend())
+    with patch("app.ratelimit.rate_limiter", limiter):
+        response = await authenticated_client_user.get(f"/chat/{test_chat_session.id}")
+        assert response.status_code == 200
+        response = await authenticated_client_user.get(f"/chat/{test_chat_session.id}")
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "60"
@@ -0,0 +1,101 @@
+import uuid
+from typing import Optional
+
+import orjson
+import zstandard
+
+from app.chat.archive import pack_message_history
+from app.chat.schemas import OpenAIMessage, OpenAIMessageRole
+from app.tools.export_conversations import (
+    _unescape,
+    learner_id,
+    redact,
+    redact_batch,
+    shard_range,
+)
+
+KEY = b"secret"
+AS_OF_MS = 1_700_000_000_000
+
+
+def copy_row(*fields: Optional[str]) -> bytes:
+    """Format a row in the text format of `COPY`."""
+
+    def escape(field: Optional[str]) -> str:
+        if field is None:
+            return "\\N"
+        return field.replace("\\", "\\\\").replace("\n", "\\n").replace("\r", "\\r").replace("\t", "\\t")
+
+    return ("\t".join(escape(field) for field in fields) + "\n").encode()
+
+
+def test_shard_range():
+    """Test that shards cover the whole id space without overlapping."""
+    ranges = [shard_range(shard, 3) for shard in range(3)]
+    assert ranges[0][0] == uuid.UUID(int=0)
+    assert ranges[0][1] == ranges[1][0] and ranges[1][1] == ranges[2][0]
+    assert ranges[2][1] is None
+    assert shard_range(0, 1) == (uuid.UUID(int=0), None)
+
+
+def test_unescape():
+    """Test decoding fields in the text format of `COPY`."""
+    assert _unescape("\\N") is None
+    assert _unescape("a\\tb\\nc\\\\n") == "a\tb\nc\\n"
+    assert _unescape("caf\u00e9 \u2028") == "caf\u00e9 \u2028"
+
+
+def test_redact():
+    """Test that email addresses and the name of the user are masked, but not short names within words."""
+    assert redact("Je suis Marie, marie.curie@example.com", "Marie") == "Je suis [name], [email]"
+    assert redact("MARIE et Mariette", "Marie") == "[name] et Mariette"
+    assert redact("Bonjour, je suis Al", "Al") == "Bonjour, je suis Al"
+    assert redact("Bonjour", None) == "Bonjour"
+
+
+def test_redact_batch():
+    """Test that rows are pseudonymized, redacted and counted as of the export, including archived histories."""
+    user_id, tutor_id = str(uuid.uuid4()), str(uuid.uuid4())
+    live_history = [
+        {"role": "user", "content": "Je suis Marie\u2028\u2029\x1c\x85 et toi ?\n", "name": "Marie"},
+        {"role": "assistant", "content": "Bonjour\tMarie", "timestamp_ms": AS_OF_MS},
+        {"role": "user", "content": "Sent after the export started", "timestamp_ms": AS_OF_MS + 1},
+    ]
+    archive = pack_message_history([OpenAIMessage(role=OpenAIMessageRole.USER, content="marie@example.com")])
+    rows = copy_row(
+        str(uuid.UUID(int=1)),
+        user_id,
+        "Marie",
+        tutor_id,
+        "french",
+        "2023-06-01T00:00:00+00:00",
+        "2023-06-02T00:00:00+00:00",
+        orjson.dumps(live_history).decode(),
+        None,
+    ) + copy_row(
+        str(uuid.UUID(int=2)),
+        user_id,
+        "Marie",
+        tutor_id,
+        "french",
+        "2023-06-01T00:00:00+00:00",
+        "2023-06-02T00:00:00+00:00",
+        "[]",
+        archive.hex(),
+    )
+
+    frame, raw_size, counts = redact_batch(rows, KEY, level=3, as_of_ms=AS_OF_MS)
+
+    raw = zstandard.ZstdDecompressor().decompress(frame, max_output_size=raw_size)
+    assert len(raw) == raw_size
+    first, second = [orjson.loads(line) for line in raw.split(b"\n")[:-1]]
+    assert first["chat_session_id"] == str(uuid.UUID(int=1))
+    assert first["learner_id"] == second["learner_id"] == learner_id(user_id, KEY)
+    assert user_id not in raw.decode()
+    assert first["messages"] == [
+        {"role": "user", "content": "Je suis [name]\u2028\u2029\x1c\x85 et toi ?\n"},
+        {"role": "assistant", "content": "Bonjour\t[name]", "timestamp_ms": AS_OF_MS},
+    ]
+    assert [message["content"] for message in second["messages"]] == ["[email]"]
+    assert counts == {tutor_id: (2, 3)}
+    assert redact_batch(b"", KEY, level=3, as_of_ms=AS_OF_MS)[1:] == (0, {})
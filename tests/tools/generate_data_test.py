@@ -0,0 +1,33 @@
+import uuid
+from datetime import datetime, timezone
+
+from app.tools.generate_data import GenerationOptions, generate_batch
+
+OPTIONS = GenerationOptions(
+    seed=42,
+    sessions_per_user=3,
+    median_messages=10,
+    max_messages=50,
+    deleted_fraction=0.1,
+    days=30,
+    now=datetime(2023, 6, 1, tzinfo=timezone.utc),
+)
+TUTOR_IDS = [uuid.UUID(int=1), uuid.UUID(int=2)]
+
+
+def test_generate_batch_is_deterministic():
+    """Test that the rows of a batch depend only on the options and the batch number."""
+    later_batch = generate_batch(OPTIONS, 3, 10, TUTOR_IDS)
+    generate_batch(OPTIONS, 0, 10, TUTOR_IDS)
+    assert generate_batch(OPTIONS, 3, 10, TUTOR_IDS) == later_batch
+    assert generate_batch(OPTIONS, 2, 10, TUTOR_IDS) != later_batch
+    assert generate_batch(OPTIONS._replace(seed=43), 3, 10, TUTOR_IDS) != later_batch
+
+
+def test_generate_batch_shortened():
+    """Test that a shortened batch holds the first users of the full batch and their chat sessions."""
+    users, chat_sessions = generate_batch(OPTIONS, 3, 10, TUTOR_IDS)
+    short_users, short_chat_sessions = generate_batch(OPTIONS, 3, 10, TUTOR_IDS, count=4)
+    assert short_users == users[:4]
+    assert short_chat_sessions == chat_sessions[: len(short_chat_sessions)]
+    assert {chat_session[1] for chat_session in short_chat_sessions} <= {user[0] for user in short_users}
@@ -0,0 +1,113 @@
+from typing import List
+
+import pytest
+from httpx import AsyncClient
+
+from app.tracing import (
+    BatchSpanProcessor,
+    Span,
+    SpanContext,
+    SpanExporter,
+    Tracer,
+    current_span,
+    traceparent_headers,
+    tracer,
+)
+
+TRACEPARENT = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+
+
+class MemorySpanExporter(SpanExporter):
+    def __init__(self) -> None:
+        self.spans: List[Span] = []
+
+    def export(self, spans: List[Span]) -> None:
+        self.spans.extend(spans)
+
+
+@pytest.fixture
+def exporter(monkeypatch):
+    exporter = MemorySpanExporter()
+    monkeypatch.setattr(tracer, "processor", BatchSpanProcessor(exporter))
+    return exporter
+
+
+@pytest.mark.parametrize(
+    "traceparent, expected",
+    [
+        (TRACEPARENT, SpanContext("4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7", True)),
+        (TRACEPARENT[:-2] + "00", SpanContext("4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7", False)),
+        ("00-" + "0" * 32 + "-00f067aa0ba902b7-01", None),
+        ("ff-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01", None),
+        ("00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01-extra", None),
+        ("garbage", None),
+    ],
+    ids=["sampled", "unsampled", "zero_trace_id", "invalid_version", "extra_fields", "garbage"],
+)
+def test_parse_traceparent(traceparent, expected):
+    """Test that traceparent headers are parsed, and invalid ones are ignored."""
+    assert SpanContext.from_traceparent(traceparent) == expected
+
+
+def test_trace_continues_parent():
+    """Test that a trace continues the trace and sampling decision of its traceparent."""
+    exporter = MemorySpanExporter()
+    test_tracer = Tracer(sample_rate=0, processor=BatchSpanProcessor(exporter))
+
+    with test_tracer.start_trace("GET", TRACEPARENT) as root:
+        with test_tracer.span("db.statement", statement="SELECT 1") as child:
+            assert traceparent_headers() == {"traceparent": child.context.traceparent}
+        with pytest.raises(ValueError):
+            with test_tracer.span("get_chat_response"):
+                raise ValueError("boom")
+    test_tracer.processor.flush()
+
+    assert current_span.get() is None
+    assert [span.name for span in exporter.spans] == ["db.statement", "get_chat_response", "GET"]
+    assert {span.context.trace_id for span in exporter.spans} == {"4bf92f3577b34da6a3ce929d0e0e4736"}
+    assert root.parent_id == "00f067aa0ba902b7"
+    assert child.parent_id == root.context.span_id
+    assert child.attributes == {"statement": "SELECT 1"}
+    assert exporter.spans[1].error == "ValueError: boom"
+
+
+def test_unsampled_trace_is_not_recorded():
+    """Test that unsampled traces propagate their context but export nothing."""
+    exporter = MemorySpanExporter()
+    test_tracer = Tracer(sample_rate=1, processor=BatchSpanProcessor(exporter))
+
+    with test_tracer.start_trace("GET", TRACEPARENT[:-2] + "00") as root:
+        with test_tracer.span("db.statement") as child:
+            child.set_attribute("rows", 1)
+            assert child is root
+            assert traceparent_headers() == {"traceparent": root.context.traceparent}
+    with test_tracer.span("outside_of_a_trace") as span:
+        assert not span.recording
+    test_tracer.processor.flush()
+
+    assert exporter.spans == []
+    assert root.attributes == {}
+
+
+def test_batch_span_processor_drops_when_full():
+    """Test that spans are dropped rather than queued without bound."""
+    processor = BatchSpanProcessor(MemorySpanExporter(), max_queue_size=2, schedule_delay=60)
+    for _ in range(3):
+        processor.on_end(Span("span", SpanContext("1" * 32, "1" * 16, True)))
+    assert processor.dropped == 1
+
+
+@pytest.mark.asyncio
+async def test_request_trace(authenticated_client_superuser: AsyncClient, test_tutor, exporter: MemorySpanExporter):
+    """Test that a sampled request records spans for authentication and database statements."""
+    response = await authenticated_client_superuser.get(f"/tutor/{test_tutor.id}", headers={"traceparent": TRACEPARENT})
+    assert response.status_code == 200
+    tracer.processor.flush()
+
+    names = [span.name for span in exporter.spans]
+    assert "authenticate_user" in names
+    assert "db.statement" in names
+    root = exporter.spans[-1]
+    assert root.name == "GET /tutor/{tutor_id}"
+    assert root.attributes["http.status_code"] == 200
+    assert all(span.context.trace_id == "4bf92f3577b34da6a3ce929d0e0e4736" for span in exporter.spans)
@@ -91,6 +91,14 @@ async def test_get_tutors_as_user(authenticated_client_user: httpx.AsyncClient):
     ]
 
 
+@pytest.mark.asyncio
+async def test_get_tutors_sparse_fields(test_tutor: Tutor, authenticated_client_user: httpx.AsyncClient):
+    """Test getting all tutors restricted to a sparse fieldset."""
+    response = await authenticated_client_user.get("/tutors", params={"fields": "id,name"})
+    assert response.status_code == 200
+    assert response.json() == [{"id": str(tutor.id), "name": tutor.name} for tutor in await Tutor.get_visible()]
+
+
 @pytest.mark.asyncio
 async def test_get_tutor_not_found(authenticated_client_superuser: httpx.AsyncClient):
     """Test getting a tutor that does not exist."""
@@ -0,0 +1,43 @@
+import asyncio
+from typing import AsyncGenerator, List
+
+import pytest
+from starlette.types import Message
+
+from app.user.export import ExportResponse, accepts_gzip
+
+
+def test_accepts_gzip():
+    """Test that gzip is only used when accepted with a non-zero quality value."""
+    for accept_encoding in ("gzip", "br, GZIP;q=0.5", "*", "identity, *;q=0.1", "x-gzip"):
+        assert accepts_gzip(accept_encoding)
+    for accept_encoding in (None, "", "identity", "gzip;q=0", "gzip; q=0.000, *", "*;q=0", "gzip;q=invalid"):
+        assert not accepts_gzip(accept_encoding)
+
+
+@pytest.mark.asyncio
+async def test_export_response_disconnects_stalled_clients():
+    """Test that an export to a client that stops reading is ended, and the export closed."""
+    closed = asyncio.Event()
+    sent: List[Message] = []
+
+    async def content() -> AsyncGenerator[bytes, None]:
+        try:
+            while True:
+                yield b"{}\n"
+        finally:
+            closed.set()
+
+    async def receive() -> Message:
+        await asyncio.Event().wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: Message) -> None:
+        sent.append(message)
+        if len(sent) > 2:
+            await asyncio.Event().wait()  # The client stopped reading
+
+    response = ExportResponse(content(), send_timeout=0.01)
+    await asyncio.wait_for(response({"type": "http"}, receive, send), timeout=5)
+    assert closed.is_set()
+    assert [message["type"] for message in sent] == ["http.response.start"] + ["http.response.body"] * 2
@@ -1,7 +1,11 @@
+import gzip
+
 import httpx
+import orjson
 import pytest
 from firebase_admin import auth
 
+from app.chat.models import ChatSession
 from app.user.models import User
 from tests.fixtures.core import exchange_custom_token_for_id_token
 
@@ -95,3 +99,44 @@ async def test_get_me(authenticated_client_user: httpx.AsyncClient, test_user: U
         "name": test_user.name,
         "language": test_user.language,
     }
+
+
+@pytest.mark.asyncio
+async def test_export_me(authenticated_client_user: httpx.AsyncClient, test_user: User, test_chat_session: ChatSession):
+    """Test that the export streams the user, then each chat session followed by its messages."""
+    response = await authenticated_client_user.get("/users/me/export", headers={"Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "application/x-ndjson"
+    records = [orjson.loads(line) for line in response.content.splitlines()]
+    assert [record["type"] for record in records] == ["user", "chat_session", "message"]
+    assert records[0]["id"] == str(test_user.id)
+    assert records[1]["id"] == str(test_chat_session.id)
+    assert records[2] == {
+        "type": "message",
+        "chat_session_id": str(test_chat_session.id),
+        "role": "tutor",
+        "content": "Hello",
+        "uuid": "11111111-1111-4111-8111-111111111111",
+        "timestamp_ms": 0,
+    }
+
+
+@pytest.mark.asyncio
+async def test_export_me_gzip(authenticated_client_user: httpx.AsyncClient, test_chat_session: ChatSession):
+    """Test that the export is compressed with gzip when the client accepts it."""
+    async with authenticated_client_user.stream(
+        "GET", "/users/me/export", headers={"Accept-Encoding": "gzip"}
+    ) as response:
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert response.headers["Vary"] == "Accept-Encoding"
+        body = b"".join([chunk async for chunk in response.aiter_raw()])
+    assert len(gzip.decompress(body).splitlines()) == 3
+
+
+@pytest.mark.asyncio
+async def test_export_me_gzip_refused(authenticated_client_user: httpx.AsyncClient, test_chat_session: ChatSession):
+    """Test that the export is not compressed when the client gives gzip a zero quality value."""
+    response = await authenticated_client_user.get("/users/me/export", headers={"Accept-Encoding": "gzip;q=0, *"})
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert len(response.content.splitlines()) == 3
@@ -0,0 +1,33 @@
+import asyncio
+
+import pytest
+
+from app.utils import SingleFlight, SingleFlightConflictError
+
+
+@pytest.mark.asyncio
+async def test_single_flight_coalesces_calls():
+    """Test that concurrent calls with the same key and tag share a single run."""
+    single_flight: SingleFlight[int] = SingleFlight()
+    runs = 0
+
+    async def call() -> int:
+        nonlocal runs
+        runs += 1
+        await asyncio.sleep(0.01)
+        return runs
+
+    results = await asyncio.gather(*(single_flight.do("key", call, tag="a") for _ in range(3)))
+    assert results == [1, 1, 1]
+    assert "key" not in single_flight
+
+
+@pytest.mark.asyncio
+async def test_single_flight_conflict():
+    """Test that joining a call in flight with a different tag is rejected."""
+    single_flight: SingleFlight[None] = SingleFlight()
+    first = asyncio.ensure_future(single_flight.do("key", lambda: asyncio.sleep(0.01), tag="a"))
+    await asyncio.sleep(0)
+    with pytest.raises(SingleFlightConflictError):
+        await single_flight.do("key", lambda: asyncio.sleep(0.01), tag="b")
+    await first
@@ -0,0 +1,41 @@
+import asyncio
+import time
+
+import pytest
+
+from app.watchdog import LoopLagMonitor, LoopWatchdog
+
+
+@pytest.mark.allow_blocking
+@pytest.mark.asyncio
+async def test_loop_lag_monitor():
+    """Test that blocking the event loop shows up as lag."""
+    monitor = LoopLagMonitor(interval=0.01)
+    monitor.start()
+    await asyncio.sleep(0.05)
+    assert monitor.lag < 0.1
+    time.sleep(0.2)  # Block the loop
+    await asyncio.sleep(0.001)
+    assert monitor.lag >= 0.15
+
+
+def blocking_call() -> None:
+    time.sleep(0.3)
+
+
+@pytest.mark.allow_blocking
+@pytest.mark.asyncio
+async def test_loop_watchdog():
+    """Test that a blocking call is detected, with its stack."""
+    watchdog = LoopWatchdog(threshold=0.1, interval=0.01)
+    watchdog.start()
+    await asyncio.sleep(0.05)
+    assert watchdog.blocked_count == 0
+
+    blocking_call()
+    await asyncio.sleep(0.05)
+
+    assert watchdog.blocked_count == 1
+    block = watchdog.blocks[-1]
+    assert block.duration >= 0.25
+    assert "in blocking_call" in block.stack